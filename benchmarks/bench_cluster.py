@@ -0,0 +1,108 @@
+"""
+Benchmark do modo coordenador/worker: o mesmo lote distribuído entre 1, 2, 4...
+workers locais (processos `uvicorn web:app`, no lugar dos pods).
+
+Os alvos são N endereços 127.x.y.z na porta de um listener "blackhole" (ver
+benchmarks.servers): cada teste leva o timeout inteiro, então o lote é limitado
+pela concorrência de cada worker (--threads) e o ganho com mais workers aparece
+direto no tempo total. Por fim, roda o lote com um worker derrubado no meio
+para conferir que os leases dele são reenviados e que cada alvo sai uma única vez.
+
+Uso:
+    python -m benchmarks.bench_cluster --targets 600 --workers 1,2,4 --threads 25
+"""
+import argparse
+import json
+import logging
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+
+from benchmarks.servers import refused_port, start_blackhole_listener
+from utils.cluster import Coordinator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = secrets.token_hex(16)
+
+
+def start_worker(port: int) -> subprocess.Popen:
+    env = dict(os.environ, LOG_LEVEL="WARNING", CLUSTER_WORKERS="", CLUSTER_TOKEN=TOKEN)
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "web:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/cluster/health", timeout=1).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError(f"o worker da porta {port} não subiu")
+            time.sleep(0.1)
+
+
+def loopback_targets(count: int, port: int):
+    return [(f"127.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", port) for i in range(1, count + 1)]
+
+
+def run(urls, targets, threads: int, timeout: float, lease_size: int, kill=None) -> dict:
+    coordinator = Coordinator(urls, "socket", {"timeout": timeout, "workers": threads},
+                              lease_size=lease_size, per_worker=1, lease_timeout=timeout * 4 + 5, token=TOKEN)
+    if kill:
+        threading.Timer(kill[1], kill[0].kill).start()
+    start = time.perf_counter()
+    rows = list(coordinator.run(targets))
+    elapsed = time.perf_counter() - start
+    seen = Counter((row["host"], row["port"]) for row in rows)
+    return {"seconds": round(elapsed, 2), "targets_per_s": round(len(rows) / elapsed, 1), "rows": len(rows),
+            "duplicates": sum(n - 1 for n in seen.values()), "missing": len(set(targets) - set(seen)),
+            "summary": coordinator.summary.as_dict(),
+            "workers": [{key: stats[key] for key in ("url", "leases", "rows", "failures", "stolen")}
+                        for stats in coordinator.stats()]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", type=int, default=600)
+    parser.add_argument("--workers", default="1,2,4", help="Quantidades de workers a medir")
+    parser.add_argument("--threads", type=int, default=25, help="Threads de cada worker")
+    parser.add_argument("--timeout", type=int, default=1)
+    parser.add_argument("--lease-size", type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    counts = [int(n) for n in args.workers.split(",")]
+    blackhole, _fillers = start_blackhole_listener("0.0.0.0")
+    targets = loopback_targets(args.targets, blackhole.getsockname()[1])
+    processes = []
+    try:
+        for _ in range(max(max(counts), 3)):
+            processes.append(start_worker(refused_port()))
+        urls = [f"http://127.0.0.1:{process.args[5]}" for process in processes]
+
+        report = {"targets": args.targets, "threads_per_worker": args.threads, "timeout_s": args.timeout,
+                  "runs": {}}
+        for count in counts:
+            report["runs"][count] = run(urls[:count], targets, args.threads, args.timeout, args.lease_size)
+        base = report["runs"][counts[0]]["seconds"] * counts[0]
+        for count in counts:
+            report["runs"][count]["speedup_per_worker"] = round(base / report["runs"][count]["seconds"] / count, 2)
+
+        # Derruba um dos 3 workers no meio do lote
+        report["worker_killed"] = run(urls[:3], targets, args.threads, args.timeout, args.lease_size,
+                                      kill=(processes[2], args.timeout * 1.5))
+        print(json.dumps(report, indent=2))
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
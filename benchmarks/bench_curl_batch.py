@@ -0,0 +1,65 @@
+"""
+Benchmark do curl-batch: um pycurl.Curl por URL (test_curl_connection em threads)
+x CurlMulti com pool de handles e conexões reaproveitadas.
+
+Sobe um servidor HTTP/1.1 local com keep-alive e latência configurável.
+
+Uso:
+    python -m benchmarks.bench_curl_batch --requests 2000 --latency-ms 5
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.servers import start_http_server
+from tests.connectivity_tests import test_curl_connection
+from tests.curl_batch import iter_curl_batch
+
+
+def run_single_handles(urls, timeout, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(1 for ok in executor.map(lambda u: test_curl_connection(u, "GET", timeout), urls) if ok)
+
+
+def run_multi(urls, timeout, parallel, per_host):
+    ok = reused = 0
+    for row in iter_curl_batch(urls, "GET", timeout, parallel, per_host):
+        ok += row["status"] == "success"
+        reused += row["reused_connection"]
+    return ok, reused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--timeout", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--parallel", type=int, default=50)
+    parser.add_argument("--per-host", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.getLogger("connectivity_tool").setLevel(logging.CRITICAL)
+    server = start_http_server(args.latency_ms)
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/{i}" for i in range(args.requests)]
+
+    report = []
+    start = time.perf_counter()
+    ok = run_single_handles(urls, args.timeout, args.workers)
+    elapsed = time.perf_counter() - start
+    report.append({"engine": f"Curl por URL (workers={args.workers})", "requests": len(urls), "success": ok,
+                   "seconds": round(elapsed, 3), "requests_per_sec": round(len(urls) / elapsed, 1)})
+
+    start = time.perf_counter()
+    ok, reused = run_multi(urls, args.timeout, args.parallel, args.per_host)
+    elapsed = time.perf_counter() - start
+    report.append({"engine": f"CurlMulti (parallel={args.parallel}, per_host={args.per_host})",
+                   "requests": len(urls), "success": ok, "reused_connections": reused,
+                   "seconds": round(elapsed, 3), "requests_per_sec": round(len(urls) / elapsed, 1)})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
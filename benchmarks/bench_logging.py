@@ -0,0 +1,48 @@
+"""
+Benchmark do custo do log por teste (utils/logger.py).
+
+Roda o mesmo socket-batch contra um listener local em cada modo de log dos
+lotes (all, sample, aggregate, summary). O log vai para stderr; redirecione
+para medir sem o custo do terminal. LOG_ASYNC=0 compara com o handler síncrono.
+
+Uso:
+    python -m benchmarks.bench_logging --targets 20000 2>/dev/null
+    LOG_ASYNC=0 python -m benchmarks.bench_logging --targets 20000 2>/dev/null
+"""
+import argparse
+import json
+import os
+
+from benchmarks.bench_metrics import batch_seconds
+from benchmarks.servers import start_accepting_listener
+from utils.logger import PROBE_MODES, configure_probe_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    port = start_accepting_listener().getsockname()[1]
+    configure_probe_logging(batch="summary")
+    batch_seconds(port, 500, args.workers)  # aquece DNS, threads e imports
+
+    timings = {mode: [] for mode in PROBE_MODES}
+    for _ in range(args.rounds):
+        for mode in PROBE_MODES:
+            configure_probe_logging(batch=mode)
+            timings[mode].append(batch_seconds(port, args.targets, args.workers))
+
+    report = {
+        "targets": args.targets,
+        "workers": args.workers,
+        "log_async": os.environ.get("LOG_ASYNC", "1") != "0",
+        "probes_per_sec": {mode: round(args.targets / min(seconds), 1) for mode, seconds in timings.items()},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark do ping em lote: uma thread por host (connect TCP na porta 80, como o
+antigo ping_executor do Flask) x o Pinger multiplexado (ICMP e fallback TCP).
+
+Os alvos são N endereços de 127.0.0.0/8, então roda offline; o ICMP só é medido
+se o kernel permitir sockets ICMP sem privilégio (net.ipv4.ping_group_range).
+
+Uso:
+    python -m benchmarks.bench_ping --hosts 1000 --count 3
+"""
+import argparse
+import json
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.icmp_ping import iter_ping_batch
+
+
+def loopback_hosts(count: int):
+    return [f"127.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(1, count + 1)]
+
+
+def tcp_connect(host: str, timeout: float) -> bool:
+    try:
+        socket.create_connection((host, 80), timeout=timeout).close()
+        return True
+    except ConnectionRefusedError:
+        return True  # o host respondeu com RST
+    except OSError:
+        return False
+
+
+def run_threads(hosts, count, timeout, workers):
+    def one(host):
+        return any([tcp_connect(host, timeout) for _ in range(count)])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(one, hosts))
+
+
+def run_pinger(hosts, count, timeout, parallel, method):
+    return sum(row["status"] == "success"
+               for row in iter_ping_batch(hosts, count, 0.0, timeout, parallel, method))
+
+
+def icmp_allowed() -> bool:
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+        return True
+    except OSError:
+        return False
+
+
+def measure(fn, *args) -> dict:
+    start = time.perf_counter()
+    ok = fn(*args)
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "hosts_per_s": round(len(args[0]) / elapsed, 1), "ok": ok}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--count", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=100)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    hosts = loopback_hosts(args.hosts)
+    report = {"hosts": args.hosts, "count": args.count,
+              "threads_tcp": measure(run_threads, hosts, args.count, args.timeout, args.workers),
+              "pinger_tcp": measure(run_pinger, hosts, args.count, args.timeout, args.hosts, "tcp")}
+    if icmp_allowed():
+        report["pinger_icmp"] = measure(run_pinger, hosts, args.count, args.timeout, args.hosts, "icmp")
+    else:
+        report["pinger_icmp"] = "sem permissão para ICMP (net.ipv4.ping_group_range)"
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
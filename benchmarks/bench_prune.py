@@ -0,0 +1,77 @@
+"""
+Benchmark da poda de hosts inalcançáveis (utils.reachability) em uma rede esparsa.
+
+Os hosts "mortos" são endereços 127.0.x.y testados em --ports portas "blackhole"
+(ver benchmarks.servers, ligadas em 0.0.0.0): todo connect só termina no
+timeout. Os hosts vivos são 127.0.0.1 em portas que aceitam ou recusam. O
+mesmo lote roda sem poda, com poda por host e com poda por host e sub-rede;
+os resultados dos alvos vivos têm que sair iguais em todas as execuções.
+
+Uso:
+    python -m benchmarks.bench_prune --dead-hosts 10 --ports 50 --workers 10
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from benchmarks.servers import refused_port, start_accepting_listener, start_blackhole_listener
+from utils.batch import BatchSummary, iter_socket_batch
+from utils.reachability import Reachability
+
+
+def build_targets(dead_hosts: int, blackhole_ports, accept_port: int, live_ports: int):
+    # Host a host, como a expansão de "rede/24:portas" (todas as portas de um host em sequência)
+    targets = [(f"127.0.{1 + i // 250}.{1 + i % 250}", port) for i in range(dead_hosts) for port in blackhole_ports]
+    live = [("127.0.0.1", accept_port)] + [("127.0.0.1", refused_port()) for _ in range(live_ports - 1)]
+    for target in live:
+        targets.insert(random.randrange(len(targets) + 1), target)
+    return targets, set(live)
+
+
+def run(targets, live, timeout, workers, reachability) -> dict:
+    summary = BatchSummary()
+    live_status = {}
+    start = time.perf_counter()
+    for row in iter_socket_batch(targets, timeout, workers, reachability=reachability):
+        summary.add(row)
+        if (row["host"], row["port"]) in live:
+            live_status[(row["host"], row["port"])] = row["status"]
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 2), "summary": summary.as_dict(),
+            "live": sorted(f"{host}:{port}={status}" for (host, port), status in live_status.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dead-hosts", type=int, default=10)
+    parser.add_argument("--ports", type=int, default=50, help="Portas testadas em cada host morto")
+    parser.add_argument("--live-ports", type=int, default=10, help="Alvos vivos (127.0.0.1) misturados no lote")
+    parser.add_argument("--timeout", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=10)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    random.seed(1)
+
+    blackholes = [start_blackhole_listener("0.0.0.0") for _ in range(args.ports)]
+    accepting = start_accepting_listener()
+    targets, live = build_targets(args.dead_hosts, [server.getsockname()[1] for server, _ in blackholes],
+                                  accepting.getsockname()[1], args.live_ports)
+
+    report = {"targets": len(targets), "dead_hosts": args.dead_hosts, "ports": args.ports, "runs": {}}
+    for name, reachability in (("no_pruning", None),
+                               ("prune_after_3", Reachability(3)),
+                               ("prune_subnet_0.9", Reachability(3, subnet_fraction=0.9, subnet_min_hosts=4))):
+        report["runs"][name] = run(targets, live, args.timeout, args.workers, reachability)
+    baseline = report["runs"]["no_pruning"]
+    for result in report["runs"].values():
+        result["speedup"] = round(baseline["seconds"] / result["seconds"], 1)
+        result["live_unchanged"] = result["live"] == baseline["live"]
+    for result in report["runs"].values():
+        del result["live"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
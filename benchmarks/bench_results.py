@@ -0,0 +1,103 @@
+"""
+Benchmark de memória e tempo dos resultados de lote: lista de dicts x ResultTable.
+
+Gera N linhas sintéticas no formato do socket-batch (10.x.y.z, portas variadas,
+~10% de falhas) e mede, para cada representação, a memória retida (tracemalloc),
+o tempo de montagem com o resumo e o tempo de serialização em JSON, NDJSON e CSV.
+
+Uso:
+    python -m benchmarks.bench_results --rows 1000000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from utils.batch import BatchSummary
+from utils.results import ResultTable
+
+PORTS = (22, 80, 443, 3306, 5432, 6379, 8080, 8443)
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        host = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        port = PORTS[i % len(PORTS)]
+        if i % 10 == 9:
+            yield {"host": host, "port": port, "status": "failure", "ip": host, "error": "timeout",
+                   "dns_ms": 0.004, "total_ms": 1000.123}
+        else:
+            latency = 0.2 + (i % 997) / 100
+            yield {"host": host, "port": port, "status": "success", "ip": host, "dns_ms": 0.004,
+                   "connect_ms": round(latency, 3), "total_ms": round(latency + 0.004, 3)}
+
+
+def build_list(count: int):
+    rows, summary = [], BatchSummary()
+    for row in synthetic_rows(count):
+        rows.append(row)
+        summary.add(row)
+    return rows, summary
+
+
+def build_table(count: int):
+    table = ResultTable(synthetic_rows(count))
+    return table, table.summary
+
+
+def measure(build, count: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    results, summary = build(count)
+    built = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"results": results, "summary": summary, "build_s": round(built, 2),
+            "retained_mb": round(retained / 2 ** 20, 1), "bytes_per_row": round(retained / count, 1)}
+
+
+def serialize_seconds(results, output: str) -> float:
+    start = time.perf_counter()
+    if isinstance(results, ResultTable):
+        chunks = {"json": lambda: results.iter_json(summary=results.summary.as_dict()),
+                  "ndjson": results.iter_ndjson, "csv": results.iter_csv}[output]()
+        for _ in chunks:
+            pass
+    elif output == "json":
+        json.dumps({"results": results})
+    else:
+        for row in results:
+            json.dumps(row)
+    return round(time.perf_counter() - start, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    report = {"rows": args.rows}
+    for name, build, outputs in (("dict_list", build_list, ("json", "ndjson")),
+                                 ("result_table", build_table, ("json", "ndjson", "csv"))):
+        # Tempos medidos fora do tracemalloc, que os distorce bastante
+        measured = measure(build, args.rows)
+        results = measured.pop("results")
+        summary = measured.pop("summary")
+        del results
+        gc.collect()
+        start = time.perf_counter()
+        results, _ = build(args.rows)
+        measured["build_s"] = round(time.perf_counter() - start, 2)
+        measured["serialize_s"] = {output: serialize_seconds(results, output) for output in outputs}
+        measured["summary"] = summary.as_dict()
+        report[name] = measured
+        del results
+        gc.collect()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark do socket-batch: motor de threads x motor async.
+
+Sobe listeners locais em loopback (um que aceita conexões, uma porta recusada e um
+"buraco negro" cuja fila de accept está cheia, então o SYN é descartado e o connect
+só termina no timeout) e mede probes/s de cada motor sobre a mesma lista de alvos.
+
+Uso:
+    python -m benchmarks.bench_socket_batch --targets 2000 --timeout 1
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from benchmarks.servers import refused_port, start_accepting_listener, start_blackhole_listener
+from tests.connectivity_tests import test_socket_connection, run_socket_batch_async
+
+
+def build_targets(total, blackhole_ratio, accept_port, closed_port, blackhole_port):
+    blackholes = int(total * blackhole_ratio)
+    targets = [("127.0.0.1", blackhole_port)] * blackholes
+    for i in range(total - blackholes):
+        targets.append(("127.0.0.1", accept_port if i % 2 == 0 else closed_port))
+    return targets
+
+
+def run_threads(targets, timeout, workers):
+    ok = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(test_socket_connection, host, port, timeout) for host, port in targets]
+        for future in as_completed(futures):
+            ok += bool(future.result())
+    return ok
+
+
+def run_async(targets, timeout, concurrency):
+    return sum(1 for _, _, success in run_socket_batch_async(targets, timeout, concurrency) if success)
+
+
+def measure(name, fn, targets):
+    start = time.perf_counter()
+    ok = fn(targets)
+    elapsed = time.perf_counter() - start
+    return {
+        "engine": name,
+        "targets": len(targets),
+        "success": ok,
+        "seconds": round(elapsed, 3),
+        "probes_per_sec": round(len(targets) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--blackhole-ratio", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.getLogger("connectivity_tool").setLevel(logging.CRITICAL)
+
+    accepting = start_accepting_listener()
+    blackhole, _fillers = start_blackhole_listener()
+    targets = build_targets(
+        args.targets, args.blackhole_ratio,
+        accepting.getsockname()[1], refused_port(), blackhole.getsockname()[1],
+    )
+
+    report = [
+        measure(f"thread (workers={args.workers})", lambda t: run_threads(t, args.timeout, args.workers), targets),
+        measure(f"async (concurrency={args.concurrency})", lambda t: run_async(t, args.timeout, args.concurrency), targets),
+    ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
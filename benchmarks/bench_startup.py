@@ -0,0 +1,84 @@
+"""
+Benchmark do tempo de partida da CLI (interpretador + imports + um teste).
+
+Mede, em processos novos, o melhor de N execuções de:
+- python -c pass (piso do interpretador)
+- import de main, de tests.connectivity_tests e dos backends pesados (pycurl, cryptography.x509)
+- main.py socket contra uma porta local, sem daemon e repassado ao `main.py daemon`
+
+Uso:
+    python -m benchmarks.bench_startup --rounds 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.servers import start_accepting_listener
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_ms(argv, rounds: int, env=None) -> float:
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 1)
+
+
+def import_ms(module: str, rounds: int) -> float:
+    """Tempo cumulativo do import (python -X importtime), descontado o piso do interpretador."""
+    best = None
+    for _ in range(rounds):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 3 and fields[2] == module:
+                us = int(fields[1])
+                best = us if best is None else min(best, us)
+    return round(best / 1000, 1) if best is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    port = start_accepting_listener().getsockname()[1]
+    socket_cmd = [sys.executable, "main.py", "socket", "--host", "127.0.0.1", "--port", str(port)]
+    report = {
+        "rounds": args.rounds,
+        "interpreter_ms": best_ms([sys.executable, "-c", "pass"], args.rounds),
+        "import_ms": {module: import_ms(module, args.rounds)
+                      for module in ("main", "tests.connectivity_tests", "pycurl", "cryptography.x509")},
+        "help_ms": best_ms([sys.executable, "main.py", "--help"], args.rounds),
+        "socket_local_ms": best_ms(socket_cmd, args.rounds, dict(os.environ, CONNECTIVITY_DAEMON="0")),
+    }
+
+    with tempfile.TemporaryDirectory(prefix="net-tools-daemon-") as tmp:
+        env = dict(os.environ, CONNECTIVITY_DAEMON_SOCKET=os.path.join(tmp, "daemon.sock"))
+        daemon = subprocess.Popen([sys.executable, "main.py", "daemon"], cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 30
+            while not os.path.exists(env["CONNECTIVITY_DAEMON_SOCKET"]):
+                if time.monotonic() > deadline or daemon.poll() is not None:
+                    raise RuntimeError("o daemon não subiu")
+                time.sleep(0.05)
+            report["socket_daemon_ms"] = best_ms(socket_cmd, args.rounds, env)
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=5)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
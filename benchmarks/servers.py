@@ -0,0 +1,230 @@
+"""
+Servidores locais (loopback) que substituem alvos reais nos benchmarks:
+
+- accept:    listener TCP que aceita e fecha na hora
+- refused:   porta sem listener (RST imediato)
+- blackhole: fila de accept cheia; o SYN é descartado e o connect só termina no timeout
+- banner:    aceita e envia um banner estilo SSH (netcat --banner)
+- slow:      aceita uma conexão a cada `slow_accept_ms` e envia o banner
+- tls:       servidor TLS com certificado autoassinado gerado na hora
+- http:      HTTP/1.1 com keep-alive e latência configurável
+
+`StandIns` sobe todos em um processo separado, para que a CPU e a memória
+medidas no processo dos testes sejam só do cliente.
+"""
+import ipaddress
+import multiprocessing
+import os
+import socket
+import ssl
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BANNER = b"SSH-2.0-OpenSSH_9.6 bench\r\n"
+
+
+def _listener(backlog: int = 4096, host: str = "127.0.0.1") -> socket.socket:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, 0))
+    server.listen(backlog)
+    return server
+
+
+def _serve(server: socket.socket, handle, delay: float = 0.0):
+    def loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            handle(conn)
+            if delay:
+                time.sleep(delay)
+
+    threading.Thread(target=loop, daemon=True).start()
+    return server
+
+
+def start_accepting_listener() -> socket.socket:
+    return _serve(_listener(), lambda conn: conn.close())
+
+
+def refused_port() -> int:
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def start_blackhole_listener(host: str = "127.0.0.1"):
+    """Com host="0.0.0.0", qualquer 127.x.y.z na porta devolvida também cai no buraco."""
+    server = _listener(backlog=0, host=host)
+    port = server.getsockname()[1]
+    # Enche a fila de accept; a partir daí o kernel descarta novos SYNs
+    fillers = []
+    for _ in range(4):
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex(("127.0.0.1", port))
+        fillers.append(filler)
+    time.sleep(0.1)
+    return server, fillers
+
+
+def _send_banner(conn: socket.socket):
+    try:
+        conn.sendall(BANNER)
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def start_banner_listener(slow_accept_ms: float = 0.0) -> socket.socket:
+    return _serve(_listener(), _send_banner, slow_accept_ms / 1000)
+
+
+def generate_self_signed(directory: str, host: str = "127.0.0.1"):
+    """Gera chave EC e certificado autoassinado (CN=localhost, SAN localhost e `host`). Retorna (cert, key)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=30))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address(host))
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "bench-cert.pem")
+    key_path = os.path.join(directory, "bench-key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def start_tls_listener(cert_path: str, key_path: str) -> socket.socket:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+
+    def handle(conn: socket.socket):
+        def run():
+            try:
+                with context.wrap_socket(conn, server_side=True) as ssock:
+                    # Espera o cliente fechar (ele lê o ticket de sessão antes)
+                    ssock.settimeout(5)
+                    ssock.recv(1)
+            except (OSError, ssl.SSLError):
+                conn.close()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    return _serve(_listener(), handle)
+
+
+def start_http_server(latency_ms: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            body = b"ok"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # O padrão (5) estoura com dezenas de conexões simultâneas e o SYN
+        # descartado custa 1 s de retransmissão, distorcendo a medição
+        request_queue_size = 4096
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _run_standins(conn, cert_path: str, key_path: str, http_latency_ms: float, slow_accept_ms: float):
+    blackhole, _fillers = start_blackhole_listener()
+    ports = {
+        "accept": start_accepting_listener().getsockname()[1],
+        "refused": refused_port(),
+        "blackhole": blackhole.getsockname()[1],
+        "banner": start_banner_listener().getsockname()[1],
+        "slow": start_banner_listener(slow_accept_ms).getsockname()[1],
+        "tls": start_tls_listener(cert_path, key_path).getsockname()[1],
+        "http": start_http_server(http_latency_ms).server_address[1],
+    }
+    conn.send(ports)
+    conn.recv()  # bloqueia até o pedido de parada
+
+
+class StandIns:
+    """
+    Sobe todos os servidores em um processo próprio. Uso:
+
+        with StandIns() as standins:
+            standins.ports["tls"], standins.cert_path
+    """
+
+    def __init__(self, http_latency_ms: float = 5.0, slow_accept_ms: float = 2.0):
+        self.http_latency_ms = http_latency_ms
+        self.slow_accept_ms = slow_accept_ms
+        self.ports = {}
+        self._tmp = None
+        self._process = None
+        self._conn = None
+
+    def __enter__(self):
+        self._tmp = tempfile.TemporaryDirectory(prefix="net-tools-bench-")
+        self.cert_path, self.key_path = generate_self_signed(self._tmp.name)
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child = ctx.Pipe()
+        self._process = ctx.Process(target=_run_standins, name="bench-standins", daemon=True,
+                                    args=(child, self.cert_path, self.key_path,
+                                          self.http_latency_ms, self.slow_accept_ms))
+        self._process.start()
+        if not self._conn.poll(30):
+            self.__exit__(None, None, None)
+            raise RuntimeError("os servidores locais não subiram")
+        self.ports = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc):
+        if self._conn is not None:
+            try:
+                self._conn.send("stop")
+            except OSError:
+                pass
+        if self._process is not None:
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._tmp is not None:
+            self._tmp.cleanup()
@@ -0,0 +1,196 @@
+"""
+Suíte de benchmarks offline: todos os tipos de teste contra servidores locais
+(ver benchmarks/servers.py), em vários níveis de concorrência.
+
+Cada cenário roda em um processo novo, então a CPU e o pico de memória (RSS)
+medidos são só daquele cenário. O resultado sai em JSON para comparar entre
+versões (ex.: guardar o arquivo de cada commit e comparar probes_per_sec).
+
+Uso:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --probes 2000 --concurrency 1,10,100 --output bench.json
+    python -m benchmarks.suite --only ssl,curl
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.servers import StandIns
+
+
+def _scenarios(concurrency_levels, probes: int, timeout: float):
+    top = max(concurrency_levels)
+    scenarios = []
+    for c in concurrency_levels:
+        scenarios += [
+            {"name": f"socket-thread-c{c}", "probe": "socket", "engine": "thread", "concurrency": c},
+            {"name": f"socket-async-c{c}", "probe": "socket", "engine": "async", "concurrency": c},
+            {"name": f"netcat-banner-c{c}", "probe": "netcat", "engine": "thread", "concurrency": c,
+             "target": "banner"},
+            {"name": f"ssl-c{c}", "probe": "ssl", "engine": "thread", "concurrency": c},
+            {"name": f"curl-easy-c{c}", "probe": "curl", "engine": "easy", "concurrency": c},
+            {"name": f"curl-multi-c{c}", "probe": "curl", "engine": "multi", "concurrency": c},
+        ]
+    # Alvos ruins só na maior concorrência: com blackhole cada teste leva `timeout`
+    scenarios += [
+        {"name": f"socket-mixed-async-c{top}", "probe": "socket", "engine": "async", "concurrency": top,
+         "target": "mixed"},
+        {"name": f"netcat-slow-accept-c{top}", "probe": "netcat", "engine": "thread", "concurrency": top,
+         "target": "slow"},
+    ]
+    for scenario in scenarios:
+        scenario.setdefault("target", {"ssl": "tls", "curl": "http"}.get(scenario["probe"], "accept"))
+        scenario["probes"] = probes
+        scenario["timeout"] = timeout
+    return scenarios
+
+
+def _targets(scenario: dict, ports: dict, count: int):
+    host = "127.0.0.1"
+    if scenario["probe"] == "curl":
+        return [f"http://{host}:{ports['http']}/{i}" for i in range(count)]
+    if scenario["target"] != "mixed":
+        return [(host, ports[scenario["target"]])] * count
+    # 80% aceitam, 15% recusam, 5% sem resposta
+    mix = ["accept"] * 16 + ["refused"] * 3 + ["blackhole"]
+    return [(host, ports[mix[i % len(mix)]]) for i in range(count)]
+
+
+def _run_rows(scenario: dict, targets):
+    from utils.batch import iter_netcat_batch, iter_socket_batch, iter_ssl_batch, iter_thread_batch
+
+    probe, engine, c = scenario["probe"], scenario["engine"], scenario["concurrency"]
+    timeout = scenario["timeout"]
+    if probe == "curl":
+        # CURLOPT_TIMEOUT só aceita segundos inteiros
+        timeout = max(1, math.ceil(timeout))
+    if probe == "socket":
+        return iter_socket_batch(targets, timeout, c, engine, c)
+    if probe == "netcat":
+        return iter_netcat_batch(targets, timeout, c, banner=True)
+    if probe == "ssl":
+        return iter_ssl_batch(targets, timeout, c)
+    if engine == "multi":
+        from tests.curl_batch import iter_curl_batch
+        return iter_curl_batch(targets, "GET", timeout, parallel=c, per_host=c, http2=False)
+
+    from tests.connectivity_tests import test_curl_connection
+
+    def easy():
+        for _, probe_result, error in iter_thread_batch(lambda url: test_curl_connection(url, "GET", timeout),
+                                                        ((url,) for url in targets), c, pool="curl-easy"):
+            yield {"status": "error"} if error else {"status": "success" if probe_result else "failure",
+                                                     **probe_result.fields()}
+    return easy()
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def rank(p):
+        return round(values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))], 3)
+
+    return {"p50": rank(50), "p90": rank(90), "p99": rank(99), "max": round(values[-1], 3)}
+
+
+def run_scenario(scenario: dict, ports: dict, cert_path: str) -> dict:
+    """Executado em um processo novo: aquece, mede e devolve as métricas do cenário."""
+    import resource
+
+    # O certificado autoassinado do servidor TLS local passa a ser a CA confiável
+    os.environ["SSL_CERT_FILE"] = cert_path
+    logging.getLogger("connectivity_tool").setLevel(logging.CRITICAL)
+
+    warmup = min(50, scenario["probes"])
+    for _ in _run_rows(scenario, _targets(scenario, ports, warmup)):
+        pass
+
+    targets = _targets(scenario, ports, scenario["probes"])
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    latencies = []
+    success = 0
+    for row in _run_rows(scenario, targets):
+        if row["status"] == "success":
+            success += 1
+        if row.get("total_ms") is not None:
+            latencies.append(row["total_ms"])
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    rss_mb = after.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {
+        **{key: scenario[key] for key in ("name", "probe", "engine", "concurrency", "target")},
+        "probes": len(targets),
+        "success": success,
+        "seconds": round(elapsed, 3),
+        "probes_per_sec": round(len(targets) / elapsed, 1),
+        "latency_ms": _percentiles(latencies),
+        "cpu_ms_per_probe": round(cpu * 1000 / len(targets), 4),
+        "peak_rss_mb": round(rss_mb, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probes", type=int, default=1000, help="Testes por cenário")
+    parser.add_argument("--concurrency", default="1,10,100", help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--http-latency-ms", type=float, default=5.0)
+    parser.add_argument("--slow-accept-ms", type=float, default=2.0)
+    parser.add_argument("--only", default="", help="Roda só cenários cujo nome contém um destes termos (vírgula)")
+    parser.add_argument("--output", help="Também grava o JSON neste arquivo")
+    args = parser.parse_args()
+
+    levels = sorted({int(c) for c in args.concurrency.split(",") if c.strip()})
+    scenarios = _scenarios(levels, args.probes, args.timeout)
+    if args.only:
+        terms = [t.strip() for t in args.only.split(",") if t.strip()]
+        scenarios = [s for s in scenarios if any(t in s["name"] for t in terms)]
+
+    results = []
+    with StandIns(args.http_latency_ms, args.slow_accept_ms) as standins:
+        ctx = multiprocessing.get_context("spawn")
+        for scenario in scenarios:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                try:
+                    result = executor.submit(run_scenario, scenario, standins.ports, standins.cert_path).result()
+                except Exception as e:
+                    result = {"name": scenario["name"], "error": repr(e)}
+                    print(f"{scenario['name']:<28} falhou: {e!r}", file=sys.stderr)
+                else:
+                    print(f"{result['name']:<28} {result['probes_per_sec']:>10} probes/s", file=sys.stderr)
+            results.append(result)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "probes_per_scenario": args.probes,
+            "timeout": args.timeout,
+            "http_latency_ms": args.http_latency_ms,
+        },
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
-from flask import Flask, render_template, request, Response, redirect, url_for
+from flask import Flask, render_template, request, Response, stream_template
+from markupsafe import escape
 from werkzeug.security import check_password_hash, generate_password_hash
+import ipaddress
+import os
 import socket
-import subprocess
-import platform
-import locale
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from utils.batch import iter_thread_batch
+from utils.dns_cache import create_connection
+from utils.jobs import remove_file, spool_upload
+from utils.targets import parse_line
+from tests.icmp_ping import ping_host
 
 app = Flask(__name__)
 
+# Limite opcional de testes por envio depois de expandir faixas (CIDR, 8000-8100...); 0 = sem limite
+MAX_BULK_TARGETS = int(os.environ.get("BULK_MAX_TARGETS", "0"))
+# Threads de teste por envio: padrão e máximo que o formulário pode pedir
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "10"))
+BULK_MAX_WORKERS = int(os.environ.get("BULK_MAX_WORKERS", "200"))
+# Resultados enviados ao navegador a cada BULK_CHUNK testes ou BULK_FLUSH_SECONDS
+BULK_CHUNK = 200
+BULK_FLUSH_SECONDS = 0.5
+
 # Configurações de autenticação (substitua com usuários reais)
 users = {
     'admin': generate_password_hash('senha123')
@@ -38,27 +52,21 @@ def requires_auth(f):
     return decorated
 
 def ping(host):
-    """Executa o comando ping e retorna o resultado com a decodificação apropriada."""
-    param = '-n' if platform.system().lower() == 'windows' else '-c'
-    command = ['ping', param, '1', host]
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate(timeout=5)
-
-    if platform.system().lower() == 'windows':
-        try:
-            return stdout.decode('cp850')
-        except UnicodeDecodeError:
-            return "Erro ao decodificar a saída do ping (cp850)."
-    else:  # Assumindo Linux ou outro sistema com UTF-8
-        try:
-            return stdout.decode('utf-8')
-        except UnicodeDecodeError:
-            return "Erro ao decodificar a saída do ping (utf-8)."
+    """Pinga o host pelo motor ICMP do processo (tests/icmp_ping.py) e devolve um relatório no estilo do ping."""
+    result = ping_host(host, count=4, interval=0.2, timeout=1.0)
+    if not result.sent:
+        return f"Falha ao pingar {host}: {result.error}"
+    lines = [f"PING {host} ({result.ip}) via {result.method}",
+             f"{result.sent} pacotes transmitidos, {result.received} recebidos, {result.loss_pct}% de perda"]
+    if result:
+        lines.append(f"rtt mín/média/máx = {result.rtt_min_ms}/{result.rtt_avg_ms}/{result.rtt_max_ms} ms"
+                     + (f", jitter {result.jitter_ms} ms" if result.jitter_ms is not None else ""))
+    return "\n".join(lines)
 
 def check_port(host, port):
     """Tenta conectar a um host e porta específicos."""
     try:
-        with socket.create_connection((host, port), timeout=2):
+        with create_connection((host, port), timeout=2):
             return f"Conexão bem-sucedida com {host}:{port}"
     except (socket.timeout, ConnectionRefusedError, OSError) as e:
         return f"Falha ao conectar com {host}:{port}: {e}"
@@ -83,20 +91,17 @@ def check_port(host, port):
 #         return f"Falha ao conectar com {host}:{port}: {e}"
     
 def ping_executor(host):
-    """Tenta conectar à porta 80 do host para verificar a conectividade e retorna o resultado."""
-    port = 80  # Porta HTTP (uma porta comumente aberta)
-    timeout = 2  # Timeout em segundos
-    try:
-        socket.create_connection((host, port), timeout=timeout)
-        return f"Host {host} está acessível (conexão TCP na porta {port} bem-sucedida)."
-    except (socket.timeout, socket.gaierror, ConnectionRefusedError, OSError) as e:
-        return f"Falha ao conectar ao host {host} (porta {port}): {e}"
+    """Um echo ICMP (ou connect TCP na porta 80, sem permissão para ICMP) e retorna o resultado."""
+    result = ping_host(host, count=1, timeout=2)
+    if result:
+        return f"Host {host} está acessível ({result.method}, {result.rtt_avg_ms:.2f} ms)."
+    return f"Falha ao pingar o host {host} ({result.method or 'dns'}): {result.error}"
 
 def check_port_executor(host, port):
     """Tenta conectar a um host e porta específicos e retorna o resultado."""
     timeout = 2  # Timeout em segundos
     try:
-        socket.create_connection((host, port), timeout=timeout)
+        create_connection((host, port), timeout=timeout).close()
         return f"Conexão bem-sucedida com {host}:{port}"
     except (socket.timeout, socket.gaierror, ConnectionRefusedError, OSError) as e:
         return f"Falha ao conectar com {host}:{port}: {e}"
@@ -119,7 +124,7 @@ def index():
 
         if target_host:
             if test_type == 'ping':
-                results['ping'] = ping_executor(target_host)
+                results['ping'] = ping(target_host)
             elif test_type == 'port':
                 if target_port and target_port.isdigit():
                     results['port'] = check_port_executor(target_host, int(target_port))
@@ -132,6 +137,95 @@ def index():
 
     return render_template('index.html', results=results, target_host_value=target_host_value, test_type_value=test_type_value, target_port_value=target_port_value, bulk_results=None, bulk_summary=None)
 
+def _is_ip(text):
+    try:
+        ipaddress.ip_address(text)
+        return True
+    except ValueError:
+        return False
+
+def _bulk_targets(lines):
+    """
+    (tipo, host, porta) sob demanda, linha a linha: só o host vira um ping (todos
+    no mesmo socket ICMP, ver tests/icmp_ping.py). Linhas inválidas e o limite de testes também viram itens, com
+    a mensagem no lugar da porta, para sair na lista junto dos resultados.
+    """
+    count = 0
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        try:
+            spec = parse_line(line)
+        except ValueError as e:
+            if not any(c in line for c in ':, \t') or _is_ip(line):
+                targets = [('ping', line, None)]
+            else:
+                targets = [('invalid', line, str(e))]
+        else:
+            targets = (('port', host, port) for host, port in spec or ())
+        for target in targets:
+            count += 1
+            if MAX_BULK_TARGETS and count > MAX_BULK_TARGETS:
+                yield ('limit', '', MAX_BULK_TARGETS)
+                return
+            yield target
+
+def _bulk_probe(kind, host, port):
+    if kind == 'ping':
+        return ping_executor(host)
+    if kind == 'port':
+        return check_port_executor(host, port)
+    if kind == 'limit':
+        return f"Limite de {port} testes por envio atingido; o restante do arquivo foi ignorado."
+    return f"Formato inválido: {host} ({port})."
+
+def _is_success(result):
+    return "bem-sucedida" in result or "acessível" in result
+
+def _bulk_chunk(results, success_count, error_count, done=False):
+    """Bloco de <li> já escapados mais a atualização do resumo na página."""
+    items = ''.join(
+        f'<li class="{"success" if _is_success(result) else "error"}">{escape(result)}</li>'
+        for result in results
+    )
+    return f'{items}<script>bulkProgress({success_count}, {error_count}, {"true" if done else "false"});</script>\n'
+
+def _bulk_stream(path, workers):
+    """
+    Lê o arquivo `path` linha a linha, executa os testes em um pool de `workers`
+    threads (no máximo workers x 4 alvos lidos à frente) e gera blocos de HTML
+    conforme terminam. A memória por envio não depende do tamanho do arquivo:
+    nada além do bloco atual fica guardado. Remove `path` ao terminar.
+    """
+    success_count = 0
+    error_count = 0
+    pending = []
+    flushed = time.monotonic()
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as lines:
+            for _, result, error in iter_thread_batch(_bulk_probe, _bulk_targets(lines), workers, pool="flask"):
+                if error is not None:
+                    result = f"Erro ao executar teste: {error}"
+                if _is_success(result):
+                    success_count += 1
+                else:
+                    error_count += 1
+                pending.append(result)
+                if len(pending) >= BULK_CHUNK or time.monotonic() - flushed >= BULK_FLUSH_SECONDS:
+                    yield _bulk_chunk(pending, success_count, error_count)
+                    pending = []
+                    flushed = time.monotonic()
+    except UnicodeDecodeError:
+        error_count += 1
+        pending.append("Erro ao decodificar o arquivo. Certifique-se de que ele esteja em UTF-8.")
+    except Exception as e:
+        error_count += 1
+        pending.append(f"Ocorreu um erro ao processar o arquivo: {e}")
+    finally:
+        remove_file(path)
+    yield _bulk_chunk(pending, success_count, error_count, done=True)
+
 @app.route('/bulk_test', methods=['POST'])
 @requires_auth
 def bulk_test():
@@ -143,57 +237,17 @@ def bulk_test():
     if file.filename == '':
         return render_template('index.html', error="Nenhum arquivo selecionado.", bulk_results=None, bulk_summary=None)
 
-    if file:
-        all_results = []
-        success_count = 0
-        error_count = 0
-        futures = []
-        max_workers = 10  # Defina um número máximo razoável de threads
-        try:
-            lines = file.read().decode('utf-8').splitlines()
-            if len(lines) > 100:
-                return render_template('index.html', error="O arquivo deve conter no máximo 100 linhas.", bulk_results=None, bulk_summary=None)
-
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                for line in lines:
-                    line = line.strip()
-                    if line:
-                        if ':' in line:
-                            host, port_str = line.split(':', 1)
-                            if port_str.isdigit():
-                                future = executor.submit(check_port_executor, host.strip(), int(port_str))
-                            else:
-                                all_results.append(f"Formato inválido: {line} (porta deve ser um número).")
-                                error_count += 1
-                                continue
-                        else:
-                            future = executor.submit(ping_executor, line.strip())
-
-                        if 'future' in locals():
-                            futures.append(future)
-                            del future # Limpa a variável para a próxima iteração
-
-                for future in as_completed(futures):
-                    try:
-                        result = future.result()
-                        all_results.append(result)
-                        if "bem-sucedida" in result or "acessível" in result:
-                            success_count += 1
-                        else:
-                            error_count += 1
-                    except Exception as e:
-                        error_count += 1
-                        all_results.append(f"Erro ao executar teste: {e}")
-
-        except UnicodeDecodeError:
-            return render_template('index.html', error="Erro ao decodificar o arquivo. Certifique-se de que ele esteja em UTF-8.", bulk_results=None, bulk_summary=None)
-        except Exception as e:
-            return render_template('index.html', error=f"Ocorreu um erro ao processar o arquivo: {e}", bulk_results=None, bulk_summary=None)
-
-        bulk_summary = f"Resumo: {success_count} conexões bem-sucedidas, {error_count} falhas."
-        return render_template('index.html', bulk_results=all_results, bulk_summary=bulk_summary)
-
-    return redirect(url_for('index'))
+    workers = request.form.get('workers') or str(BULK_WORKERS)
+    if not workers.isdigit() or not 1 <= int(workers) <= BULK_MAX_WORKERS:
+        return render_template('index.html', error=f"Threads deve ser um número entre 1 e {BULK_MAX_WORKERS}.", bulk_results=None, bulk_summary=None)
+
+    # O Flask fecha o upload ao fim da view, antes da resposta em streaming: copia para um arquivo próprio
+    path, _ = spool_upload(file.stream)
+    response = Response(stream_template('index.html', bulk_stream=_bulk_stream(path, int(workers)),
+                                        bulk_workers=int(workers), bulk_results=None, bulk_summary=None))
+    # Proxies como o nginx não devem segurar a resposta até o fim
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,17 +1,47 @@
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Com `main.py daemon` rodando, os testes individuais vão para o processo
+    # residente antes de carregar typer e os módulos de teste
+    from utils.daemon import forward
+
+    exit_code = forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
 import typer
-from tests.connectivity_tests import (
-    test_socket_connection,
-    test_netcat_connection,
-    test_curl_connection,
-    test_ssl_connection
-)
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
 app = typer.Typer(help="🛠️ Ferramenta de Troubleshooting de Conectividade entre Servidores")
 
+
+@app.callback()
+def options(
+    log_level: str = typer.Option(None, "--log-level", help="Nível do log: DEBUG, INFO, WARNING ou ERROR (padrão: INFO)"),
+    log_format: str = typer.Option(None, "--log-format", help="Formato do log: text ou json (padrão: text)"),
+    log_probes: str = typer.Option(None, "--log-probes", help="Linhas por teste nos lotes: all, sample, aggregate ou summary (padrão: summary)")
+):
+    """
+    Opções de log valem para todos os comandos e para os processos de --processes.
+    """
+    import os
+    from utils.logger import PROBE_MODES, configure_logging, configure_probe_logging
+
+    if log_format not in (None, "text", "json"):
+        logger.error(f"❌ Formato de log inválido: {log_format} (use text ou json)")
+        raise typer.Exit(code=1)
+    if log_probes is not None and log_probes not in PROBE_MODES:
+        logger.error(f"❌ Modo de log inválido: {log_probes} (use {', '.join(PROBE_MODES)})")
+        raise typer.Exit(code=1)
+    # Os processos de --processes (spawn) leem as mesmas variáveis ao importar o logger
+    for name, value in (("LOG_LEVEL", log_level), ("LOG_FORMAT", log_format), ("LOG_BATCH_PROBES", log_probes)):
+        if value:
+            os.environ[name] = value
+    configure_logging(log_level, log_format)
+    configure_probe_logging(batch=log_probes)
+
 @app.command()
 def socket(
     host: str = typer.Option(..., "--host", help="Hostname ou IP para testar"),
@@ -19,16 +49,23 @@ def socket(
     timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)")
 ):
     """🔌 Testa conexão via socket TCP"""
-    test_socket_connection(host, port, timeout)
+    from tests.connectivity_tests import test_socket_connection
+
+    _log_timings(test_socket_connection(host, port, timeout))
 
 @app.command()
 def netcat(
     host: str = typer.Option(..., "--host", help="Hostname ou IP para testar"),
     port: int = typer.Option(..., "--port", help="Porta de destino"),
-    timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)")
+    timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)"),
+    udp: bool = typer.Option(False, "--udp", help="Testa a porta em UDP (como nc -u)"),
+    banner: bool = typer.Option(False, "--banner", help="Lê o banner enviado pelo servidor após conectar"),
+    banner_bytes: int = typer.Option(1024, "--banner-bytes", help="Máximo de bytes do banner (padrão: 1024)")
 ):
     """🔗 Testa conexão via netcat"""
-    test_netcat_connection(host, port, timeout)
+    from tests.connectivity_tests import test_netcat_connection
+
+    _log_timings(test_netcat_connection(host, port, timeout, udp, banner, banner_bytes))
 
 @app.command()
 def curl(
@@ -39,7 +76,9 @@ def curl(
     proxy_port: int = typer.Option(None, "--proxy-port", help="Proxy porta (opcional)")
 ):
     """🌐 Testa conexão HTTP via cURL"""
-    test_curl_connection(url, method, timeout, proxy_host, proxy_port)
+    from tests.connectivity_tests import test_curl_connection
+
+    _log_timings(test_curl_connection(url, method, timeout, proxy_host, proxy_port))
 
 @app.command()
 def ssl(
@@ -48,71 +87,682 @@ def ssl(
     timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos")
 ):
     """🔒 Testa conexão SSL, validade do certificado e suporte a TLS/cifras"""
-    test_ssl_connection(host, port, timeout)
+    from tests.connectivity_tests import test_ssl_connection
+
+    _log_timings(test_ssl_connection(host, port, timeout))
+
+@app.command()
+def ping(
+    host: str = typer.Option(..., "--host", help="Hostname ou IP para testar"),
+    count: int = typer.Option(4, "--count", help="Echos enviados (padrão: 4)"),
+    interval: float = typer.Option(1.0, "--interval", help="Segundos entre os echos (padrão: 1)"),
+    timeout: float = typer.Option(1.0, "--timeout", help="Espera pela resposta de cada echo, em segundos (padrão: 1)"),
+    method: str = typer.Option("auto", "--method", help="auto (ICMP; TCP se o ICMP não for permitido), icmp ou tcp")
+):
+    """📡 Ping ICMP sem privilégio (ou connect TCP), com RTT, perda e jitter"""
+    from tests.icmp_ping import PING_METHODS, ping_host
+
+    if method not in PING_METHODS:
+        logger.error(f"❌ Método inválido: {method} (use {', '.join(PING_METHODS)})")
+        raise typer.Exit(code=1)
+    _log_ping(ping_host(host, count, interval, timeout, method))
 
 @app.command("socket-batch")
 def socket_batch(
     file: str = typer.Option(..., "--file", help="Arquivo .txt ou .csv com lista de host:porta ou host,porta"),
     timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)"),
     workers: int = typer.Option(10, "--workers", help="Número de threads paralelas (padrão: 10)"),
-    json_output: bool = typer.Option(False, "--json", help="Exibir resultado em JSON")
+    engine: str = typer.Option("thread", "--engine", help="Motor de execução: thread ou async (padrão: thread)"),
+    concurrency: int = typer.Option(1000, "--concurrency", help="Conexões simultâneas no motor async (padrão: 1000)"),
+    processes: int = typer.Option(1, "--processes", help="Processos paralelos, cada um com seu motor (padrão: 1)"),
+    json_output: bool = typer.Option(False, "--json", help="Exibir resultado em JSON (atalho para --output json)"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text, json, ndjson ou csv (padrão: text)"),
+    adaptive_timeout: bool = typer.Option(False, "--adaptive-timeout", help="Timeout por alvo a partir do RTT observado (p99 x TIMEOUT_MULTIPLIER), com --timeout como teto"),
+    deadline: float = typer.Option(None, "--deadline", help="Prazo total do lote em segundos; alvos não testados a tempo saem com error=deadline"),
+    rate: float = typer.Option(None, "--rate", help="Máximo de testes iniciados por segundo no lote inteiro (somando os processos)"),
+    max_per_host: int = typer.Option(None, "--max-per-host", help="Máximo de testes simultâneos no mesmo host; os alvos saem em rodízio entre hosts"),
+    max_per_subnet: int = typer.Option(None, "--max-per-subnet", help="Máximo de testes simultâneos na mesma sub-rede /24 (IPv6: /64)"),
+    prune_after: int = typer.Option(None, "--prune-after", help="Depois de N timeouts seguidos em um host, pula os alvos restantes dele (status=skipped)"),
+    prune_subnet: float = typer.Option(None, "--prune-subnet", help="Pula também os hosts ainda sem resposta de uma /24 (IPv6: /64) em que essa fração dos hosts vistos está fora (ex.: 0.9)"),
+    precheck: bool = typer.Option(False, "--precheck", help="Pinga cada host antes do primeiro teste e pula os que não respondem"),
+    store: str = typer.Option(None, "--store", help="Banco SQLite onde os resultados ficam guardados (ex.: results.db)"),
+    retry_failed: bool = typer.Option(False, "--retry-failed", help="Com --store, testa só alvos novos ou que não tiveram sucesso na última execução"),
+    stale_after: float = typer.Option(None, "--stale-after", help="Com --store, testa de novo também sucessos mais antigos que N minutos"),
+    only_changed: bool = typer.Option(False, "--only-changed", help="Com --store, mostra só alvos cujo status mudou desde a última execução"),
+    metrics_port: int = typer.Option(None, "--metrics-port", help="Expõe métricas do Prometheus em :PORTA/metrics durante a execução")
 ):
     """
     📄 Testa múltiplos hosts e portas via socket em paralelo, a partir de um arquivo .txt ou .csv.
     """
     import os
-    import csv
-    import json
-    from tests.connectivity_tests import test_socket_connection
+    from utils.batch import iter_targets, iter_socket_batch
+    from utils.ratelimit import BatchLimits
+    from utils.reachability import Reachability
 
     if not os.path.isfile(file):
         logger.error(f"❌ Arquivo não encontrado: {file}")
         raise typer.Exit(code=1)
 
-    # Detecta delimitador e lê pares host/porta
-    targets = []
+    if engine not in ("thread", "async"):
+        logger.error(f"❌ Motor inválido: {engine} (use thread ou async)")
+        raise typer.Exit(code=1)
+
+    if json_output:
+        output = "json"
+    if output not in ("text", "json", "ndjson", "csv"):
+        logger.error(f"❌ Formato inválido: {output} (use text, json, ndjson ou csv)")
+        raise typer.Exit(code=1)
+
+    if engine == "async":
+        _raise_open_files_limit(concurrency + 64)
+        logger.info(f"🚀 Iniciando testes assíncronos (até {concurrency} simultâneos por processo)...")
+    else:
+        logger.info(f"🚀 Iniciando testes em paralelo ({workers} threads por processo)...")
+
+    options = {"timeout": timeout, "workers": workers, "engine": engine, "concurrency": concurrency}
+    group = _start_metrics(metrics_port, file)
+    options.update(_timeout_options(adaptive_timeout, deadline))
+    options.update(_limit_options(rate, max_per_host, max_per_subnet, processes))
+    options.update(_prune_options(prune_after, prune_subnet, precheck))
+    persist = _open_store(store, file, retry_failed, stale_after, only_changed)
     with open(file, "r") as f:
-        sample = f.readline()
-        delimiter = ',' if ',' in sample else ':'
-        f.seek(0)
-        reader = csv.reader(f, delimiter=delimiter)
-        for row in reader:
-            if len(row) != 2:
-                logger.warning(f"⚠️ Linha inválida: {row}")
-                continue
-            host, port = row
-            try:
-                targets.append((host.strip(), int(port.strip())))
-            except ValueError:
-                logger.warning(f"⚠️ Porta inválida: {port}")
-
-    results = []
-
-    logger.info(f"🚀 Iniciando testes em paralelo ({len(targets)} alvos)...")
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_to_target = {
-            executor.submit(test_socket_connection, host, port, timeout): (host, port)
-            for host, port in targets
-        }
-
-        for future in as_completed(future_to_target):
-            host, port = future_to_target[future]
-            try:
-                success = future.result()
-                results.append({"host": host, "port": port, "status": "success" if success else "failure"})
-            except Exception as e:
-                logger.error(f"❌ Erro ao testar {host}:{port} - {e}")
-                results.append({"host": host, "port": port, "status": "error"})
+        summary = _run_batch("socket", iter_targets(f), options, processes, output,
+                             lambda targets: iter_socket_batch(targets, timeout, workers, engine, concurrency,
+                                                               options["adaptive"], options["deadline_at"],
+                                                               BatchLimits.from_options(options["limits"]),
+                                                               Reachability.from_options(options["prune"])),
+                             group=group, persist=persist)
 
     # Exibe resumo
-    total = len(results)
-    success = len([r for r in results if r["status"] == "success"])
-    failure = total - success
-    logger.info(f"\n📊 Resultado final: {success} sucesso(s), {failure} falha(s), {total} total")
+    _log_summary(summary)
 
-    if json_output:
-        print(json.dumps(results, indent=2))
+
+@app.command("ssl-batch")
+def ssl_batch(
+    file: str = typer.Option(..., "--file", help="Arquivo .txt ou .csv com lista de host:porta ou host,porta"),
+    timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)"),
+    workers: int = typer.Option(10, "--workers", help="Número de threads paralelas (padrão: 10)"),
+    processes: int = typer.Option(1, "--processes", help="Processos paralelos, cada um com suas threads (padrão: 1)"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text (relatório), json, ndjson ou csv (padrão: text)"),
+    adaptive_timeout: bool = typer.Option(False, "--adaptive-timeout", help="Timeout por alvo a partir do RTT observado (p99 x TIMEOUT_MULTIPLIER), com --timeout como teto"),
+    deadline: float = typer.Option(None, "--deadline", help="Prazo total do lote em segundos; alvos não testados a tempo saem com error=deadline"),
+    rate: float = typer.Option(None, "--rate", help="Máximo de testes iniciados por segundo no lote inteiro (somando os processos)"),
+    max_per_host: int = typer.Option(None, "--max-per-host", help="Máximo de testes simultâneos no mesmo host; os alvos saem em rodízio entre hosts"),
+    max_per_subnet: int = typer.Option(None, "--max-per-subnet", help="Máximo de testes simultâneos na mesma sub-rede /24 (IPv6: /64)"),
+    prune_after: int = typer.Option(None, "--prune-after", help="Depois de N timeouts seguidos em um host, pula os alvos restantes dele (status=skipped)"),
+    prune_subnet: float = typer.Option(None, "--prune-subnet", help="Pula também os hosts ainda sem resposta de uma /24 (IPv6: /64) em que essa fração dos hosts vistos está fora (ex.: 0.9)"),
+    precheck: bool = typer.Option(False, "--precheck", help="Pinga cada host antes do primeiro teste e pula os que não respondem"),
+    store: str = typer.Option(None, "--store", help="Banco SQLite onde os resultados ficam guardados (ex.: results.db)"),
+    retry_failed: bool = typer.Option(False, "--retry-failed", help="Com --store, testa só alvos novos ou que não tiveram sucesso na última execução"),
+    stale_after: float = typer.Option(None, "--stale-after", help="Com --store, testa de novo também sucessos mais antigos que N minutos"),
+    only_changed: bool = typer.Option(False, "--only-changed", help="Com --store, mostra só alvos cujo status mudou desde a última execução"),
+    metrics_port: int = typer.Option(None, "--metrics-port", help="Expõe métricas do Prometheus em :PORTA/metrics durante a execução")
+):
+    """
+    🔒 Testa SSL/certificado de múltiplos hosts e portas em paralelo, a partir de um arquivo .txt ou .csv.
+    O relatório (text/json) sai ordenado pelos dias até o vencimento do certificado.
+    """
+    import os
+    from utils.batch import BatchSummary, iter_targets, iter_ssl_batch, ssl_report
+    from utils.ratelimit import BatchLimits
+    from utils.reachability import Reachability
+    from utils.results import ResultTable
+
+    if not os.path.isfile(file):
+        logger.error(f"❌ Arquivo não encontrado: {file}")
+        raise typer.Exit(code=1)
+    if output not in ("text", "json", "ndjson", "csv"):
+        logger.error(f"❌ Formato inválido: {output} (use text, json, ndjson ou csv)")
+        raise typer.Exit(code=1)
+
+    logger.info(f"🚀 Iniciando testes SSL em paralelo ({workers} threads por processo)...")
+    options = {"timeout": timeout, "workers": workers}
+    # O NDJSON sai conforme os testes terminam; text e json precisam de todas as linhas para ordenar
+    collected = None if output == "ndjson" else ResultTable()
+    group = _start_metrics(metrics_port, file)
+    options.update(_timeout_options(adaptive_timeout, deadline))
+    options.update(_limit_options(rate, max_per_host, max_per_subnet, processes))
+    options.update(_prune_options(prune_after, prune_subnet, precheck))
+    persist = _open_store(store, file, retry_failed, stale_after, only_changed)
+    with open(file, "r") as f:
+        summary = _run_batch("ssl", iter_targets(f), options, processes, "ndjson" if collected is None else "none",
+                             lambda targets: iter_ssl_batch(targets, timeout, workers, options["adaptive"],
+                                                            options["deadline_at"],
+                                                            BatchLimits.from_options(options["limits"]),
+                                                            Reachability.from_options(options["prune"])),
+                             collected, group, persist)
+
+    if collected is not None:
+        report = ssl_report(collected)
+        if output in ("json", "csv"):
+            # Já ordenado; sai linha a linha como nos outros lotes
+            _emit_rows(report, output, BatchSummary())
+        else:
+            _print_ssl_report(report)
+    _log_summary(summary)
+
+
+def _print_ssl_report(report):
+    print(f"{'DIAS':>5}  {'VENCE EM':<10}  {'ALVO':<40}  EMISSOR / ERRO")
+    for row in report:
+        target = f"{row['host']}:{row['port']}"
+        if row.get("days_left") is None:
+            print(f"{'-':>5}  {'-':<10}  {target:<40}  {row.get('error', row['status'])}")
+            continue
+        flag = "" if row["status"] == "success" else f" [{row.get('verify_error') or row.get('error')}]"
+        print(f"{row['days_left']:>5}  {row['not_after'][:10]:<10}  {target:<40}  {row['issuer']}{flag}")
+
+
+@app.command("netcat-batch")
+def netcat_batch(
+    file: str = typer.Option(..., "--file", help="Arquivo .txt ou .csv com lista de host:porta ou host,porta"),
+    timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)"),
+    workers: int = typer.Option(10, "--workers", help="Número de threads paralelas (padrão: 10)"),
+    processes: int = typer.Option(1, "--processes", help="Processos paralelos, cada um com suas threads (padrão: 1)"),
+    udp: bool = typer.Option(False, "--udp", help="Testa as portas em UDP (como nc -u)"),
+    banner: bool = typer.Option(False, "--banner", help="Lê o banner enviado pelo servidor após conectar"),
+    banner_bytes: int = typer.Option(1024, "--banner-bytes", help="Máximo de bytes do banner (padrão: 1024)"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text, json, ndjson ou csv (padrão: text)"),
+    adaptive_timeout: bool = typer.Option(False, "--adaptive-timeout", help="Timeout por alvo a partir do RTT observado (p99 x TIMEOUT_MULTIPLIER), com --timeout como teto"),
+    deadline: float = typer.Option(None, "--deadline", help="Prazo total do lote em segundos; alvos não testados a tempo saem com error=deadline"),
+    rate: float = typer.Option(None, "--rate", help="Máximo de testes iniciados por segundo no lote inteiro (somando os processos)"),
+    max_per_host: int = typer.Option(None, "--max-per-host", help="Máximo de testes simultâneos no mesmo host; os alvos saem em rodízio entre hosts"),
+    max_per_subnet: int = typer.Option(None, "--max-per-subnet", help="Máximo de testes simultâneos na mesma sub-rede /24 (IPv6: /64)"),
+    prune_after: int = typer.Option(None, "--prune-after", help="Depois de N timeouts seguidos em um host, pula os alvos restantes dele (status=skipped)"),
+    prune_subnet: float = typer.Option(None, "--prune-subnet", help="Pula também os hosts ainda sem resposta de uma /24 (IPv6: /64) em que essa fração dos hosts vistos está fora (ex.: 0.9)"),
+    precheck: bool = typer.Option(False, "--precheck", help="Pinga cada host antes do primeiro teste e pula os que não respondem"),
+    store: str = typer.Option(None, "--store", help="Banco SQLite onde os resultados ficam guardados (ex.: results.db)"),
+    retry_failed: bool = typer.Option(False, "--retry-failed", help="Com --store, testa só alvos novos ou que não tiveram sucesso na última execução"),
+    stale_after: float = typer.Option(None, "--stale-after", help="Com --store, testa de novo também sucessos mais antigos que N minutos"),
+    only_changed: bool = typer.Option(False, "--only-changed", help="Com --store, mostra só alvos cujo status mudou desde a última execução"),
+    metrics_port: int = typer.Option(None, "--metrics-port", help="Expõe métricas do Prometheus em :PORTA/metrics durante a execução")
+):
+    """
+    🔗 Testa múltiplos hosts e portas como o netcat, em paralelo e sem processos externos.
+    """
+    import os
+    from utils.batch import iter_targets, iter_netcat_batch
+    from utils.ratelimit import BatchLimits
+    from utils.reachability import Reachability
+
+    if not os.path.isfile(file):
+        logger.error(f"❌ Arquivo não encontrado: {file}")
+        raise typer.Exit(code=1)
+    if output not in ("text", "json", "ndjson", "csv"):
+        logger.error(f"❌ Formato inválido: {output} (use text, json, ndjson ou csv)")
+        raise typer.Exit(code=1)
+
+    logger.info(f"🚀 Iniciando testes netcat em paralelo ({workers} threads por processo)...")
+    options = {"timeout": timeout, "workers": workers, "udp": udp, "banner": banner, "banner_bytes": banner_bytes}
+    group = _start_metrics(metrics_port, file)
+    options.update(_timeout_options(adaptive_timeout, deadline))
+    options.update(_limit_options(rate, max_per_host, max_per_subnet, processes))
+    options.update(_prune_options(prune_after, prune_subnet, precheck))
+    persist = _open_store(store, file, retry_failed, stale_after, only_changed)
+    with open(file, "r") as f:
+        summary = _run_batch("netcat", iter_targets(f), options, processes, output,
+                             lambda targets: iter_netcat_batch(targets, timeout, workers, udp, banner, banner_bytes,
+                                                               options["adaptive"], options["deadline_at"],
+                                                               BatchLimits.from_options(options["limits"]),
+                                                               Reachability.from_options(options["prune"])),
+                             group=group, persist=persist)
+
+    _log_summary(summary)
+
+
+@app.command("ping-batch")
+def ping_batch(
+    file: str = typer.Option(..., "--file", help="Arquivo com um host, IP, CIDR ou faixa de IPs por linha"),
+    count: int = typer.Option(3, "--count", help="Echos por host (padrão: 3)"),
+    interval: float = typer.Option(0.2, "--interval", help="Segundos entre os echos de um host (padrão: 0.2)"),
+    timeout: float = typer.Option(1.0, "--timeout", help="Espera pela resposta de cada echo, em segundos (padrão: 1)"),
+    parallel: int = typer.Option(500, "--parallel", help="Hosts em andamento ao mesmo tempo (padrão: 500)"),
+    method: str = typer.Option("auto", "--method", help="auto (ICMP; TCP se o ICMP não for permitido), icmp ou tcp"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text, json, ndjson ou csv (padrão: text)"),
+    metrics_port: int = typer.Option(None, "--metrics-port", help="Expõe métricas do Prometheus em :PORTA/metrics durante a execução")
+):
+    """
+    📡 Pinga vários hosts com um único socket ICMP (todos os echos multiplexados).
+    Sem permissão para ICMP (net.ipv4.ping_group_range), usa connect TCP na porta PING_TCP_PORT (80).
+    """
+    import os
+    from tests.icmp_ping import PING_FIELDS, PING_METHODS, iter_ping_batch
+    from utils.batch import BatchSummary
+    from utils.targets import expand_hosts
+
+    if not os.path.isfile(file):
+        logger.error(f"❌ Arquivo não encontrado: {file}")
+        raise typer.Exit(code=1)
+    if output not in ("text", "json", "ndjson", "csv"):
+        logger.error(f"❌ Formato inválido: {output} (use text, json, ndjson ou csv)")
+        raise typer.Exit(code=1)
+    if method not in PING_METHODS:
+        logger.error(f"❌ Método inválido: {method} (use {', '.join(PING_METHODS)})")
+        raise typer.Exit(code=1)
+
+    logger.info(f"🚀 Iniciando ping em lote (até {parallel} hosts simultâneos, {count} echo(s) cada)...")
+    summary = BatchSummary()
+    group = _start_metrics(metrics_port, file)
+    with open(file, "r") as f:
+        rows = iter_ping_batch(expand_hosts(f), count, interval, timeout, parallel, method)
+        if group:
+            from utils.metrics import observe_rows
+            rows = observe_rows("ping", group, rows)
+        _emit_rows(rows, output, summary, fields=PING_FIELDS)
+
+    _log_summary(summary)
+
+
+@app.command("curl-batch")
+def curl_batch(
+    file: str = typer.Option(..., "--file", help="Arquivo com uma URL por linha"),
+    method: str = typer.Option("GET", "--method", help="Método HTTP (GET, POST, etc.)"),
+    timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)"),
+    parallel: int = typer.Option(50, "--parallel", help="Transferências simultâneas (padrão: 50)"),
+    per_host: int = typer.Option(6, "--per-host", help="Conexões simultâneas por host (padrão: 6)"),
+    http2: bool = typer.Option(True, "--http2/--no-http2", help="Negociar HTTP/2 e multiplexar quando possível"),
+    proxy_host: str = typer.Option(None, "--proxy-host", help="Proxy hostname (opcional)"),
+    proxy_port: int = typer.Option(None, "--proxy-port", help="Proxy porta (opcional)"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text, json, ndjson ou csv (padrão: text)"),
+    metrics_port: int = typer.Option(None, "--metrics-port", help="Expõe métricas do Prometheus em :PORTA/metrics durante a execução")
+):
+    """
+    🌐 Testa várias URLs via cURL multi, reaproveitando conexões, DNS e sessões TLS.
+    """
+    import os
+    from tests.curl_batch import CURL_FIELDS, iter_curl_batch
+    from utils.batch import iter_urls, BatchSummary
+
+    if not os.path.isfile(file):
+        logger.error(f"❌ Arquivo não encontrado: {file}")
+        raise typer.Exit(code=1)
+    if output not in ("text", "json", "ndjson", "csv"):
+        logger.error(f"❌ Formato inválido: {output} (use text, json, ndjson ou csv)")
+        raise typer.Exit(code=1)
+
+    logger.info(f"🚀 Iniciando testes HTTP (até {parallel} simultâneos, {per_host} por host)...")
+    summary = BatchSummary()
+    group = _start_metrics(metrics_port, file)
+    with open(file, "r") as f:
+        rows = iter_curl_batch(iter_urls(f), method, timeout, parallel, per_host, http2, proxy_host, proxy_port)
+        if group:
+            from utils.metrics import observe_rows
+            rows = observe_rows("curl", group, rows)
+        _emit_rows(rows, output, summary, fields=CURL_FIELDS)
+
+    _log_summary(summary)
+
+
+@app.command()
+def monitor(
+    file: str = typer.Option(..., "--file", help="Arquivo com host:porta[:intervalo] ou host,porta[,intervalo]"),
+    interval: float = typer.Option(60, "--interval", help="Intervalo padrão entre testes, em segundos (padrão: 60)"),
+    probe: str = typer.Option("socket", "--probe", help="Tipo de teste: socket, ssl ou netcat (padrão: socket)"),
+    timeout: int = typer.Option(5, "--timeout", help="Timeout em segundos (padrão: 5)"),
+    workers: int = typer.Option(50, "--workers", help="Testes simultâneos no máximo (padrão: 50)"),
+    jitter: float = typer.Option(0.1, "--jitter", help="Variação aleatória do intervalo, fração de 0 a 1 (padrão: 0.1)"),
+    history: int = typer.Option(1440, "--history", help="Amostras guardadas por alvo (padrão: 1440)"),
+    report_every: float = typer.Option(300, "--report-every", help="Intervalo do resumo de disponibilidade, em segundos (padrão: 300)"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text ou ndjson (padrão: text)"),
+    adaptive_timeout: bool = typer.Option(False, "--adaptive-timeout", help="Timeout de cada teste a partir do RTT observado do alvo, com --timeout como teto"),
+    metrics_port: int = typer.Option(None, "--metrics-port", help="Expõe métricas do Prometheus em :PORTA/metrics durante a execução")
+):
+    """
+    📡 Monitora os alvos continuamente até Ctrl+C, avisando quando um alvo cai ou volta.
+    """
+    import os
+    import sys
+    import json
+    import time
+    from utils.monitor import Monitor, parse_monitor_targets
+
+    if not os.path.isfile(file):
+        logger.error(f"❌ Arquivo não encontrado: {file}")
+        raise typer.Exit(code=1)
+    if probe not in ("socket", "ssl", "netcat"):
+        logger.error(f"❌ Tipo de teste inválido: {probe} (use socket, ssl ou netcat)")
+        raise typer.Exit(code=1)
+    if output not in ("text", "ndjson"):
+        logger.error(f"❌ Formato inválido: {output} (use text ou ndjson)")
+        raise typer.Exit(code=1)
+
+    group = _start_metrics(metrics_port, file)
+    with open(file, "r") as f:
+        targets = parse_monitor_targets(f, interval, history, group or "default")
+    if not targets:
+        logger.error("❌ Nenhum alvo válido no arquivo")
+        raise typer.Exit(code=1)
+
+    def on_result(target, row):
+        if output == "ndjson":
+            sys.stdout.write(json.dumps({"time": round(time.time(), 3), **row}) + "\n")
+            sys.stdout.flush()
+        elif target.last_status is not None and (row["status"] == "success") != (target.last_status == "success"):
+            if row["status"] == "success":
+                logger.info(f"🟢 {target.key} voltou")
+            else:
+                logger.error(f"🔴 {target.key} caiu ({row.get('error', row['status'])})")
+
+    mon = Monitor(targets, probe, timeout, workers, jitter, on_result=on_result, adaptive=adaptive_timeout)
+    mon.start()
+    try:
+        while True:
+            time.sleep(report_every)
+            _log_monitor_status(mon.status(report_every))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mon.stop()
+    _log_monitor_status(mon.status())
+
+
+@app.command()
+def daemon(
+    socket_path: str = typer.Option(None, "--socket", help="Socket Unix do daemon (padrão: CONNECTIVITY_DAEMON_SOCKET ou um arquivo no diretório temporário)")
+):
+    """
+    🔥 Mantém um processo aquecido atendendo os comandos socket, netcat, ssl, curl e ping.
+    Enquanto ele roda, esses comandos são repassados e respondem em milissegundos
+    (CONNECTIVITY_DAEMON=0 força a execução local).
+    """
+    # Importa os módulos de teste agora, não no primeiro comando repassado
+    import tests.connectivity_tests  # noqa: F401
+    import tests.icmp_ping  # noqa: F401
+    from utils.daemon import serve
+
+    serve(app, socket_path)
+
+
+@app.command()
+def history(
+    store: str = typer.Option(..., "--store", help="Banco SQLite gravado por --store nos lotes"),
+    host: str = typer.Option(None, "--host", help="Filtra por host"),
+    port: int = typer.Option(None, "--port", help="Filtra por porta"),
+    probe: str = typer.Option(None, "--probe", help="Filtra por tipo de teste: socket, ssl ou netcat"),
+    since: float = typer.Option(None, "--since", help="Só resultados dos últimos N minutos"),
+    limit: int = typer.Option(50, "--limit", help="Máximo de resultados, mais recentes primeiro (padrão: 50)"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text ou ndjson (padrão: text)")
+):
+    """🗄️ Consulta o histórico de resultados gravado com --store"""
+    import sys
+    import json
+    import time
+    from utils.store import ResultStore
+
+    with ResultStore(store) as results:
+        rows = results.history(host, port, probe, time.time() - since * 60 if since is not None else None, limit)
+    for row in rows:
+        if output == "ndjson":
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+            continue
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["time"]))
+        detail = row.get("error") or (f"{row['total_ms']} ms" if row.get("total_ms") is not None else "")
+        icon = {"success": "✅", "skipped": "⏭️"}.get(row["status"], "❌")
+        logger.info(f"{icon} {when} #{row['run_id']} {row['kind']} {row['host']}:{row['port']} {row['status']}"
+                    + (f" ({detail})" if detail else ""))
+    if not rows and output == "text":
+        logger.info("ℹ️ Nenhum resultado encontrado")
+
+
+@app.command()
+def diff(
+    store: str = typer.Option(..., "--store", help="Banco SQLite gravado por --store nos lotes"),
+    run: int = typer.Option(None, "--run", help="Execução a comparar com a anterior (padrão: a última)"),
+    probe: str = typer.Option(None, "--probe", help="Com --run omitido, a última execução deste tipo de teste"),
+    output: str = typer.Option("text", "--output", help="Formato de saída: text ou ndjson (padrão: text)")
+):
+    """🔀 Mostra os alvos que mudaram de status em uma execução gravada com --store"""
+    import sys
+    import json
+    from utils.store import ResultStore
+
+    with ResultStore(store) as results:
+        run = run or results.last_run(probe)
+        if run is None:
+            logger.error("❌ Nenhuma execução gravada")
+            raise typer.Exit(code=1)
+        changes = results.changes(run)
+    if output == "ndjson":
+        for change in changes:
+            sys.stdout.write(json.dumps({"run_id": run, **change}, ensure_ascii=False) + "\n")
+        return
+    down = [c for c in changes if c["before"] == "success"]
+    up = [c for c in changes if c["after"] == "success" and c["before"] is not None]
+    new = [c for c in changes if c["before"] is None]
+    logger.info(f"🔀 Execução #{run}: {len(down)} caíram, {len(up)} voltaram, {len(new)} novo(s)")
+    # Novos não são listados um a um; falha <-> erro entra depois de caíram/voltaram
+    other = [c for c in changes if c["before"] not in (None, "success") and c["after"] != "success"]
+    for change in down + up + other:
+        icon = "🟢" if change["after"] == "success" else "🔴"
+        logger.info(f"   {icon} {change['host']}:{change['port']} {change['before']} → {change['after']}")
+
+
+def _log_monitor_status(status):
+    measured = [s for s in status if s["samples"]]
+    if not measured:
+        return
+    down = [s for s in measured if s["last_status"] != "success"]
+    logger.info(f"📊 {len(measured) - len(down)} alvo(s) no ar, {len(down)} fora")
+    for s in sorted(measured, key=lambda s: s["uptime_pct"])[:10]:
+        latency = s.get("latency_ms", {}).get("p50")
+        logger.info(f"   {s['host']}:{s['port']} - {s['uptime_pct']}% de {s['samples']} teste(s)"
+                    + (f", p50 {latency} ms" if latency is not None else ""))
+
+
+_PHASES = (("dns_ms", "DNS"), ("connect_ms", "TCP"), ("tls_ms", "TLS"), ("ttfb_ms", "TTFB"), ("total_ms", "Total"))
+
+def _log_timings(result):
+    """Mostra a latência por fase de um teste individual."""
+    phases = " | ".join(f"{label} {getattr(result, key):.2f} ms" for key, label in _PHASES
+                        if getattr(result, key) is not None)
+    extra = ", ".join(f"{k}={v}" for k, v in (("ip", result.ip), ("erro", result.error)) if v)
+    logger.info(f"⏱️ {phases}" + (f" ({extra})" if extra else ""))
+
+def _log_ping(result):
+    """Mostra perda, RTT e jitter de um ping."""
+    if not result.sent:
+        logger.info(f"⏱️ Nenhum echo enviado (erro={result.error})")
+        return
+    line = f"⏱️ {result.received}/{result.sent} resposta(s), {result.loss_pct}% de perda"
+    if result:
+        line += f" | RTT mín {result.rtt_min_ms:.2f} / média {result.rtt_avg_ms:.2f} / máx {result.rtt_max_ms:.2f} ms"
+        if result.jitter_ms is not None:
+            line += f" | jitter {result.jitter_ms:.2f} ms"
+    extra = ", ".join(f"{k}={v}" for k, v in (("ip", result.ip), ("via", result.method), ("erro", result.error)) if v)
+    logger.info(line + f" ({extra})")
+
+def _log_summary(summary):
+    failure = summary.total - summary.success - summary.skipped
+    logger.info(f"\n📊 Resultado final: {summary.success} sucesso(s), {failure} falha(s), {summary.total} total")
+    if summary.skipped:
+        logger.info(f"⏭️ {summary.skipped} alvo(s) pulado(s): host ou sub-rede inalcançável")
+    if summary.latency.count:
+        p = summary.latency.as_dict()
+        logger.info(f"⏱️ Latência (sucessos): p50 {p['p50']} ms | p90 {p['p90']} ms | p99 {p['p99']} ms")
+
+
+def _run_batch(kind: str, targets, options: dict, processes: int, output: str, local_rows, collected=None,
+               group=None, persist=None):
+    """
+    Executa o lote no próprio processo ou, com processes > 1, distribuído entre
+    processos. Na saída text as linhas nem atravessam processos: só os resumos
+    (a menos que `collected` peça as linhas, `group` ligue as métricas ou
+    `persist` grave os resultados).
+    """
+    from utils.batch import BatchSummary
+    from utils.metrics import observe_rows
+
+    report = None
+    if persist:
+        store = persist["store"]
+        report = store.start_run(kind, persist["source"])
+        if persist["retry"]:
+            targets = store.pending_targets(kind, targets, report, persist["stale_after"])
+
+    def wrap(rows):
+        if group:
+            rows = observe_rows(kind, group, rows)
+        return store.track(kind, rows, report) if report else rows
+
+    only_changed = bool(persist and persist["only_changed"])
+    summary = BatchSummary()
+    try:
+        if processes <= 1:
+            _emit_rows(wrap(local_rows(targets)), output, summary, collected, only_changed)
+            return summary
+
+        from utils.sharding import ShardedBatch
+
+        logger.info(f"🧩 Distribuindo alvos entre {processes} processos")
+        sharded = ShardedBatch(kind, processes, options,
+                               emit_rows=output != "text" or collected is not None or group is not None
+                               or report is not None)
+        _emit_rows(wrap(sharded.run(targets)), output, summary, collected, only_changed)
+        return sharded.summary
+    finally:
+        if report:
+            # Também em Ctrl+C: o que já foi testado fica gravado
+            store.finish_run(report, summary)
+            _log_store_report(store, report)
+            store.close()
+
+
+def _open_store(path, source: str, retry_failed: bool, stale_after, only_changed: bool):
+    """Abre o banco de --store; devolve None sem --store (e recusa as opções que dependem dele)."""
+    if path is None:
+        if retry_failed or stale_after is not None or only_changed:
+            logger.error("❌ --retry-failed, --stale-after e --only-changed exigem --store")
+            raise typer.Exit(code=1)
+        return None
+    from utils.store import ResultStore
+
+    return {"store": ResultStore(path), "source": source, "only_changed": only_changed,
+            "retry": retry_failed or stale_after is not None,
+            "stale_after": stale_after * 60 if stale_after is not None else None}
+
+
+def _log_store_report(store, report):
+    logger.info(f"🗄️ Resultados gravados em {store.path} (execução #{report.run_id})")
+    if report.skipped:
+        logger.info(f"⏭️ {report.skipped} alvo(s) pulado(s): sucesso recente em execução anterior")
+    logger.info(f"🔀 Desde a última execução: {report.down} caíram, {report.up} voltaram, {report.new} novo(s)")
+    shown = [c for c in store.changes(report.run_id, limit=1000) if c["before"] is not None][:20]
+    for change in shown:
+        icon = "🟢" if change["after"] == "success" else "🔴"
+        logger.info(f"   {icon} {change['host']}:{change['port']} {change['before']} → {change['after']}")
+
+
+def _timeout_options(adaptive: bool, deadline):
+    """Opções de timeout do lote; o prazo vira horário absoluto para valer igual em todos os processos."""
+    import time
+
+    if deadline is not None and deadline <= 0:
+        logger.error(f"❌ Prazo inválido: {deadline}")
+        raise typer.Exit(code=1)
+    if deadline is not None:
+        logger.info(f"⏳ Prazo do lote: {deadline:g}s")
+    return {"adaptive": adaptive, "deadline_at": time.time() + deadline if deadline is not None else None}
+
+
+def _limit_options(rate, per_host, per_subnet, processes: int) -> dict:
+    """Opções de limite do lote (ver utils.ratelimit), já divididas entre os processos."""
+    from utils.ratelimit import BatchLimits
+
+    try:
+        limits = BatchLimits(rate, per_host, per_subnet)
+    except ValueError as e:
+        logger.error(f"❌ Limite inválido: {e}")
+        raise typer.Exit(code=1)
+    if not limits:
+        return {"limits": None}
+    details = [f"{rate:g} testes/s" if rate else None,
+               f"{per_host} por host" if per_host else None,
+               f"{per_subnet} por sub-rede" if per_subnet else None]
+    logger.info(f"🚦 Limites do lote: {', '.join(d for d in details if d)}")
+    return {"limits": limits.as_options(max(processes, 1))}
+
+
+def _prune_options(after, subnet_fraction, precheck: bool) -> dict:
+    """Opções da poda de hosts inalcançáveis (ver utils.reachability); None quando desligada."""
+    from utils.reachability import Reachability
+
+    if after is None and subnet_fraction is None and not precheck:
+        return {"prune": None}
+    try:
+        # Só com --prune-subnet ou --precheck, os timeouts seguidos continuam contando (padrão: 3)
+        reachability = Reachability(after if after is not None else 3, subnet_fraction, precheck)
+    except ValueError as e:
+        logger.error(f"❌ Poda inválida: {e}")
+        raise typer.Exit(code=1)
+    details = [f"{reachability.after} timeout(s) seguidos por host",
+               f"{subnet_fraction:.0%} dos hosts de uma sub-rede" if subnet_fraction else None,
+               "checagem com ping antes do primeiro teste" if precheck else None]
+    logger.info(f"✂️ Poda de hosts inalcançáveis: {', '.join(d for d in details if d)}")
+    return {"prune": reachability.as_options()}
+
+
+def _start_metrics(port, file: str):
+    """Com --metrics-port, sobe o exportador e devolve o grupo (nome da lista) usado como label."""
+    if port is None:
+        return None
+    from utils.metrics import group_name, start_exporter
+
+    start_exporter(port)
+    logger.info(f"📈 Métricas em http://0.0.0.0:{port}/metrics")
+    return group_name(file)
+
+
+def _emit_rows(rows, output: str, summary, collected=None, only_changed: bool = False, fields=None):
+    """
+    Escreve cada resultado assim que chega, sem acumular a lista inteira em memória.
+    Com `only_changed`, só as linhas marcadas com previous_status (ver ResultStore.track).
+    `fields` são as colunas do CSV (padrão: CSV_FIELDS).
+    """
+    import sys
+    import json
+    import textwrap
+
+    first = True
+    writer = None
+    if output == "csv":
+        import csv
+        from utils.results import CSV_FIELDS, csv_value
+
+        fields = tuple(fields or CSV_FIELDS) + (("previous_status",) if only_changed else ())
+        writer = csv.writer(sys.stdout)
+        writer.writerow(fields)
+    for row in rows:
+        summary.add(row)
+        if only_changed and "previous_status" not in row:
+            continue
+        if collected is not None:
+            collected.append(row)
+        if output == "ndjson":
+            sys.stdout.write(json.dumps(row) + "\n")
+            sys.stdout.flush()
+        elif output == "json":
+            # Mesmo layout de json.dumps(lista, indent=2), elemento a elemento
+            sys.stdout.write(("[\n" if first else ",\n") + textwrap.indent(json.dumps(row, indent=2), "  "))
+        elif writer is not None:
+            writer.writerow([csv_value(row.get(field)) for field in fields])
+        first = False
+    if output == "json":
+        sys.stdout.write("[]\n" if first else "\n]\n")
+
+def _raise_open_files_limit(needed: int):
+    """Eleva o limite soft de descritores abertos (até o hard) para comportar o motor async."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= needed:
+        return
+    target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except (ValueError, OSError) as e:
+        logger.warning(f"⚠️ Não foi possível elevar o limite de arquivos abertos: {e}")
 
 
 if __name__ == "__main__":
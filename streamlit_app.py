@@ -1,5 +1,6 @@
+import hashlib
+import os
 import streamlit as st
-import tempfile
 from tests.connectivity_tests import (
     test_socket_connection,
     test_netcat_connection,
@@ -8,6 +9,89 @@ from tests.connectivity_tests import (
 )
 
 
+def show_timings(result):
+    """Exibe a latência por fase de um teste individual."""
+    phases = [("DNS", result.dns_ms), ("TCP", result.connect_ms), ("TLS", result.tls_ms),
+              ("TTFB", result.ttfb_ms), ("Total", result.total_ms)]
+    phases = [(label, value) for label, value in phases if value is not None]
+    if phases:
+        for column, (label, value) in zip(st.columns(len(phases)), phases):
+            column.metric(f"{label} (ms)", f"{value:.2f}")
+    details = [f"IP: {result.ip}" if result.ip else None, f"Erro: {result.error}" if result.error else None,
+               f"DNS cache: {result.dns_cache}" if result.dns_cache else None]
+    details = [d for d in details if d]
+    if details:
+        st.caption(" · ".join(details))
+
+
+# Segundos em que um lote idêntico reaproveita os resultados já obtidos
+BATCH_CACHE_TTL = int(os.environ.get("STREAMLIT_BATCH_CACHE_TTL", "300"))
+# Colunas exibidas na tabela do lote, nesta ordem
+BATCH_COLUMNS = ("host", "port", "status", "ip", "error", "dns_ms", "connect_ms", "total_ms")
+
+
+def _reusable(job) -> bool:
+    from utils.jobs import CANCELLED, FAILED
+
+    return job.status not in (CANCELLED, FAILED)
+
+
+@st.cache_resource(ttl=BATCH_CACHE_TTL, max_entries=32, show_spinner=False, validate=_reusable)
+def start_socket_batch(digest, _uploaded_file, timeout, workers, rate, max_per_host, max_per_subnet):
+    """
+    Agenda o lote em um job de fundo (utils.jobs) e devolve o Job; `digest` (sha256
+    do arquivo) e as opções formam a chave do cache, o arquivo em si não é hasheado.
+    """
+    from utils.batch import iter_socket_batch, iter_targets
+    from utils.jobs import Job, jobs, remove_file, spool_upload
+    from utils.ratelimit import BatchLimits
+
+    path, lines = spool_upload(_uploaded_file)
+
+    def rows():
+        limits = BatchLimits(rate or None, max_per_host or None, max_per_subnet or None)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            # Aceita CIDR, faixas de IPs e listas de portas (ver utils/targets.py)
+            yield from iter_socket_batch(iter_targets(f), timeout, workers, limits=limits or None)
+
+    return jobs.submit(Job("socket", rows, estimate=lines, cleanup=lambda: remove_file(path)))
+
+
+def show_batch_job(job):
+    """Progresso, resumo e tabela do lote; reexecuta a cada segundo enquanto o job roda."""
+    polling = not job.done
+
+    @st.fragment(run_every=1 if polling else None)
+    def render():
+        done = job.done
+        if polling and done:
+            st.rerun()  # a página inteira de novo, já sem o intervalo de 1 s
+        progress = job.progress()
+        completed = progress["completed"]
+        summary = progress["summary"]
+        if done:
+            st.progress(1.0, text=f"Concluído ({job.status}): {completed} teste(s) em {progress['elapsed_s']:.1f} s")
+        else:
+            # A estimativa é o número de linhas; CIDR e faixas geram mais testes que linhas
+            ratio = min(completed / job.estimate, 0.99) if job.estimate else 0.0
+            st.progress(ratio, text=f"Testando... {completed} teste(s), {progress['rate_per_s']} por segundo")
+        skipped = summary.get("skipped", 0)
+        st.write(f"📊 Resultados: {summary['success']} sucesso(s), "
+                 f"{summary['total'] - summary['success'] - skipped} falha(s)"
+                 + (f", {skipped} pulado(s)" if skipped else ""))
+        latency = summary.get("latency_ms")
+        if latency:
+            st.caption(" · ".join(f"{name}: {value:.1f} ms" for name, value in latency.items()))
+        if not done and st.button("⏹️ Parar lote"):
+            job.cancel()
+        # Uma tabela só (virtualizada pelo st.dataframe), no lugar de um st.write por linha
+        st.dataframe(job.page(0, completed), hide_index=True, column_order=BATCH_COLUMNS)
+        if done:
+            st.download_button("⬇️ Baixar CSV", "".join(job.results.iter_csv()), "resultados.csv", "text/csv")
+
+    render()
+
+
 st.set_page_config(page_title="Conectividade - Ferramentas", layout="centered")
 st.title("🔧 Ferramentas de Troubleshooting de Conectividade")
 
@@ -38,6 +122,7 @@ if test_type == "Teste via socket":
                     st.success("✅ Conexão bem-sucedida")
                 else:
                     st.error("❌ Falha na conexão")
+                show_timings(success)
     with col2:
         if st.button("🧹 Limpar Tela"):
             for key in st.session_state.keys():
@@ -47,48 +132,34 @@ elif test_type == "Teste via socket (lote)":
     uploaded_file = st.file_uploader("Arquivo .txt ou .csv", type=["txt", "csv"])
     timeout = st.slider("Timeout (segundos)", 1, 30, 5)
     workers = st.slider("Threads paralelas", 1, 30, 10)
+    with st.expander("🚦 Limites (0 = sem limite)"):
+        rate = st.number_input("Testes por segundo", min_value=0.0, value=0.0, step=10.0)
+        max_per_host = st.number_input("Testes simultâneos por host", min_value=0, value=0)
+        max_per_subnet = st.number_input("Testes simultâneos por sub-rede /24", min_value=0, value=0)
 
     if uploaded_file and st.button("Executar teste em lote"):
-        import csv, io
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-
-        content = uploaded_file.read().decode("utf-8")
-        reader = csv.reader(io.StringIO(content), delimiter=',' if ',' in content else ':')
-
-        targets = []
-        for row in reader:
-            if len(row) == 2:
-                try:
-                    targets.append((row[0].strip(), int(row[1].strip())))
-                except:
-                    pass
-
-        results = []
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            future_map = {
-                executor.submit(test_socket_connection, host, port, timeout): (host, port)
-                for host, port in targets
-            }
-            for future in as_completed(future_map):
-                host, port = future_map[future]
-                try:
-                    success = future.result()
-                    results.append({"host": host, "port": port, "status": "success" if success else "failure"})
-                except Exception as e:
-                    results.append({"host": host, "port": port, "status": f"error: {str(e)}"})
-
-        st.write("📊 Resultados:")
-        for r in results:
-            st.write(f"{r['host']}:{r['port']} → {r['status']}")
+        # Lotes iguais (mesmo arquivo e opções) dentro do TTL reaproveitam o job em vez de testar de novo
+        digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        st.session_state["batch_job"] = start_socket_batch(digest, uploaded_file, timeout, workers, rate,
+                                                           int(max_per_host), int(max_per_subnet))
+
+    job = st.session_state.get("batch_job")
+    if job is not None:
+        show_batch_job(job)
 
 elif test_type == "Teste via netcat":
     host = st.text_input("Host", value="google.com")
     port = st.number_input("Porta", min_value=1, max_value=65535, value=80)
     timeout = st.slider("Timeout (segundos)", 1, 30, 5)
+    udp = st.checkbox("UDP (-u)")
+    banner = st.checkbox("Ler banner do servidor", disabled=udp)
     if st.button("Executar netcat"):
         with st.spinner("Executando netcat..."):
-            success = test_netcat_connection(host, port, timeout)
+            success = test_netcat_connection(host, port, timeout, udp, banner and not udp)
+            if success.banner:
+                st.code(success.banner)
             st.success("✅ Netcat conectou") if success else st.error("❌ Netcat falhou")
+            show_timings(success)
 
 elif test_type == "Teste via curl":
     url = st.text_input("URL", value="https://www.google.com")
@@ -102,6 +173,7 @@ elif test_type == "Teste via curl":
         with st.spinner("Executando curl..."):
             success = test_curl_connection(url, method, timeout, proxy_host, proxy_port) if use_proxy else test_curl_connection(url, method, timeout)
             st.success("✅ Conectado com sucesso via curl") if success else st.error("❌ Falha na conexão via curl")
+            show_timings(success)
 
 elif test_type == "Teste de SSL":
     host = st.text_input("Host", value="google.com")
@@ -112,3 +184,4 @@ elif test_type == "Teste de SSL":
         with st.spinner("Testando SSL..."):
             success = test_ssl_connection(host, port, timeout)
             st.success("✅ SSL válido") if success else st.error("❌ Falha no teste SSL")
+            show_timings(success)
@@ -1,46 +1,460 @@
+import errno
+import hashlib
+import itertools
+import queue
 import socket
-import ssl
-import subprocess
-import pycurl
+import sys
+import threading
+import time
 import io
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
 from datetime import datetime, timezone
-from typing import Optional
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-from utils.logger import setup_logger
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+from utils.dns_cache import (
+    HAPPY_EYEBALLS_DELAY, Resolution, resolver, connect_addresses, interleave_families, sockaddr_for
+)
+from utils.logger import mark_batch_thread, probe_extra, setup_logger
+from utils.metrics import POOL_ACTIVE, POOL_WORKERS, track_in_flight
+from utils.reachability import skipped_row
 
 logger = setup_logger()
 
-def test_socket_connection(host: str, port: int, timeout: int = 5) -> bool:
+@dataclass(slots=True)
+class ProbeResult:
+    """
+    Resultado de um teste. Avalia como bool (sucesso/falha), então quem tratava o
+    retorno como True/False continua funcionando.
+
+    Os tempos são a duração de cada fase, em milissegundos: resolução de nome,
+    conexão TCP, handshake TLS e tempo até o primeiro byte da resposta (após a
+    conexão/handshake). `error` é a classe do erro (dns, timeout, refused, ...).
+    """
+    success: bool
+    ip: Optional[str] = None
+    error: Optional[str] = None
+    http_code: Optional[int] = None
+    banner: Optional[str] = None
+    dns_cache: Optional[str] = None  # "hit" ou "miss"; None quando não houve resolução
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+
+    def __bool__(self):
+        return self.success
+
+    def to_dict(self) -> dict:
+        """Campos preenchidos (success sempre presente)."""
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    def fields(self) -> dict:
+        """Como to_dict, sem `success`; usado para compor as linhas dos lotes."""
+        data = self.to_dict()
+        del data["success"]
+        return data
+
+def _ms(start_ns: int, end_ns: Optional[int] = None) -> float:
+    return round(((end_ns or time.perf_counter_ns()) - start_ns) / 1_000_000, 3)
+
+def _dns_fields(resolution) -> dict:
+    if resolution is None:
+        return {}
+    return {"dns_cache": "hit" if resolution.cache_hit else "miss", "dns_ms": round(resolution.elapsed_ms, 3)}
+
+def classify_error(exc: BaseException) -> str:
+    """Reduz uma exceção de rede a uma classe estável para agregação em dashboards."""
+    if isinstance(exc, socket.gaierror):
+        return "dns"
+    if isinstance(exc, TimeoutError):  # asyncio.TimeoutError é o mesmo desde o Python 3.11
+        return "timeout"
+    ssl = sys.modules.get("ssl")  # sem o ssl carregado, a exceção não pode ser de TLS
+    if ssl is not None and isinstance(exc, ssl.SSLCertVerificationError):
+        return "certificate"
+    if ssl is not None and isinstance(exc, ssl.SSLError):
+        return "tls"
+    if isinstance(exc, ConnectionRefusedError):
+        return "refused"
+    if isinstance(exc, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)):
+        return "reset"
+    if isinstance(exc, OSError) and exc.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH):
+        return "unreachable"
+    return "other"
+
+@track_in_flight("socket")
+def test_socket_connection(host: str, port: int, timeout: int = 5) -> ProbeResult:
     #logger.info(f"🔌 Testando socket {host}:{port}")
+    start = time.perf_counter_ns()
+    resolution = None
+    connect_start = None
     try:
-        with socket.create_connection((host, port), timeout=timeout):
-            logger.info(f"🔌 Testando socket {host}:{port} ==> ✅ Socket OK")
+        resolution = resolver.resolve(host)
+        connect_start = time.perf_counter_ns()
+        with connect_addresses(resolution.addresses, port, timeout) as sock:
+            connected = time.perf_counter_ns()
+            logger.info("🔌 Testando socket %s:%s ==> ✅ Socket OK", host, port,
+                        extra=probe_extra("socket", host, port, "success"))
             #logger.info("✅ Socket OK")
-            return True
+            return ProbeResult(True, ip=sock.getpeername()[0], connect_ms=_ms(connect_start, connected),
+                               total_ms=_ms(start, connected), **_dns_fields(resolution))
     except Exception as e:
-        logger.error(f"🔌 Testando socket {host}:{port} ==> ❌ Socket Falhou: {e}")
+        logger.error("🔌 Testando socket %s:%s ==> ❌ Socket Falhou: %s", host, port, e,
+                     extra=probe_extra("socket", host, port, "failure"))
         #logger.error(f"❌ Socket Falhou: {e}")
-        return False
-
-def test_netcat_connection(host: str, port: int, timeout: int = 5) -> bool:
-    logger.info(f"🔗 Testando netcat {host}:{port}")
-    try:
-        result = subprocess.run(
-            ["nc", "-zv", "-w", str(timeout), host, str(port)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-        logger.info(result.stdout.strip())
-        return result.returncode == 0
+        return ProbeResult(False, error=classify_error(e),
+                           connect_ms=_ms(connect_start) if connect_start else None,
+                           total_ms=_ms(start), **_dns_fields(resolution))
+
+async def _resolve_async(host: str):
+    """Consulta o cache sem bloquear o loop; só vai ao executor quando não há entrada."""
+    import asyncio
+
+    start = time.perf_counter()
+    addresses = resolver.lookup(host)
+    if addresses is not None:
+        return Resolution(addresses, True, (time.perf_counter() - start) * 1000)
+    return await asyncio.get_running_loop().run_in_executor(None, resolver.resolve, host)
+
+async def _attempt_async(family: int, ip: str, port: int) -> socket.socket:
+    import asyncio
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.get_running_loop().sock_connect(sock, sockaddr_for(family, ip, port))
+        return sock
+    except BaseException:
+        sock.close()
+        raise
+
+async def _connect_async(addresses, port: int):
+    """Happy Eyeballs (RFC 8305) no event loop, como connect_addresses: vence a primeira conexão."""
+    import asyncio
+
+    addresses = interleave_families(addresses)
+    attempts = set()
+    error = None
+    winner = None
+    try:
+        for index, (family, ip) in enumerate(addresses):
+            attempts.add(asyncio.ensure_future(_attempt_async(family, ip, port)))
+            last = index == len(addresses) - 1
+            # Espera o delay (ou uma falha) antes de disparar o próximo endereço
+            while attempts and winner is None:
+                done, attempts = await asyncio.wait(attempts, timeout=None if last else HAPPY_EYEBALLS_DELAY,
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        task.result().close()
+                if winner is not None:
+                    return winner
+                if not last:
+                    break
+        raise error or OSError("nenhum endereço para conectar")
+    finally:
+        for task in attempts:
+            if not task.done():
+                task.cancel()  # _attempt_async fecha o próprio socket
+            elif not task.cancelled() and task.exception() is None and task.result() is not winner:
+                task.result().close()
+
+async def _open_async(host: str, port: int, holder: dict):
+    holder["resolution"] = await _resolve_async(host)
+    holder["connect_start"] = time.perf_counter_ns()
+    return await _connect_async(holder["resolution"].addresses, port)
+
+@track_in_flight("socket")
+async def async_test_socket_connection(host: str, port: int, timeout: int = 5) -> ProbeResult:
+    """Versão não bloqueante de test_socket_connection, para uso dentro de um event loop."""
+    import asyncio
+
+    start = time.perf_counter_ns()
+    holder = {}
+    try:
+        sock = await asyncio.wait_for(_open_async(host, port, holder), timeout)
     except Exception as e:
-        logger.error(f"❌ Netcat Falhou: {e}")
-        return False
+        logger.error("🔌 Testando socket %s:%s ==> ❌ Socket Falhou: %s", host, port, str(e) or "timed out",
+                     extra=probe_extra("socket", host, port, "failure"))
+        connect_start = holder.get("connect_start")
+        return ProbeResult(False, error=classify_error(e),
+                           connect_ms=_ms(connect_start) if connect_start else None,
+                           total_ms=_ms(start), **_dns_fields(holder.get("resolution")))
+    connected = time.perf_counter_ns()
+    ip = sock.getpeername()[0]
+    sock.close()
+    logger.info("🔌 Testando socket %s:%s ==> ✅ Socket OK", host, port,
+                extra=probe_extra("socket", host, port, "success"))
+    return ProbeResult(True, ip=ip, connect_ms=_ms(holder["connect_start"], connected),
+                       total_ms=_ms(start, connected), **_dns_fields(holder["resolution"]))
+
+async def _probe_socket_target(host: str, port: int, timeout: int, timeouts=None, limits=None, reachability=None):
+    if reachability is not None:
+        # Antes da taxa: alvos podados não gastam a vez de um alvo que vai ser testado
+        reason = await reachability.check_async(host)
+        if reason:
+            return host, port, skipped_row(host, port, reason)  # host podado (utils.reachability)
+    if limits:
+        await limits.wait_async()
+    if timeouts is not None:
+        timeout = timeouts.for_target(host)
+        if timeout is None:
+            return host, port, None  # prazo do lote esgotado
+    POOL_ACTIVE.labels("socket-async").inc()
+    try:
+        return host, port, await async_test_socket_connection(host, port, timeout)
+    finally:
+        POOL_ACTIVE.labels("socket-async").dec()
+
+async def iter_socket_batch_async(targets: Iterable[Tuple[str, int]], timeout: int = 5,
+                                  concurrency: int = 1000, timeouts=None, limits=None, reachability=None):
+    """
+    Testa os alvos com no máximo `concurrency` conexões em andamento, gerando
+    (host, porta, sucesso) na ordem em que terminam. Os alvos são consumidos sob
+    demanda, então o iterável de entrada pode ser um gerador. Com `timeouts`
+    (utils.timeouts.ProbeTimeouts) o timeout é por alvo e, após o prazo do
+    lote, o resultado vem como None. `limits` (utils.ratelimit.BatchLimits)
+    aplica a taxa global e o rodízio com limite de testes por host/sub-rede.
+    Com `reachability`, alvos de hosts podados vêm com a linha skipped no lugar
+    do resultado.
+    """
+    import asyncio
+
+    pending = set()
+    targets = iter(targets)
+    if limits and limits.per_destination:
+        scheduler = limits.schedule(targets, max(concurrency * 4, 4096))
+        take, release = scheduler.take, scheduler.release
+    else:
+        take, release = (lambda count: itertools.islice(targets, count)), None
+    POOL_WORKERS.labels("socket-async").inc(concurrency)
+    try:
+        while True:
+            for host, port in take(concurrency - len(pending)):
+                pending.add(asyncio.ensure_future(_probe_socket_target(host, port, timeout, timeouts, limits,
+                                                                               reachability)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if release is not None:
+                    release(result[:2])
+                yield result
+    finally:
+        POOL_WORKERS.labels("socket-async").dec(concurrency)
+
+_DONE = object()
+
+def run_socket_batch_async(targets: Iterable[Tuple[str, int]], timeout: int = 5, concurrency: int = 1000,
+                           timeouts=None, limits=None,
+                           reachability=None) -> Iterator[Tuple[str, int, Optional[ProbeResult]]]:
+    """
+    Ponte síncrona para iter_socket_batch_async: o event loop roda em uma thread
+    própria e os resultados chegam por uma fila limitada, de modo que um consumidor
+    lento não atrasa (nem estoura o timeout de) as conexões em andamento.
+    """
+    import asyncio
+
+    results = queue.Queue(maxsize=max(concurrency, 1) * 2)
+    stop = threading.Event()
+
+    async def pump():
+        async for item in iter_socket_batch_async(targets, timeout, concurrency, timeouts, limits, reachability):
+            if stop.is_set():
+                break
+            while True:
+                try:
+                    results.put_nowait(item)
+                    break
+                except queue.Full:
+                    await asyncio.sleep(0.01)
+
+    def worker():
+        mark_batch_thread()
+        try:
+            asyncio.run(pump())
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(_DONE)
+
+    thread = threading.Thread(target=worker, name="socket-batch-async", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Esvazia a fila para destravar a thread caso o consumidor pare antes do fim
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+def _service_name(port: int, proto: str) -> str:
+    try:
+        return socket.getservbyport(port, proto)
+    except OSError:
+        return "*"
 
+def _netcat_failure_reason(exc: BaseException) -> str:
+    if isinstance(exc, TimeoutError):
+        return "timed out: Operation now in progress"
+    return f"failed: {exc.strerror or exc}" if isinstance(exc, OSError) else f"failed: {exc}"
+
+def _netcat_udp(sock: socket.socket, sockaddr, timeout: float):
+    """
+    Como o `nc -zu`: envia um datagrama e espera um pouco. Só um ICMP port
+    unreachable (ConnectionRefusedError no recv) indica porta fechada; silêncio
+    conta como aberta (open|filtered).
+    """
+    sock.settimeout(timeout)
+    sock.connect(sockaddr)
+    sock.send(b"X")
+    sock.settimeout(min(timeout, 1))
+    try:
+        return sock.recv(1024)
+    except TimeoutError:
+        return b""
+
+@track_in_flight("netcat")
+def test_netcat_connection(host: str, port: int, timeout: int = 5, udp: bool = False,
+                           banner: bool = False, banner_bytes: int = 1024) -> ProbeResult:
+    """
+    Equivalente em processo ao `nc -zv -w timeout host port` (sem fork do nc).
+    Com `udp` faz o teste como `nc -zuv`; com `banner` lê até `banner_bytes` bytes
+    que o servidor enviar logo após conectar. As mensagens seguem o formato do nc.
+    """
+    logger.info("🔗 Testando netcat %s:%s", host, port, extra=probe_extra("netcat", host, port))
+    proto = "udp" if udp else "tcp"
+    start = time.perf_counter_ns()
+    try:
+        resolution = resolver.resolve(host)
+    except socket.gaierror as e:
+        logger.info('nc: getaddrinfo for host "%s" port %s: %s', host, port, e.strerror,
+                    extra=probe_extra("netcat", host, port, "failure"))
+        return ProbeResult(False, error="dns", total_ms=_ms(start))
+
+    error = None
+    connect_start = time.perf_counter_ns()
+    last = len(resolution.addresses) - 1
+    for index, (family, ip) in enumerate(resolution.addresses):
+        sockaddr = sockaddr_for(family, ip, port)
+        sock = socket.socket(family, socket.SOCK_DGRAM if udp else socket.SOCK_STREAM)
+        try:
+            if udp:
+                data = _netcat_udp(sock, sockaddr, timeout)
+            else:
+                sock.settimeout(timeout)
+                sock.connect(sockaddr)
+                data = b""
+                if banner:
+                    sock.settimeout(min(timeout, 2))
+                    try:
+                        data = sock.recv(banner_bytes)
+                    except TimeoutError:
+                        pass
+            connected = time.perf_counter_ns()
+            logger.info("Connection to %s (%s) %s port [%s/%s] succeeded!", host, ip, port, proto,
+                        _service_name(port, proto), extra=probe_extra("netcat", host, port, "success"))
+            text = data[:banner_bytes].decode("utf-8", "replace").strip() if banner and data else None
+            if text:
+                logger.info("%s", text, extra=probe_extra("netcat", host, port))
+            return ProbeResult(True, ip=ip, banner=text, connect_ms=_ms(connect_start, connected),
+                               total_ms=_ms(start, connected), **_dns_fields(resolution))
+        except OSError as e:
+            error = e
+            # Uma linha por endereço, como o nc; só a última conta como resultado do alvo
+            logger.info("nc: connect to %s (%s) port %s (%s) %s", host, ip, port, proto, _netcat_failure_reason(e),
+                        extra=probe_extra("netcat", host, port, "failure" if index == last else None))
+        finally:
+            sock.close()
+
+    return ProbeResult(False, error=classify_error(error) if error else "other",
+                       connect_ms=_ms(connect_start), total_ms=_ms(start), **_dns_fields(resolution))
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def _curl_resolve_entry(url: str, proxy_host: Optional[str], proxy_port: Optional[int]):
+    """
+    Monta a entrada CURLOPT_RESOLVE ("host:porta:ip,...") para o destino que o curl
+    vai de fato conectar (o proxy, se houver), a partir do cache de DNS.
+    """
+    if proxy_host and proxy_port:
+        host, port = proxy_host, proxy_port
+    else:
+        parts = urlsplit(url)
+        host = parts.hostname
+        try:
+            port = parts.port or _DEFAULT_PORTS.get(parts.scheme.lower())
+        except ValueError:
+            return None, None
+    if not host or not port:
+        return None, None
+    resolution = resolver.resolve(host)
+    ips = ",".join(f"[{ip}]" if family == socket.AF_INET6 else ip for family, ip in resolution.addresses)
+    return f"{host}:{port}:{ips}", resolution
+
+# Códigos CURLE_* mais comuns mapeados para as mesmas classes de classify_error
+_CURL_ERROR_CLASSES = {
+    5: "dns", 6: "dns", 7: "connect", 28: "timeout", 35: "tls", 51: "certificate",
+    52: "reset", 55: "reset", 56: "reset", 58: "tls", 60: "certificate",
+}
+
+def curl_error_class(curl_errno: int) -> str:
+    return _CURL_ERROR_CLASSES.get(curl_errno, "other")
+
+def curl_timings(c, resolution=None) -> dict:
+    """
+    Converte os tempos acumulados do libcurl (NAMELOOKUP/CONNECT/APPCONNECT/
+    STARTTRANSFER/TOTAL, em segundos desde o início) em duração por fase, em ms.
+    Quando o nome veio do nosso cache, a fase de DNS é o tempo da nossa resolução.
+    """
+    import pycurl
+
+    namelookup = c.getinfo(pycurl.NAMELOOKUP_TIME)
+    connect = c.getinfo(pycurl.CONNECT_TIME)
+    appconnect = c.getinfo(pycurl.APPCONNECT_TIME)
+    starttransfer = c.getinfo(pycurl.STARTTRANSFER_TIME)
+    timings = {
+        "ip": c.getinfo(pycurl.PRIMARY_IP) or None,
+        "total_ms": round(c.getinfo(pycurl.TOTAL_TIME) * 1000, 3),
+    }
+    dns_ms = namelookup * 1000
+    if resolution is not None:
+        timings.update(_dns_fields(resolution))
+        dns_ms += resolution.elapsed_ms
+        timings["total_ms"] = round(timings["total_ms"] + resolution.elapsed_ms, 3)
+    timings["dns_ms"] = round(dns_ms, 3)
+    if connect:
+        timings["connect_ms"] = round(max(connect - namelookup, 0) * 1000, 3)
+    if appconnect:
+        timings["tls_ms"] = round(max(appconnect - connect, 0) * 1000, 3)
+    if starttransfer and connect:
+        timings["ttfb_ms"] = round(max(starttransfer - max(appconnect, connect), 0) * 1000, 3)
+    return timings
+
+@track_in_flight("curl")
 def test_curl_connection(url: str, method: str = "GET", timeout: int = 5,
-                         proxy_host: Optional[str] = None, proxy_port: Optional[int] = None) -> bool:
-    logger.info(f"🌐 Testando cURL {url} ({method})")
+                         proxy_host: Optional[str] = None, proxy_port: Optional[int] = None) -> ProbeResult:
+    # pycurl (e a libcurl) só carregam quando o teste de cURL é usado
+    import pycurl
+
+    host = urlsplit(url).hostname or url
+    logger.info("🌐 Testando cURL %s (%s)", url, method, extra=probe_extra("curl", host))
     buffer = io.BytesIO()
     c = pycurl.Curl()
     c.setopt(c.URL, url)
@@ -51,41 +465,218 @@ def test_curl_connection(url: str, method: str = "GET", timeout: int = 5,
     if proxy_host and proxy_port:
         c.setopt(c.PROXY, proxy_host)
         c.setopt(c.PROXYPORT, proxy_port)
-        logger.info(f"🔀 Proxy: {proxy_host}:{proxy_port}")
+        logger.info("🔀 Proxy: %s:%s", proxy_host, proxy_port, extra=probe_extra("curl", host))
 
+    start = time.perf_counter_ns()
     try:
+        try:
+            entry, resolution = _curl_resolve_entry(url, proxy_host, proxy_port)
+        except socket.gaierror as e:
+            logger.error("❌ cURL Falhou: %s", e, extra=probe_extra("curl", host, status="failure"))
+            return ProbeResult(False, error="dns", dns_ms=_ms(start), total_ms=_ms(start))
+        if entry:
+            c.setopt(c.RESOLVE, [entry])
         c.perform()
         response_code = c.getinfo(c.RESPONSE_CODE)
-        logger.info(f"✅ Código HTTP: {response_code}")
-        return 200 <= response_code < 400
+        success = 200 <= response_code < 400
+        logger.info("✅ Código HTTP: %s", response_code,
+                    extra=probe_extra("curl", host, status="success" if success else "failure"))
+        return ProbeResult(success, error=None if success else "http", http_code=response_code,
+                           **curl_timings(c, resolution))
     except pycurl.error as e:
-        logger.error(f"❌ cURL Falhou: {e}")
-        return False
+        logger.error("❌ cURL Falhou: %s", e, extra=probe_extra("curl", host, status="failure"))
+        return ProbeResult(False, error=curl_error_class(e.args[0]), **curl_timings(c, resolution))
     finally:
         c.close()
 
-def test_ssl_connection(host: str, port: int, timeout: int = 5) -> bool:
-    logger.info(f"🔒 Testando SSL {host}:{port}")
-    context = ssl.create_default_context()
+@dataclass(slots=True)
+class CertInfo:
+    """Metadados do certificado do servidor, extraídos uma única vez por DER."""
+    fingerprint: str
+    subject: str
+    issuer: str
+    sans: Tuple[str, ...]
+    not_before: datetime
+    not_after: datetime
+
+    def days_left(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now(timezone.utc)
+        return (self.not_after - now).days
+
+    def is_valid(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        return self.not_before <= now <= self.not_after
+
+    def to_dict(self) -> dict:
+        return {
+            "subject": self.subject,
+            "issuer": self.issuer,
+            "sans": list(self.sans),
+            "not_before": self.not_before.isoformat(),
+            "not_after": self.not_after.isoformat(),
+            "days_left": self.days_left(),
+            "fingerprint": self.fingerprint,
+        }
+
+class _LRU:
+    """Dicionário limitado com descarte LRU, seguro para uso entre threads."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+# Certificados já interpretados, por SHA-256 do DER (vários endpoints atrás do
+# mesmo balanceador costumam servir o mesmo certificado).
+_cert_cache = _LRU(4096)
+# Última sessão TLS por (host, porta), para retomar a sessão no próximo handshake.
+_tls_sessions = _LRU(4096)
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+def _ssl_context(verify: bool = True) -> "ssl.SSLContext":
+    """Contextos SSL compartilhados (criá-los carrega o bundle de CAs, o que é caro)."""
+    # Como pycurl e cryptography, o ssl só é importado por quem testa TLS
+    import ssl
+
+    with _ssl_contexts_lock:
+        context = _ssl_contexts.get(verify)
+        if context is None:
+            context = ssl.create_default_context()
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            _ssl_contexts[verify] = context
+        return context
+
+def parse_certificate(der: bytes) -> CertInfo:
+    fingerprint = hashlib.sha256(der).hexdigest()
+    info = _cert_cache.get(fingerprint)
+    if info is not None:
+        return info
+    # cryptography.x509 sozinho custa dezenas de ms de import; só quem lê certificado paga
+    from cryptography import x509
+
+    cert = x509.load_der_x509_certificate(der)
     try:
-        with socket.create_connection((host, port), timeout=timeout) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cert_bin = ssock.getpeercert(binary_form=True)
-                x509_cert = x509.load_der_x509_certificate(cert_bin, default_backend())
+        sans = tuple(cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+                     .value.get_values_for_type(x509.DNSName))
+    except x509.ExtensionNotFound:
+        sans = ()
+    info = CertInfo(fingerprint, cert.subject.rfc4514_string(), cert.issuer.rfc4514_string(),
+                    sans, cert.not_valid_before_utc, cert.not_valid_after_utc)
+    _cert_cache.put(fingerprint, info)
+    return info
 
-                not_before = x509_cert.not_valid_before_utc
-                not_after = x509_cert.not_valid_after_utc
-                now = datetime.utcnow().replace(tzinfo=timezone.utc)
+def _read_session_ticket(ssock: "ssl.SSLSocket", timeout: float):
+    """
+    No TLS 1.3 o ticket de sessão chega depois do handshake (NewSessionTicket).
+    Uma leitura curta processa essas mensagens sem esperar dados da aplicação;
+    se o ticket ainda não chegou, esperamos no máximo alguns milissegundos.
+    """
+    import ssl
 
-                logger.info(f"📅 Validade: {not_before} até {not_after}")
-                logger.info(f"🔐 Protocolo: {ssock.version()} - Cifra: {ssock.cipher()}")
+    ssock.setblocking(False)
+    try:
+        ssock.recv(1)
+    except (ssl.SSLWantReadError, ssl.SSLError, OSError):
+        pass
+    if ssock.session is not None and ssock.session.has_ticket:
+        return
+    ssock.settimeout(min(timeout, 0.01))
+    try:
+        ssock.recv(1)
+    except (TimeoutError, ssl.SSLError, OSError):
+        pass
+
+def _tls_handshake(host: str, port: int, timeout: int, addresses, verify: bool):
+    """Conecta e faz o handshake, retomando a sessão anterior do mesmo host:porta se houver."""
+    connect_start = time.perf_counter_ns()
+    sock = connect_addresses(addresses, port, timeout)
+    tls_start = time.perf_counter_ns()
+    phases = {"ip": sock.getpeername()[0], "connect_ms": _ms(connect_start, tls_start)}
+    key = (host, port, verify)
+    try:
+        ssock = _ssl_context(verify).wrap_socket(sock, server_hostname=host, session=_tls_sessions.get(key))
+    except BaseException:
+        sock.close()
+        raise
+    phases["tls_ms"] = _ms(tls_start)
+    with ssock:
+        if ssock.version() == "TLSv1.3":
+            _read_session_ticket(ssock, timeout)
+        session = ssock.session
+        if session is not None and (session.has_ticket or ssock.version() != "TLSv1.3"):
+            _tls_sessions.put(key, session)
+        tls = {"tls_version": ssock.version(), "cipher": ssock.cipher()[0], "tls_resumed": ssock.session_reused}
+        return phases, tls, ssock.getpeercert(binary_form=True)
+
+@track_in_flight("ssl")
+def scan_tls(host: str, port: int, timeout: int = 5):
+    """
+    Faz o handshake TLS e devolve (ProbeResult, CertInfo ou None, detalhes TLS).
 
-                if not_before <= now <= not_after:
-                    logger.info("✅ Certificado válido no momento")
-                    return True
-                else:
-                    logger.warning("⚠️ Certificado fora do período de validade")
-                    return False
+    Se a verificação do certificado falhar, repete o handshake sem verificação só
+    para obter os metadados (validade, emissor...) do certificado recusado; o
+    resultado continua como falha, com error="certificate".
+    """
+    import ssl
+
+    start = time.perf_counter_ns()
+    resolution = None
+    phases = {}
+    try:
+        resolution = resolver.resolve(host)
+        try:
+            phases, tls, der = _tls_handshake(host, port, timeout, resolution.addresses, True)
+            verify_error = None
+        except ssl.SSLCertVerificationError as e:
+            verify_error = e
+            phases, tls, der = _tls_handshake(host, port, timeout, resolution.addresses, False)
+        cert = parse_certificate(der)
+        phases["total_ms"] = _ms(start)
+        if verify_error is not None:
+            tls["verify_error"] = verify_error.verify_message or str(verify_error)
+            return ProbeResult(False, error="certificate", **phases, **_dns_fields(resolution)), cert, tls
+        valid = cert.is_valid()
+        return (ProbeResult(valid, error=None if valid else "certificate", **phases, **_dns_fields(resolution)),
+                cert, tls)
     except Exception as e:
-        logger.error(f"❌ SSL Falhou: {e}")
-        return False
+        phases["total_ms"] = _ms(start)
+        return ProbeResult(False, error=classify_error(e), **phases, **_dns_fields(resolution)), None, {"exception": e}
+
+def test_ssl_connection(host: str, port: int, timeout: int = 5) -> ProbeResult:
+    logger.info("🔒 Testando SSL %s:%s", host, port, extra=probe_extra("ssl", host, port))
+    result, cert, tls = scan_tls(host, port, timeout)
+    if cert is None:
+        logger.error("❌ SSL Falhou: %s", tls["exception"], extra=probe_extra("ssl", host, port, "failure"))
+        return result
+
+    logger.info("📅 Validade: %s até %s", cert.not_before, cert.not_after, extra=probe_extra("ssl", host, port))
+    logger.info("🔐 Protocolo: %s - Cifra: %s", tls["tls_version"], tls["cipher"],
+                extra=probe_extra("ssl", host, port))
+    if "verify_error" in tls:
+        logger.error("❌ SSL Falhou: certificado não verificado (%s)", tls["verify_error"],
+                     extra=probe_extra("ssl", host, port, "failure"))
+    elif result:
+        logger.info("✅ Certificado válido no momento", extra=probe_extra("ssl", host, port, "success"))
+    else:
+        logger.warning("⚠️ Certificado fora do período de validade", extra=probe_extra("ssl", host, port, "failure"))
+    return result
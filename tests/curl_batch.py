@@ -0,0 +1,213 @@
+import socket
+import time
+import pycurl
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from typing import Iterable, Iterator, List, Optional, Tuple
+from tests.connectivity_tests import ProbeResult, _curl_resolve_entry, curl_error_class, curl_timings
+from utils.logger import mark_batch_thread, probe_extra, setup_logger
+from utils.metrics import IN_FLIGHT, POOL_ACTIVE, POOL_WORKERS
+
+logger = setup_logger()
+
+# Threads que resolvem os nomes fora do laço do multi
+RESOLVE_WORKERS = 8
+# Colunas do CSV dos lotes de URLs (as linhas do curl não têm host/porta)
+CURL_FIELDS = ("url", "status", "reused_connection", "http_code", "error", "ip", "dns_cache", "dns_ms",
+               "connect_ms", "tls_ms", "ttfb_ms", "total_ms")
+
+
+class CurlBatch:
+    """
+    Executa muitas requisições HTTP com um único pycurl.CurlMulti.
+
+    - Os easy handles ficam em um pool e são reaproveitados entre URLs.
+    - DNS, conexões e sessões TLS são compartilhados via CurlShare, então
+      requisições ao mesmo host reutilizam a conexão (keep-alive) e retomam a sessão TLS.
+    - Com http2=True, conexões HTTPS negociam HTTP/2 e multiplexam requisições.
+    - `parallel` limita as transferências em andamento e `per_host` as conexões por host.
+    - Os nomes são resolvidos (pelo cache de DNS) em threads à parte, à frente das
+      transferências: uma consulta lenta não trava as transferências em andamento.
+    """
+
+    def __init__(self, method: str = "GET", timeout: int = 5, parallel: int = 50, per_host: int = 6,
+                 http2: bool = True, proxy_host: Optional[str] = None, proxy_port: Optional[int] = None):
+        self.method = method.upper()
+        self.timeout = timeout
+        self.parallel = max(parallel, 1)
+        self.http2 = http2
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+
+        self.share = pycurl.CurlShare()
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+
+        self.multi = pycurl.CurlMulti()
+        self.multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX if http2 else pycurl.PIPE_NOTHING)
+        self.multi.setopt(pycurl.M_MAX_TOTAL_CONNECTIONS, self.parallel)
+        self.multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS, max(per_host, 1))
+
+        self._free = []
+        self._resolver = ThreadPoolExecutor(max_workers=RESOLVE_WORKERS, thread_name_prefix="curl-dns")
+        POOL_WORKERS.labels("curl").inc(self.parallel)
+
+    def close(self):
+        POOL_WORKERS.labels("curl").dec(self.parallel)
+        self._resolver.shutdown(wait=False, cancel_futures=True)
+        for c in self._free:
+            c.close()
+        self._free = []
+        self.multi.close()
+        self.share.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self) -> pycurl.Curl:
+        if self._free:
+            return self._free.pop()
+        c = pycurl.Curl()
+        c.setopt(pycurl.SHARE, self.share)
+        c.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+        c.setopt(pycurl.NOSIGNAL, 1)
+        if self.http2:
+            c.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+        if self.proxy_host and self.proxy_port:
+            c.setopt(pycurl.PROXY, self.proxy_host)
+            c.setopt(pycurl.PROXYPORT, self.proxy_port)
+        return c
+
+    def _resolve(self, url: str):
+        """Thread de DNS: (entrada de CURLOPT_RESOLVE, resolução, erro, ms gastos)."""
+        start = time.perf_counter()
+        try:
+            entry, resolution = _curl_resolve_entry(url, self.proxy_host, self.proxy_port)
+            return entry, resolution, None, None
+        except socket.gaierror as e:
+            return None, None, e, round((time.perf_counter() - start) * 1000, 3)
+
+    def _start(self, url: str, resolved: Future) -> Optional[Tuple[str, ProbeResult, bool]]:
+        """Adiciona a URL já resolvida ao multi; retorna um resultado imediato se nem chegou a ser enviada."""
+        entry, resolution, error, elapsed = resolved.result()
+        if error is not None:
+            logger.error("🌐 cURL %s ==> ❌ Falhou: %s", url, error,
+                         extra=probe_extra("curl", urlsplit(url).hostname or url, status="failure"))
+            return url, ProbeResult(False, error="dns", dns_ms=elapsed, total_ms=elapsed), False
+        c = self._acquire()
+        c.setopt(pycurl.URL, url)
+        c.setopt(pycurl.CUSTOMREQUEST, self.method)
+        c.setopt(pycurl.TIMEOUT, self.timeout)
+        # Sempre: um handle reaproveitado não pode levar o RESOLVE do alvo anterior
+        c.setopt(pycurl.RESOLVE, [entry] if entry else [])
+        if self.http2:
+            # Só vale esperar por uma conexão multiplexável em HTTPS (h2 via ALPN);
+            # em HTTP/1.1 isso serializaria as requisições numa única conexão.
+            c.setopt(pycurl.PIPEWAIT, 1 if url.lower().startswith("https://") else 0)
+        c.url = url
+        c.resolution = resolution
+        self.multi.add_handle(c)
+        IN_FLIGHT.labels("curl").inc()
+        POOL_ACTIVE.labels("curl").inc()
+        return None
+
+    def _finish(self, c: pycurl.Curl, curl_errno: int, error: Optional[str]) -> Tuple[str, ProbeResult, bool]:
+        self.multi.remove_handle(c)
+        IN_FLIGHT.labels("curl").dec()
+        POOL_ACTIVE.labels("curl").dec()
+        code = c.getinfo(pycurl.RESPONSE_CODE) or None
+        reused = not error and c.getinfo(pycurl.NUM_CONNECTS) == 0
+        timings = curl_timings(c, c.resolution)
+        url = c.url
+        self._free.append(c)
+        host = urlsplit(url).hostname or url
+        if error:
+            logger.error("🌐 cURL %s ==> ❌ Falhou: %s", url, error, extra=probe_extra("curl", host, status="failure"))
+            return url, ProbeResult(False, error=curl_error_class(curl_errno), http_code=code, **timings), reused
+        success = bool(code) and 200 <= code < 400
+        logger.info("🌐 cURL %s ==> ✅ Código HTTP: %s", url, code,
+                    extra=probe_extra("curl", host, status="success" if success else "failure"))
+        return url, ProbeResult(success, error=None if success else "http", http_code=code, **timings), reused
+
+    @staticmethod
+    def _resolved(resolving: List[Tuple[str, Future]], limit: int, block: bool) -> List[Tuple[str, Future]]:
+        """Tira de `resolving` até `limit` URLs já resolvidas; com `block`, espera ao menos uma."""
+        if block and resolving:
+            wait([future for _, future in resolving], return_when=FIRST_COMPLETED)
+        ready, waiting = [], []
+        for item in resolving:
+            (ready if len(ready) < limit and item[1].done() else waiting).append(item)
+        resolving[:] = waiting
+        return ready
+
+    def run(self, urls: Iterable[str]) -> Iterator[Tuple[str, ProbeResult, bool]]:
+        """Gera (url, resultado, conexão reutilizada) conforme as transferências terminam."""
+        urls = iter(urls)
+        resolving = []  # (url, Future da resolução), na ordem de leitura
+        active = 0
+        exhausted = False
+        while True:
+            # A resolução anda até `parallel` URLs à frente das transferências
+            while not exhausted and len(resolving) < self.parallel:
+                url = next(urls, None)
+                if url is None:
+                    exhausted = True
+                    break
+                resolving.append((url, self._resolver.submit(self._resolve, url)))
+            # Sem transferências em andamento não há o que travar: espera o DNS
+            for url, resolved in self._resolved(resolving, self.parallel - active, block=not active):
+                immediate = self._start(url, resolved)
+                if immediate is not None:
+                    yield immediate
+                else:
+                    active += 1
+            if not active:
+                if exhausted and not resolving:
+                    return
+                continue
+
+            while True:
+                ret, _ = self.multi.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+
+            while True:
+                queued, ok_list, err_list = self.multi.info_read()
+                for c in ok_list:
+                    active -= 1
+                    yield self._finish(c, 0, None)
+                for c, curl_errno, message in err_list:
+                    active -= 1
+                    yield self._finish(c, curl_errno, message)
+                if not queued:
+                    break
+
+            if active:
+                wait_ms = self.multi.timeout()
+                wait_ms = 100 if wait_ms < 0 else min(wait_ms, 100)
+                if resolving:
+                    wait_ms = min(wait_ms, 10)  # resoluções terminando não acordam o select do multi
+                self.multi.select(wait_ms / 1000)
+
+
+def iter_curl_batch(urls: Iterable[str], method: str = "GET", timeout: int = 5, parallel: int = 50,
+                    per_host: int = 6, http2: bool = True, proxy_host: Optional[str] = None,
+                    proxy_port: Optional[int] = None) -> Iterator[dict]:
+    """Atalho que cria um CurlBatch, executa as URLs e gera uma linha de resultado por URL."""
+    # O CurlMulti roda na thread de quem consome o gerador; a marcação é desfeita no fim
+    previous = mark_batch_thread()
+    try:
+        with CurlBatch(method, timeout, parallel, per_host, http2, proxy_host, proxy_port) as batch:
+            for url, probe, reused in batch.run(urls):
+                yield {
+                    "url": url,
+                    "status": "success" if probe else "failure",
+                    "reused_connection": reused,
+                    **probe.fields(),
+                }
+    finally:
+        mark_batch_thread(previous)
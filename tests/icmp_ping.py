@@ -0,0 +1,419 @@
+"""
+Ping dentro do processo, sem um `ping` (fork) nem uma thread por host.
+
+Usa os sockets ICMP datagrama sem privilégio do Linux (grupo do usuário dentro
+de net.ipv4.ping_group_range): um socket por família multiplexa todos os echos
+em andamento, casados pela sequência e pelo endereço de origem da resposta (o
+kernel preenche o identificador e só entrega ao socket as respostas dele).
+Quando o ICMP não é permitido, cai para um "ping" TCP: o tempo do connect na
+porta TCP_PING_PORT, contando recusa (RST) como resposta, já que o host respondeu.
+
+Um único Pinger (thread própria, selectors) atende o processo todo: ping_host()
+e iter_ping_batch() só enfileiram sessões e esperam os Futures.
+"""
+import errno
+import heapq
+import itertools
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, asdict
+from typing import Iterable, Iterator, Optional
+from utils.dns_cache import resolver, sockaddr_for
+from utils.logger import mark_batch_thread, probe_extra, setup_logger
+from utils.metrics import IN_FLIGHT
+
+logger = setup_logger()
+
+# Porta do ping TCP quando o ICMP não é permitido
+TCP_PING_PORT = int(os.environ.get("PING_TCP_PORT", "80"))
+PING_METHODS = ("auto", "icmp", "tcp")
+# Envios por volta do laço do Pinger antes de voltar a ler as respostas
+SEND_BURST = 64
+# Buffer de recepção pedido para o socket ICMP (respostas de muitos hosts chegam juntas)
+RECEIVE_BUFFER = 4 * 1024 * 1024
+# Colunas das linhas do ping-batch (CSV)
+PING_FIELDS = ("host", "status", "ip", "method", "error", "sent", "received", "loss_pct",
+               "rtt_min_ms", "rtt_avg_ms", "rtt_max_ms", "jitter_ms", "dns_ms")
+
+_PROTOCOLS = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+_ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+_ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+_HEADER = struct.Struct("!BBHHH")
+_PAYLOAD = b"net-tools ping 0123456789abcdef"
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN}
+
+
+@dataclass(slots=True)
+class PingResult:
+    """
+    Resultado do ping de um host: echos enviados e respondidos, RTT mínimo, médio
+    e máximo, jitter (média da variação entre RTTs consecutivos) e o método usado
+    (icmp ou tcp). Avalia como bool: sucesso se ao menos um echo voltou.
+    """
+    host: str
+    ip: Optional[str] = None
+    method: Optional[str] = None
+    error: Optional[str] = None
+    sent: int = 0
+    received: int = 0
+    rtt_min_ms: Optional[float] = None
+    rtt_avg_ms: Optional[float] = None
+    rtt_max_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
+    dns_ms: Optional[float] = None
+
+    def __bool__(self):
+        return self.received > 0
+
+    @property
+    def loss_pct(self) -> Optional[float]:
+        return round(100 * (self.sent - self.received) / self.sent, 1) if self.sent else None
+
+    def to_dict(self) -> dict:
+        """Campos preenchidos, com success e loss_pct."""
+        data = {"success": bool(self)}
+        data.update((k, v) for k, v in asdict(self).items() if v is not None)
+        if self.sent:
+            data["loss_pct"] = self.loss_pct
+        return data
+
+    def fields(self) -> dict:
+        """Como to_dict, sem `success` e `host`; usado para compor as linhas dos lotes."""
+        data = self.to_dict()
+        del data["success"], data["host"]
+        return data
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_packet(family: int, seq: int) -> bytes:
+    # O identificador (0) é trocado pelo kernel; no IPv6 o checksum também é dele
+    kind = _ECHO_REQUEST[family]
+    checksum = _checksum(_HEADER.pack(kind, 0, 0, 0, seq) + _PAYLOAD) if family == socket.AF_INET else 0
+    return _HEADER.pack(kind, 0, checksum, 0, seq) + _PAYLOAD
+
+
+class _Session:
+    """Estado do ping de um host; só a thread do Pinger mexe nele depois de criado."""
+
+    __slots__ = ("result", "family", "ip", "count", "interval", "timeout", "method", "future",
+                 "rtts", "pending", "errors")
+
+    def __init__(self, result: PingResult, family: int, count: int, interval: float, timeout: float,
+                 method: str, future: Future):
+        self.result = result
+        self.family = family
+        self.ip = result.ip
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.method = method
+        self.future = future
+        self.rtts = {}  # índice do echo -> RTT em ms
+        self.pending = count  # echos ainda sem resposta nem timeout
+        self.errors = []
+
+
+class Pinger:
+    """
+    Motor de ping multiplexado: uma thread, um selector, um socket ICMP por
+    família (criado no primeiro uso) e uma fila de eventos (envios e timeouts).
+    """
+
+    def __init__(self, tcp_port: int = TCP_PING_PORT):
+        self.tcp_port = tcp_port
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeup)
+        self._sockets = {}  # família -> socket ICMP, ou None se o kernel não permite
+        self._new = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._timers = []  # heap de (quando, desempate, função, argumentos)
+        self._order = itertools.count()
+        self._seq = itertools.count(1)
+        self._outstanding = {}  # (família, sequência) ou socket TCP -> (sessão, índice, envio em ns)
+
+    def submit(self, host: str, count: int = 4, interval: float = 1.0, timeout: float = 1.0,
+               method: str = "auto") -> Future:
+        """Agenda `count` echos para `host`, um a cada `interval` s; o Future recebe o PingResult."""
+        if method not in PING_METHODS:
+            raise ValueError(f"método deve ser um de: {', '.join(PING_METHODS)}")
+        future = Future()
+        start = time.perf_counter()
+        try:
+            resolution = resolver.resolve(host)
+        except socket.gaierror:
+            future.set_result(PingResult(host, error="dns", dns_ms=round((time.perf_counter() - start) * 1000, 3)))
+            return future
+        family, ip = resolution.addresses[0]
+        result = PingResult(host, ip=ip, dns_ms=round(resolution.elapsed_ms, 3))
+        session = _Session(result, family, max(count, 1), interval, timeout, method, future)
+        IN_FLIGHT.labels("ping").inc()
+        with self._lock:
+            self._new.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pinger", daemon=True)
+                self._thread.start()
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass  # já há um aviso pendente
+        return future
+
+    def ping(self, host: str, count: int = 4, interval: float = 1.0, timeout: float = 1.0,
+             method: str = "auto") -> PingResult:
+        return self.submit(host, count, interval, timeout, method).result()
+
+    # Thread do motor
+
+    def _run(self):
+        backlog = False
+        while True:
+            if backlog:
+                delay = 0.0
+            else:
+                delay = max(0.0, self._timers[0][0] - time.monotonic()) if self._timers else None
+            try:
+                for key, _ in self._selector.select(delay):
+                    key.data(key.fileobj)
+                # No máximo SEND_BURST envios por volta: entre um lote e outro as respostas
+                # são lidas, senão estouram o buffer de recepção do socket e viram perda falsa
+                budget = self._admit(SEND_BURST)
+                now = time.monotonic()
+                while budget > 0 and self._timers and self._timers[0][0] <= now:
+                    _, _, action, args = heapq.heappop(self._timers)
+                    action(*args)
+                    budget -= 1
+                backlog = budget <= 0
+            except Exception as e:  # a thread não pode morrer: os Futures pendentes ficariam sem resposta
+                logger.error(f"❌ Erro no motor de ping: {e}")
+
+    def _later(self, delay: float, action, *args):
+        heapq.heappush(self._timers, (time.monotonic() + delay, next(self._order), action, args))
+
+    def _drain_wakeup(self, sock):
+        try:
+            while sock.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _admit(self, budget: int) -> int:
+        """Inicia até `budget` sessões novas; devolve o que sobrou do orçamento."""
+        while budget > 0:
+            with self._lock:
+                if not self._new:
+                    break
+                session = self._new.popleft()
+            self._send(session, 0)
+            budget -= 1
+        return budget
+
+    def _icmp_socket(self, family: int) -> Optional[socket.socket]:
+        if family not in self._sockets:
+            try:
+                sock = socket.socket(family, socket.SOCK_DGRAM, _PROTOCOLS[family])
+            except OSError as e:
+                logger.warning(f"⚠️ ICMP sem permissão ({e}); ping via connect TCP na porta {self.tcp_port} "
+                               f"(ajuste net.ipv4.ping_group_range para usar ICMP)")
+                sock = None
+            else:
+                sock.setblocking(False)
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+                except OSError:
+                    pass  # fica o padrão do sistema (net.core.rmem_max limita o pedido)
+                self._selector.register(sock, selectors.EVENT_READ, self._read_replies)
+            self._sockets[family] = sock
+        return self._sockets[family]
+
+    def _send(self, session: _Session, index: int):
+        if index + 1 < session.count:
+            self._later(session.interval, self._send, session, index + 1)
+        session.result.sent += 1
+        sock = self._icmp_socket(session.family) if session.method != "tcp" else None
+        if sock is not None:
+            self._send_icmp(session, index, sock)
+        elif session.method == "icmp":
+            session.result.method = "icmp"
+            self._lost(session, index, "permission")
+        else:
+            self._send_tcp(session, index)
+
+    def _send_icmp(self, session: _Session, index: int, sock: socket.socket):
+        session.result.method = "icmp"
+        seq = next(self._seq) & 0xFFFF
+        while (session.family, seq) in self._outstanding:  # mais de 65536 echos em andamento
+            seq = next(self._seq) & 0xFFFF
+        try:
+            sock.sendto(_echo_packet(session.family, seq), sockaddr_for(session.family, session.ip, 0))
+        except OSError as e:
+            self._lost(session, index, _error_class(e))
+            return
+        key = (session.family, seq)
+        self._outstanding[key] = (session, index, time.perf_counter_ns())
+        self._later(session.timeout, self._expire, key)
+
+    def _send_tcp(self, session: _Session, index: int):
+        session.result.method = "tcp"
+        sock = socket.socket(session.family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sent = time.perf_counter_ns()
+        code = sock.connect_ex(sockaddr_for(session.family, session.ip, self.tcp_port))
+        if code not in _IN_PROGRESS:
+            sock.close()
+            self._tcp_done(session, index, sent, code)
+            return
+        self._outstanding[sock] = (session, index, sent)
+        self._selector.register(sock, selectors.EVENT_WRITE, self._tcp_ready)
+        self._later(session.timeout, self._expire, sock)
+
+    def _tcp_ready(self, sock: socket.socket):
+        session, index, sent = self._outstanding.pop(sock)
+        self._selector.unregister(sock)
+        code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        sock.close()
+        self._tcp_done(session, index, sent, code)
+
+    def _tcp_done(self, session: _Session, index: int, sent: int, code: int):
+        if code in (0, errno.ECONNREFUSED):  # aceitou ou recusou: o host respondeu
+            self._answered(session, index, sent)
+        else:
+            self._lost(session, index, _error_class(OSError(code, os.strerror(code))))
+
+    def _read_replies(self, sock: socket.socket):
+        family = sock.family
+        while True:
+            try:
+                data, address = sock.recvfrom(2048)
+            except BlockingIOError:
+                return
+            except OSError:
+                continue  # erro ICMP enfileirado no socket; o echo expira pelo timeout
+            if len(data) < _HEADER.size:
+                continue
+            kind, _, _, _, seq = _HEADER.unpack_from(data)
+            if kind != _ECHO_REPLY[family]:
+                continue
+            entry = self._outstanding.get((family, seq))
+            if entry is None or address[0].split("%")[0] != entry[0].ip.split("%")[0]:
+                continue  # resposta atrasada (já expirou) ou de outro host
+            del self._outstanding[(family, seq)]
+            self._answered(entry[0], entry[1], entry[2])
+
+    def _expire(self, key):
+        entry = self._outstanding.pop(key, None)
+        if entry is None:
+            return  # já respondido
+        if isinstance(key, socket.socket):
+            self._selector.unregister(key)
+            key.close()
+        self._lost(entry[0], entry[1], "timeout")
+
+    def _answered(self, session: _Session, index: int, sent: int):
+        session.rtts[index] = (time.perf_counter_ns() - sent) / 1_000_000
+        self._settle(session)
+
+    def _lost(self, session: _Session, index: int, error: str):
+        session.errors.append(error)
+        self._settle(session)
+
+    def _settle(self, session: _Session):
+        session.pending -= 1
+        if session.pending:
+            return
+        IN_FLIGHT.labels("ping").dec()
+        result = session.result
+        rtts = [session.rtts[i] for i in sorted(session.rtts)]
+        result.received = len(rtts)
+        if rtts:
+            result.rtt_min_ms = round(min(rtts), 3)
+            result.rtt_avg_ms = round(sum(rtts) / len(rtts), 3)
+            result.rtt_max_ms = round(max(rtts), 3)
+            if len(rtts) > 1:
+                result.jitter_ms = round(sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (len(rtts) - 1), 3)
+        else:
+            # A classe de erro mais frequente entre os echos perdidos
+            result.error = max(set(session.errors), key=session.errors.count)
+        session.future.set_result(result)
+
+
+def _error_class(exc: OSError) -> str:
+    if exc.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH):
+        return "unreachable"
+    if exc.errno in (errno.EACCES, errno.EPERM):
+        return "permission"
+    if exc.errno == errno.ETIMEDOUT:
+        return "timeout"
+    return "other"
+
+
+_pinger = None
+_pinger_lock = threading.Lock()
+
+
+def pinger() -> Pinger:
+    """O Pinger compartilhado do processo (criado no primeiro uso)."""
+    global _pinger
+    with _pinger_lock:
+        if _pinger is None:
+            _pinger = Pinger()
+        return _pinger
+
+
+def _log_result(result: PingResult):
+    if result:
+        logger.info("📡 Ping %s ==> ✅ %s/%s respostas via %s, média %.2f ms", result.host, result.received,
+                    result.sent, result.method, result.rtt_avg_ms, extra=probe_extra("ping", result.host, status="success"))
+    else:
+        logger.error("📡 Ping %s ==> ❌ Sem resposta (%s)", result.host, result.error,
+                     extra=probe_extra("ping", result.host, status="failure"))
+
+
+def ping_host(host: str, count: int = 4, interval: float = 1.0, timeout: float = 1.0,
+              method: str = "auto") -> PingResult:
+    """Pinga um host pelo Pinger compartilhado (seguro para chamar de várias threads)."""
+    result = pinger().ping(host, count, interval, timeout, method)
+    _log_result(result)
+    return result
+
+
+def iter_ping_batch(hosts: Iterable[str], count: int = 3, interval: float = 0.2, timeout: float = 1.0,
+                    parallel: int = 500, method: str = "auto") -> Iterator[dict]:
+    """
+    Pinga os hosts com no máximo `parallel` em andamento (todos no mesmo socket)
+    e gera uma linha por host conforme terminam.
+    """
+    previous = mark_batch_thread()
+    engine = pinger()
+    hosts = iter(hosts)
+    pending = set()
+    try:
+        while True:
+            for host in itertools.islice(hosts, parallel - len(pending)):
+                pending.add(engine.submit(host, count, interval, timeout, method))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                _log_result(result)
+                yield {"host": result.host, "status": "success" if result else "failure", **result.fields()}
+    finally:
+        mark_batch_thread(previous)
@@ -0,0 +1,98 @@
+import inspect
+import itertools
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import web
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Troca os lotes por um que só lê os 3 primeiros alvos e guarda os argumentos."""
+    calls = {}
+
+    def fake(name, real):
+        def run(*args, **kwargs):
+            call = calls[name] = inspect.signature(real).bind(*args, **kwargs).arguments
+            call["head"] = list(itertools.islice(call["targets"], 3))
+            for host, port in call["head"]:
+                yield {"host": host, "port": port, "status": "success"}
+        return run
+
+    monkeypatch.setattr(web, "iter_socket_batch", fake("socket", web.iter_socket_batch))
+    monkeypatch.setattr(web, "iter_ssl_batch", fake("ssl", web.iter_ssl_batch))
+    return calls
+
+
+def _post(route: str, content: bytes, **params):
+    with TestClient(web.app) as client:
+        return client.post(route, params=params, files={"file": ("alvos.txt", content, "text/plain")})
+
+
+@pytest.mark.parametrize("route,name", [("/socket/batch", "socket"), ("/ssl/batch", "ssl")])
+def test_batch_routes_apply_limits_and_stream_targets(captured, route, name):
+    response = _post(route, b"10.0.0.0/8:1-100\n", rate=50, max_per_host=2, max_per_subnet=8)
+    assert response.status_code == 200, response.text
+    call = captured[name]
+    # Um /8 x 100 portas: os alvos chegam sob demanda, não como lista
+    assert not isinstance(call["targets"], list)
+    assert call["head"] == [("10.0.0.0", 1), ("10.0.0.0", 2), ("10.0.0.0", 3)]
+    limits = call["limits"]
+    assert (limits.rate, limits.per_host, limits.per_subnet) == (50, 2, 8)
+    assert response.json()["summary"]["total"] == 3
+
+
+@pytest.mark.parametrize("route", ["/socket/batch", "/ssl/batch"])
+def test_batch_routes_reject_bad_uploads(captured, route):
+    assert _post(route, b"# nada\n").status_code == 400
+    assert _post(route, b"\xff\xfe\x00").status_code == 400
+    assert _post(route, b"127.0.0.1:80\n", rate=-1).status_code == 400
+    assert not captured
+
+
+@pytest.mark.parametrize("route,name", [("/socket/batch", "socket"), ("/ssl/batch", "ssl")])
+def test_batch_routes_pass_deadline_and_adaptive_timeout(captured, route, name):
+    before = time.time()
+    response = _post(route, b"127.0.0.1:80\n", deadline=30, adaptive_timeout=True)
+    assert response.status_code == 200, response.text
+    call = captured[name]
+    assert call["adaptive"] is True
+    assert before + 30 <= call["deadline_at"] <= time.time() + 30
+    assert _post(route, b"127.0.0.1:80\n", deadline=0).status_code == 400
+
+
+def test_socket_batch_deadline_ends_blackholed_sweep():
+    from benchmarks.servers import start_blackhole_listener
+
+    server, _fillers = start_blackhole_listener("0.0.0.0")
+    port = server.getsockname()[1]
+    start = time.perf_counter()
+    response = _post("/socket/batch", f"127.0.9.1-20:{port}\n".encode(), timeout=5, workers=2, deadline=1)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    errors = [row.get("error") for row in response.json()["results"]]
+    assert len(errors) == 20
+    assert errors.count("deadline") >= 16
+    assert elapsed < 4
+
+
+@pytest.mark.parametrize("route", ["/socket/batch", "/ssl/batch"])
+def test_batch_routes_prune_dead_hosts(route):
+    from benchmarks.servers import start_blackhole_listener
+
+    blackholes = [start_blackhole_listener("0.0.0.0") for _ in range(12)]
+    ports = [server.getsockname()[1] for server, _fillers in blackholes]
+    line = f"127.0.9.9:{','.join(map(str, ports))}\n"
+    start = time.perf_counter()
+    response = _post(route, line.encode(), timeout=1, workers=2, prune_after=1)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    statuses = [row["status"] for row in response.json()["results"]]
+    assert len(statuses) == 12
+    # Só os primeiros testes (os 2 workers e algum que já tinha saído da fila) esperam
+    # o timeout; sem poda seriam 6 voltas de 1 s
+    assert statuses.count("skipped") >= 8
+    assert elapsed < 3
+    assert _post(route, line.encode(), prune_subnet=2).status_code == 400
@@ -0,0 +1,93 @@
+import json
+import signal
+import threading
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+
+import web
+from benchmarks.bench_cluster import TOKEN, loopback_targets, start_worker
+from benchmarks.servers import refused_port, start_blackhole_listener
+from utils.cluster import Coordinator
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(web, "CLUSTER_TOKEN", TOKEN)
+    with TestClient(web.app) as client:
+        yield client
+
+
+def _lease(client, body, token=TOKEN):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return client.post("/cluster/lease", json=body, headers=headers)
+
+
+def test_lease_runs_targets(client):
+    port = refused_port()
+    response = _lease(client, {"probe": "socket", "options": {"timeout": 1, "workers": 2},
+                               "targets": [["127.0.0.1", port], ["127.0.0.1", port]]})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["host"], row["port"], row["error"]) for row in lines[:-1]] == [("127.0.0.1", port, "refused")] * 2
+    assert lines[-1]["summary"]["total"] == 2
+
+
+def test_lease_requires_token(client, monkeypatch):
+    body = {"targets": [["127.0.0.1", 1]]}
+    assert _lease(client, body, token=None).status_code == 401
+    assert _lease(client, body, token="wrong").status_code == 401
+    # O token vem antes da validação do corpo
+    assert _lease(client, {"options": {"workers": 0}}, token=None).status_code == 401
+    monkeypatch.setattr(web, "CLUSTER_TOKEN", None)
+    assert _lease(client, body).status_code == 503
+
+
+@pytest.mark.parametrize("body", [
+    {"targets": [["127.0.0.1", 1]], "options": {"max_workers": 10}},
+    {"targets": [["127.0.0.1", 1]], "options": {"workers": 10 ** 6}},
+    {"targets": [["127.0.0.1", 1]], "options": {"limits": {"rate": 1, "lookahead": 10}}},
+    {"targets": [["127.0.0.1", 1]], "options": {"prune": {"after": 0}}},
+    {"targets": [["127.0.0.1", 1]], "options": {"engine": "fork"}},
+    {"targets": [["127.0.0.1", 70000]]},
+    {"targets": [["127.0.0.1", 1]], "probe": "curl"},
+])
+def test_lease_rejects_unknown_options(client, body):
+    assert _lease(client, body).status_code == 422
+
+
+@pytest.fixture
+def workers():
+    processes = [start_worker(refused_port()) for _ in range(2)]
+    yield processes
+    for process in processes:
+        process.send_signal(signal.SIGCONT)
+        process.kill()
+        process.wait()
+
+
+@pytest.mark.parametrize("fault", ["kill", "stop"])
+def test_coordinator_reports_each_target_once(workers, fault):
+    server, _fillers = start_blackhole_listener("0.0.0.0")
+    # Cada alvo leva o timeout inteiro: um lease de 20 alvos com 10 threads dura uns 2 s
+    targets = loopback_targets(120, server.getsockname()[1])
+    urls = [f"http://127.0.0.1:{process.args[5]}" for process in workers]
+    coordinator = Coordinator(urls, "socket", {"timeout": 1, "workers": 10}, lease_size=20, per_worker=1,
+                              lease_timeout=60, token=TOKEN)
+    # No meio do primeiro lease, o segundo worker cai (leases voltam para a fila) ou
+    # congela (o outro worker assume o lease parado no fim do lote)
+    victim = workers[1]
+    threading.Timer(1.0, victim.kill if fault == "kill" else lambda: victim.send_signal(signal.SIGSTOP)).start()
+    rows = list(coordinator.run(targets))
+
+    seen = Counter((row["host"], row["port"]) for row in rows)
+    assert set(seen) == set(targets)
+    assert max(seen.values()) == 1
+    assert coordinator.summary.total == len(targets)
+    assert {row["error"] for row in rows} == {"timeout"}
+    healthy, faulty = coordinator.stats()
+    if fault == "kill":
+        assert faulty["failures"] >= 1
+    else:
+        assert healthy["stolen"] >= 1
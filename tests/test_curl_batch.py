@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import web
+from tests.curl_batch import CURL_FIELDS, iter_curl_batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        code = 404 if self.path == "/missing" else 200
+        self.send_response(code)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _upload(base_url: str, output: str):
+    urls = [f"{base_url}/", f"{base_url}/a", f"{base_url}/missing"]
+    with TestClient(web.app) as client:
+        response = client.post("/curl/batch", params={"output": output, "http2": False},
+                               files={"file": ("urls.txt", "\n".join(urls).encode(), "text/plain")})
+    assert response.status_code == 200, response.text
+    return urls, response.text
+
+
+def test_curl_batch_json(base_url):
+    urls, body = _upload(base_url, "json")
+    report = json.loads(body)
+    rows = {row["url"]: row for row in report["results"]}
+    assert set(rows) == set(urls)
+    assert rows[f"{base_url}/"]["status"] == "success"
+    assert rows[f"{base_url}/"]["http_code"] == 200
+    missing = rows[f"{base_url}/missing"]
+    assert (missing["status"], missing["http_code"], missing["error"]) == ("failure", 404, "http")
+    assert all("host" not in row and "reused_connection" in row for row in report["results"])
+    assert report["summary"]["total"] == 3
+    assert report["summary"]["success"] == 2
+
+
+def test_curl_batch_ndjson(base_url):
+    urls, body = _upload(base_url, "ndjson")
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert lines[-1]["summary"]["total"] == 3
+    assert sorted(row["url"] for row in lines[:-1]) == sorted(urls)
+
+
+def test_curl_batch_csv(base_url):
+    urls, body = _upload(base_url, "csv")
+    reader = csv.DictReader(io.StringIO(body))
+    rows = list(reader)
+    assert tuple(reader.fieldnames) == CURL_FIELDS
+    assert sorted(row["url"] for row in rows) == sorted(urls)
+    assert {row["status"] for row in rows} == {"success", "failure"}
+    assert all(row["reused_connection"] in ("True", "False") for row in rows)
+
+
+def test_curl_batch_cli_csv(base_url, tmp_path):
+    urls = [f"{base_url}/", f"{base_url}/missing"]
+    file = tmp_path / "urls.txt"
+    file.write_text("\n".join(urls))
+    result = subprocess.run([sys.executable, "main.py", "curl-batch", "--file", str(file), "--output", "csv",
+                             "--no-http2"], cwd=ROOT, capture_output=True, text=True, check=True)
+    lines = result.stdout.splitlines()
+    reader = csv.DictReader(lines[next(i for i, line in enumerate(lines) if line.startswith("url,")):])
+    rows = list(reader)
+    assert tuple(reader.fieldnames) == CURL_FIELDS
+    assert {row["url"]: row["http_code"] for row in rows} == {urls[0]: "200", urls[1]: "404"}
+
+
+def test_slow_dns_does_not_stall_transfers(base_url, monkeypatch):
+    import tests.connectivity_tests as connectivity_tests
+
+    real = connectivity_tests.resolver
+
+    class SlowResolver:
+        def resolve(self, host):
+            if host == "slow.invalid":
+                time.sleep(1.0)
+                raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+            return real.resolve(host)
+
+    monkeypatch.setattr(connectivity_tests, "resolver", SlowResolver())
+    urls = ["http://slow.invalid/"] + [f"{base_url}/{i}" for i in range(20)]
+    start = time.perf_counter()
+    finished = []
+    for row in iter_curl_batch(urls, timeout=5, parallel=4, http2=False):
+        finished.append((row["url"], time.perf_counter() - start))
+    # As URLs locais terminam enquanto o nome lento ainda está sendo resolvido
+    assert finished[-1][0] == "http://slow.invalid/"
+    assert all(elapsed < 0.9 for url, elapsed in finished[:-1])
+    assert len(finished) == len(urls)
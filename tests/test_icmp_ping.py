@@ -0,0 +1,69 @@
+import socket
+
+import pytest
+
+import tests.icmp_ping as icmp_ping
+from benchmarks.servers import refused_port, start_accepting_listener
+from tests.icmp_ping import PING_FIELDS, Pinger, iter_ping_batch
+from utils.targets import expand_hosts
+
+COUNT = 3
+
+
+def _loopback_hosts():
+    return list(expand_hosts(["127.0.0.0/29"]))
+
+
+@pytest.fixture
+def no_icmp(monkeypatch):
+    """Pinger próprio em que o kernel "não permite" ICMP: o auto cai para o connect TCP."""
+    def install(tcp_port: int) -> Pinger:
+        engine = Pinger(tcp_port)
+        engine._sockets[socket.AF_INET] = None
+        monkeypatch.setattr(icmp_ping, "_pinger", engine)
+        return engine
+    return install
+
+
+def _check_answered(rows, hosts, method):
+    assert sorted(row["host"] for row in rows) == sorted(hosts)
+    for row in rows:
+        assert set(row) <= set(PING_FIELDS)
+        assert row["status"] == "success"
+        assert (row["method"], row["sent"], row["received"], row["loss_pct"]) == (method, COUNT, COUNT, 0.0)
+        assert row["ip"] == row["host"]
+        assert 0 <= row["rtt_min_ms"] <= row["rtt_avg_ms"] <= row["rtt_max_ms"]
+        assert row["jitter_ms"] >= 0
+        assert "error" not in row
+
+
+@pytest.mark.parametrize("port", ["refused", "accepting"])
+def test_auto_falls_back_to_tcp(no_icmp, port):
+    if port == "refused":
+        tcp_port = refused_port()  # RST também conta como resposta
+    else:
+        tcp_port = start_accepting_listener().getsockname()[1]
+    no_icmp(tcp_port)
+    hosts = _loopback_hosts()
+    if port == "accepting":
+        hosts = ["127.0.0.1"]  # o listener só escuta em 127.0.0.1
+    rows = list(iter_ping_batch(hosts, COUNT, interval=0.01, timeout=1.0))
+    _check_answered(rows, hosts, "tcp")
+
+
+def test_icmp_without_permission_fails(no_icmp):
+    no_icmp(refused_port())
+    rows = list(iter_ping_batch(_loopback_hosts(), COUNT, interval=0.01, timeout=1.0, method="icmp"))
+    assert {(row["status"], row["method"], row["error"], row["loss_pct"]) for row in rows} == \
+        {("failure", "icmp", "permission", 100.0)}
+    assert all("rtt_avg_ms" not in row for row in rows)
+
+
+def test_auto_uses_what_the_kernel_allows():
+    # ICMP se net.ipv4.ping_group_range inclui o grupo do processo; senão, TCP na porta PING_TCP_PORT
+    rows = list(iter_ping_batch(_loopback_hosts(), COUNT, interval=0.01, timeout=1.0))
+    method = rows[0]["method"]
+    assert method in ("icmp", "tcp")
+    if method == "tcp" and rows[0]["status"] != "success":
+        pytest.skip("ping TCP sem resposta nesta máquina")
+    _check_answered(rows, _loopback_hosts(), method)
@@ -0,0 +1,51 @@
+import io
+import os
+import threading
+import time
+
+from utils.jobs import CANCELLED, DONE, Job, JobManager, spool_upload, remove_file
+
+
+def test_job_cancelled_in_queue_removes_its_upload(tmp_path):
+    manager = JobManager(max_running=1)
+    release = threading.Event()
+
+    def blocking():
+        release.wait(5)
+        yield {"host": "127.0.0.1", "port": 1, "status": "success"}
+
+    first = manager.submit(Job("socket", blocking))
+    path, lines = spool_upload(io.BytesIO(b"127.0.0.1:1\n"), str(tmp_path))
+    queued = manager.submit(Job("socket", lambda: iter(()), estimate=lines, cleanup=lambda: remove_file(path)))
+    queued.cancel()
+    assert queued.status == CANCELLED
+    release.set()
+    manager._executor.shutdown(wait=True)
+    assert first.status == DONE
+    assert queued.status == CANCELLED
+    assert not os.path.exists(path)
+
+
+def test_job_events_follow_a_running_job(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import web
+
+    def rows():
+        yield {"host": "127.0.0.1", "port": 1, "status": "success"}
+        time.sleep(0.3)  # o stream já está esperando o próximo resultado
+        yield {"host": "127.0.0.1", "port": 2, "status": "failure", "error": "refused"}
+
+    manager = JobManager(max_running=1)
+    monkeypatch.setattr(web, "jobs", manager)
+    job = manager.submit(Job("socket", rows, estimate=2))
+    with TestClient(web.app) as client:
+        start = time.perf_counter()
+        body = client.get(f"/jobs/{job.id}/events").text
+        elapsed = time.perf_counter() - start
+    events = [line[len("event: "):] for line in body.splitlines() if line.startswith("event: ")]
+    assert events.count("result") == 2
+    assert events[-1] == "end"
+    assert job.status == DONE
+    # O stream acorda com o fim do job, sem esperar o timeout de 1 s da espera
+    assert elapsed < 1
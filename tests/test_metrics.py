@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+import web
+from benchmarks.servers import refused_port
+
+
+def test_upload_filenames_are_not_metric_labels():
+    port = refused_port()
+    with TestClient(web.app) as client:
+        for name in ("cliente-a-8f3e.txt", "cliente-b-19c2.csv"):
+            response = client.post("/socket/batch", params={"timeout": 1},
+                                   files={"file": (name, f"127.0.0.1:{port}\n".encode(), "text/plain")})
+            assert response.status_code == 200
+        metrics = client.get("/metrics").text
+    assert 'probe="socket",group="batch"' in metrics
+    assert "cliente-" not in metrics
@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import web
+from utils.probe_cache import ProbeCache, requested_max_age
+
+CLIENTS = 8
+TTL = 1.0
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    """Responde depois de 0,5 s, para que as requisições simultâneas se sobreponham."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with _SlowHandler.lock:
+            _SlowHandler.connections += 1
+        super().setup()
+
+    def do_GET(self):
+        time.sleep(0.5)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def listener():
+    _SlowHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(web, "probe_cache", ProbeCache(ttl=TTL))
+    with TestClient(web.app) as client:
+        yield client
+
+
+def _get(client, url, **headers):
+    response = client.get("/curl", params={"url": url}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["http_code"] == 200
+    return response.headers["X-Cache"]
+
+
+def test_concurrent_identical_probes_share_one_connection(client, listener):
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        statuses = list(pool.map(lambda _: _get(client, listener), range(CLIENTS)))
+    assert _SlowHandler.connections == 1
+    assert sorted(statuses) == ["COALESCED"] * (CLIENTS - 1) + ["MISS"]
+    stats = web.probe_cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["in_flight"]) == (1, CLIENTS - 1, 0)
+
+
+def test_ttl_expiry_probes_again(client, listener):
+    assert _get(client, listener) == "MISS"
+    assert _get(client, listener) == "HIT"
+    assert _SlowHandler.connections == 1
+    time.sleep(TTL + 0.1)
+    assert _get(client, listener) == "MISS"
+    assert _SlowHandler.connections == 2
+
+
+@pytest.mark.parametrize("cache_control", ["no-store", "no-cache", "max-age=0"])
+def test_cache_control_bypasses_cache(client, listener, cache_control):
+    assert _get(client, listener) == "MISS"
+    assert _get(client, listener, **{"Cache-Control": cache_control}) == "MISS"
+    assert _SlowHandler.connections == 2
+    # O teste novo atualiza a entrada para os próximos clientes
+    assert _get(client, listener) == "HIT"
+
+
+def test_requested_max_age():
+    assert requested_max_age(None) is None
+    assert requested_max_age("No-Store") == 0
+    assert requested_max_age("max-age=30, must-revalidate") == 30
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from benchmarks.servers import refused_port, start_blackhole_listener
+from utils.batch import iter_netcat_batch, iter_socket_batch
+from utils.ratelimit import BatchLimits
+from utils.reachability import Reachability
+from utils.sharding import CHUNK_SIZE, ShardedBatch
+
+DEAD = "127.0.9.9"
+RATE = 4.0
+
+
+def _pruned_reachability() -> Reachability:
+    reachability = Reachability(after=1)
+    reachability.observe({"host": DEAD, "port": 1, "status": "failure", "error": "timeout"})
+    assert reachability.reason(DEAD) == "host_unreachable"
+    return reachability
+
+
+def _targets():
+    live = refused_port()
+    return [(DEAD, port) for port in range(1000, 1040)] + [("127.0.0.1", live), ("127.0.0.1", live)]
+
+
+@pytest.mark.parametrize("run", [
+    lambda targets, limits, reachability: iter_socket_batch(targets, 1, 4, limits=limits, reachability=reachability),
+    lambda targets, limits, reachability: iter_socket_batch(targets, 1, engine="async", concurrency=8,
+                                                            limits=limits, reachability=reachability),
+    lambda targets, limits, reachability: iter_netcat_batch(targets, 1, 4, limits=limits, reachability=reachability),
+], ids=["thread", "async", "netcat"])
+def test_pruned_targets_do_not_spend_rate_limit(run):
+    limits = BatchLimits(rate=RATE, burst=1, per_host=1)
+    start = time.perf_counter()
+    rows = list(run(_targets(), limits, _pruned_reachability()))
+    elapsed = time.perf_counter() - start
+    statuses = [row["status"] for row in rows]
+    assert statuses.count("skipped") == 40
+    assert statuses.count("failure") == 2
+    # Só os 2 alvos testados esperam a taxa; com os 42 seriam uns 10 s
+    assert elapsed < 40 / RATE / 2
+
+
+def test_sharded_prune_learns_each_host_once():
+    server, _fillers = start_blackhole_listener("0.0.0.0")
+    port = server.getsockname()[1]
+    targets = [(DEAD, port)] * (CHUNK_SIZE * 3)
+    after = 2
+    sharded = ShardedBatch("socket", 2, {"timeout": 1, "workers": 1,
+                                         "prune": Reachability(after=after).as_options()})
+    rows = list(sharded.run(targets))
+    assert len(rows) == len(targets)
+    # Um único processo recebe o host: `after` timeouts (mais o teste que já tinha
+    # começado quando o último chegou), e não `after` por processo
+    assert after <= sharded.summary.failure <= after + 1
+    assert sharded.summary.skipped == len(targets) - sharded.summary.failure
@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from utils.results import ResultTable
+
+ROWS = [
+    {"host": "10.0.0.1", "port": 22, "status": "success", "ip": "10.0.0.1", "dns_cache": "hit",
+     "dns_ms": 0.0, "connect_ms": 1.25, "total_ms": 1.5},
+    {"host": "2001:db8::1", "port": 443, "status": "failure", "ip": "2001:db8::1", "error": "refused",
+     "connect_ms": 0.5, "total_ms": 0.75},
+    {"host": "example.com", "port": 443, "status": "success", "ip": "93.184.216.34", "total_ms": 30.0,
+     "tls_ms": 12.0, "subject": "CN=example.com", "sans": ["example.com", "www.example.com"], "days_left": 90,
+     "tls_resumed": False},
+    {"host": "10.1", "port": 80, "status": "error", "error": "timeout"},  # IPv4 não canônico fica como texto
+    {"host": "example.com", "port": 8080, "status": "skipped", "error": "host_unreachable"},
+    {"url": "http://127.0.0.1:8000/", "status": "success", "http_code": 200, "reused_connection": True,
+     "ttfb_ms": 3.0, "total_ms": 4.0},
+    {"url": "http://127.0.0.1:8000/missing", "status": "failure", "http_code": 404, "error": "http",
+     "reused_connection": True, "total_ms": 2.0},
+]
+
+
+def test_round_trip():
+    table = ResultTable(ROWS)
+    assert len(table) == len(ROWS)
+    assert list(table) == ROWS
+    assert [table[i] for i in range(len(ROWS))] == ROWS
+    assert table[-1] == ROWS[-1]
+    assert table[1:4] == ROWS[1:4]
+    assert table[::2] == ROWS[::2]
+    with pytest.raises(IndexError):
+        table[len(ROWS)]
+    assert table.as_dict()["results"] == ROWS
+
+
+def test_summary_matches_rows():
+    summary = ResultTable(ROWS).summary.as_dict()
+    assert summary["total"] == len(ROWS)
+    assert (summary["success"], summary["failure"], summary["error"], summary["skipped"]) == (3, 2, 1, 1)
+
+
+def test_sort_keeps_sparse_fields_with_their_rows():
+    table = ResultTable(ROWS).sort(key=lambda row: -row.get("total_ms", math.inf))
+    assert list(table) == sorted(ROWS, key=lambda row: -row.get("total_ms", math.inf))
+    table.append(ROWS[0])
+    assert table[-1] == ROWS[0]
+
+
+def test_row_without_host_or_url():
+    table = ResultTable([{"status": "error", "error": "deadline"}])
+    assert table[0] == {"url": "", "status": "error", "error": "deadline"}
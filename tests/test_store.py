@@ -0,0 +1,39 @@
+from utils.batch import BatchSummary
+from utils.store import ResultStore
+
+
+def _run(store: ResultStore, rows):
+    report = store.start_run("socket")
+    tracked = list(store.track("socket", rows, report))
+    store.finish_run(report, BatchSummary())
+    return report, tracked
+
+
+def test_unprobed_rows_keep_last_state(tmp_path):
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        _run(store, [{"host": "10.0.0.1", "port": 22, "status": "success"},
+                     {"host": "10.0.0.2", "port": 22, "status": "failure", "error": "timeout"}])
+        report, tracked = _run(store, [
+            {"host": "10.0.0.1", "port": 22, "status": "skipped", "error": "subnet_unreachable"},
+            {"host": "10.0.0.2", "port": 22, "status": "error", "error": "deadline"},
+            {"host": "10.0.0.3", "port": 22, "status": "skipped", "error": "host_unreachable"},
+        ])
+        assert (report.changed, report.new, report.down, report.up) == (0, 0, 0, 0)
+        assert not any("previous_status" in row for row in tracked)
+        assert store.changes(report.run_id) == []
+        assert store.last_state("socket", "10.0.0.1", 22)[0] == "success"
+        assert store.last_state("socket", "10.0.0.3", 22) is None
+        # --retry-failed: só o que falhou de verdade (e o que nunca foi testado)
+        pending = list(store.pending_targets("socket", [("10.0.0.1", 22), ("10.0.0.2", 22), ("10.0.0.3", 22)],
+                                             store.start_run("socket")))
+        assert pending == [("10.0.0.2", 22), ("10.0.0.3", 22)]
+        # O histórico continua com as linhas da execução
+        assert [row["status"] for row in store.history(host="10.0.0.1")] == ["skipped", "success"]
+
+
+def test_probed_rows_record_transitions(tmp_path):
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        _run(store, [{"host": "10.0.0.1", "port": 22, "status": "success"}])
+        report, tracked = _run(store, [{"host": "10.0.0.1", "port": 22, "status": "failure", "error": "timeout"}])
+        assert (report.changed, report.down) == (1, 1)
+        assert tracked[0]["previous_status"] == "success"
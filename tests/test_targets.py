@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from utils.targets import TargetDedup, expand_targets, parse_line
+
+
+def test_name_dedup_keeps_port_intervals():
+    dedup = TargetDedup()
+    dedup.add(parse_line("example.com:22,80,8000-8100"))
+    dedup.add(parse_line("example.com:443"))
+    spec = parse_line("example.com:1")
+    assert all(dedup.seen(spec, "example.com", port) for port in (22, 80, 8000, 8050, 8100, 443))
+    assert not any(dedup.seen(spec, "example.com", port) for port in (21, 81, 7999, 8101, 444))
+    assert not dedup.seen(spec, "other.com", 22)
+
+
+def test_name_dedup_is_not_quadratic():
+    lines = [f"example.com:{port}" for port in range(1, 20001)]
+    start = time.perf_counter()
+    targets = list(expand_targets(lines + lines[::-1]))
+    elapsed = time.perf_counter() - start
+    assert len(targets) == 20000
+    # Com uma tupla por nome (busca linear a cada linha) eram ~30 s
+    assert elapsed < 5
+
+
+def test_csv_rows_take_exactly_host_and_port():
+    assert parse_line("google.com,443").ports == [(443, 443)]
+    assert parse_line('google.com,"22,80"').ports == [(22, 22), (80, 80)]
+    assert parse_line("[2001:db8::1],443").ports == [(443, 443)]
+    assert parse_line("10.0.0.1 22,80").ports == [(22, 22), (80, 80)]
+    assert parse_line("google.com:443,80").ports == [(80, 80), (443, 443)]
+    for line in ("google.com,443,30", "google.com,443,web", "[2001:db8::1],443,30"):
+        with pytest.raises(ValueError):
+            parse_line(line)
+
+
+def test_extra_columns_are_logged_and_skipped(caplog):
+    targets = list(expand_targets(["google.com,443,30", "example.com,80"]))
+    assert targets == [("example.com", 80)]
+    assert "Linha 1 inválida" in caplog.text
@@ -0,0 +1,388 @@
+import itertools
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from utils.logger import mark_batch_thread, probe_extra, setup_logger
+from utils.metrics import POOL_ACTIVE, POOL_QUEUED, POOL_WORKERS
+from utils.ratelimit import BatchLimits
+from utils.reachability import Reachability, skipped_row
+from utils.targets import expand_targets
+from utils.timeouts import ProbeTimeouts, deadline_row
+
+logger = setup_logger()
+
+
+def iter_targets(lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """
+    Lê alvos sob demanda, sem carregar o arquivo inteiro: host:porta, host,porta,
+    CIDR, faixas de IPs e listas de portas (ver utils.targets). O delimitador é
+    detectado em cada linha e alvos repetidos são descartados.
+    """
+    return expand_targets(lines)
+
+
+def iter_urls(lines: Iterable[str]) -> Iterator[str]:
+    """Uma URL por linha; linhas vazias e comentários (#) são ignorados."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def iter_thread_batch(probe: Callable, targets: Iterable[tuple], workers: int = 10,
+                      window: Optional[int] = None, pool: str = "batch",
+                      limits: Optional[BatchLimits] = None, skip: Optional[Callable] = None) -> Iterator[tuple]:
+    """
+    Executa probe(*alvo) em um ThreadPoolExecutor mantendo no máximo `window`
+    alvos submetidos por vez. Gera (alvo, resultado, erro) conforme terminam.
+    A ocupação do pool é publicada nas métricas com o label `pool`. Com `limits`
+    (utils.ratelimit) cada teste espera a taxa global e, com limite por destino,
+    os alvos saem em rodízio entre hosts (alvo[0]). Se skip(*alvo) devolve algo
+    além de None, esse é o resultado do alvo: sem esperar a taxa e sem teste.
+    """
+    window = window or workers * 4
+    targets = iter(targets)
+    pending = {}
+    active, queued = POOL_ACTIVE.labels(pool), POOL_QUEUED.labels(pool)
+    if limits and limits.per_destination:
+        scheduler = limits.schedule(targets, max(window * 4, 4096))
+        take, release = scheduler.take, scheduler.release
+    else:
+        take, release = (lambda count: itertools.islice(targets, count)), None
+
+    def run(*target):
+        mark_batch_thread()
+        queued.dec()
+        if skip is not None:
+            result = skip(*target)
+            if result is not None:
+                return result
+        if limits:
+            limits.wait()
+        active.inc()
+        try:
+            return probe(*target)
+        finally:
+            active.dec()
+
+    def submit(target):
+        queued.inc()
+        pending[executor.submit(run, *target)] = target
+
+    POOL_WORKERS.labels(pool).inc(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for target in take(window):
+                submit(target)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = pending.pop(future)
+                    if release is not None:
+                        release(target)
+                    try:
+                        yield target, future.result(), None
+                    except GeneratorExit:
+                        raise
+                    except Exception as e:
+                        yield target, None, e
+                for target in take(window - len(pending)):
+                    submit(target)
+        finally:
+            for future in pending:
+                if future.cancel():
+                    queued.dec()
+            POOL_WORKERS.labels(pool).dec(workers)
+
+
+def batch_row(host: str, port: int, probe) -> dict:
+    return {"host": host, "port": port, "status": "success" if probe else "failure", **probe.fields()}
+
+
+def _with_timeouts(probe: Callable, timeouts: ProbeTimeouts) -> Callable:
+    """probe(host, porta, timeout) -> probe(host, porta); devolve None se o prazo do lote acabou."""
+    def run(host, port):
+        timeout = timeouts.for_target(host)
+        return None if timeout is None else probe(host, port, timeout)
+    return run
+
+
+def _pruned(timeouts: ProbeTimeouts, reachability: Optional[Reachability]) -> Optional[Callable]:
+    """`skip` de iter_thread_batch: a linha skipped para os alvos de hosts podados."""
+    if reachability is None:
+        return None
+
+    def skip(host, port):
+        if timeouts.for_target(host) is None:
+            return None  # prazo esgotado: a linha de deadline sai pelo probe
+        reason = reachability.check(host)
+        return skipped_row(host, port, reason) if reason else None
+    return skip
+
+
+def _skipped(result) -> bool:
+    return type(result) is dict and result["status"] == "skipped"
+
+
+def _observe(row: dict, timeouts: ProbeTimeouts, reachability: Optional[Reachability]):
+    timeouts.observe(row)
+    if reachability is not None:
+        reachability.observe(row)
+
+
+def iter_socket_batch(targets: Iterable[Tuple[str, int]], timeout: int = 5, workers: int = 10,
+                      engine: str = "thread", concurrency: int = 1000, adaptive: bool = False,
+                      deadline_at: Optional[float] = None, limits: Optional[BatchLimits] = None,
+                      reachability: Optional[Reachability] = None) -> Iterator[dict]:
+    """
+    Gera uma linha de resultado por alvo, na ordem de término, com o motor escolhido.
+    `adaptive` e `deadline_at` ajustam o timeout de cada alvo (ver utils.timeouts);
+    `limits` controla taxa e testes simultâneos por destino (ver utils.ratelimit);
+    `reachability` pula os alvos de hosts inalcançáveis (ver utils.reachability).
+    """
+    from tests.connectivity_tests import test_socket_connection, run_socket_batch_async
+
+    timeouts = ProbeTimeouts(timeout, adaptive, deadline_at)
+    if engine == "async":
+        for host, port, probe in run_socket_batch_async(targets, timeout, concurrency, timeouts, limits,
+                                                        reachability):
+            if probe is None:
+                yield deadline_row(host, port)
+            elif _skipped(probe):
+                yield probe
+            else:
+                row = batch_row(host, port, probe)
+                _observe(row, timeouts, reachability)
+                yield row
+        return
+
+    for (host, port), probe, error in iter_thread_batch(
+        _with_timeouts(test_socket_connection, timeouts), targets, workers, pool="socket",
+        limits=limits, skip=_pruned(timeouts, reachability)
+    ):
+        if error is not None:
+            logger.error("❌ Erro ao testar %s:%s - %s", host, port, error,
+                         extra=probe_extra("socket", host, port, "error"))
+            yield {"host": host, "port": port, "status": "error"}
+        elif probe is None:
+            yield deadline_row(host, port)
+        elif _skipped(probe):
+            yield probe
+        else:
+            row = batch_row(host, port, probe)
+            _observe(row, timeouts, reachability)
+            yield row
+
+
+def ssl_row(host: str, port: int, timeout: int = 5) -> dict:
+    """Handshake + metadados do certificado de um alvo, no formato das linhas de lote."""
+    from tests.connectivity_tests import scan_tls
+
+    probe, cert, tls = scan_tls(host, port, timeout)
+    row = batch_row(host, port, probe)
+    if cert is None:
+        logger.error("🔒 Testando SSL %s:%s ==> ❌ SSL Falhou: %s", host, port, tls["exception"],
+                     extra=probe_extra("ssl", host, port, "failure"))
+        return row
+    row.update(cert.to_dict())
+    row["tls_version"] = tls["tls_version"]
+    row["tls_resumed"] = tls["tls_resumed"]
+    if "verify_error" in tls:
+        row["verify_error"] = tls["verify_error"]
+        logger.error("🔒 Testando SSL %s:%s ==> ❌ Certificado não verificado: %s", host, port, tls["verify_error"],
+                     extra=probe_extra("ssl", host, port, "failure"))
+    elif probe:
+        logger.info("🔒 Testando SSL %s:%s ==> ✅ Certificado válido (%s dias restantes)", host, port,
+                    row["days_left"], extra=probe_extra("ssl", host, port, "success"))
+    else:
+        logger.warning("🔒 Testando SSL %s:%s ==> ⚠️ Certificado fora do período de validade", host, port,
+                       extra=probe_extra("ssl", host, port, "failure"))
+    return row
+
+
+def iter_ssl_batch(targets: Iterable[Tuple[str, int]], timeout: int = 5, workers: int = 10,
+                   adaptive: bool = False, deadline_at: Optional[float] = None,
+                   limits: Optional[BatchLimits] = None,
+                   reachability: Optional[Reachability] = None) -> Iterator[dict]:
+    """
+    Testa SSL/certificado dos alvos em paralelo. Reaproveita contexto SSL, sessões
+    TLS por host e o cache de certificados interpretados (ver scan_tls).
+    """
+    timeouts = ProbeTimeouts(timeout, adaptive, deadline_at)
+    for (host, port), row, error in iter_thread_batch(_with_timeouts(ssl_row, timeouts), targets, workers,
+                                                      pool="ssl", limits=limits,
+                                                      skip=_pruned(timeouts, reachability)):
+        if error is not None:
+            logger.error("❌ Erro ao testar %s:%s - %s", host, port, error,
+                         extra=probe_extra("ssl", host, port, "error"))
+            yield {"host": host, "port": port, "status": "error"}
+        elif row is None:
+            yield deadline_row(host, port)
+        else:
+            if not _skipped(row):
+                _observe(row, timeouts, reachability)
+            yield row
+
+
+def ssl_report(rows: Iterable[dict]):
+    """
+    Ordena por dias até o vencimento (os mais urgentes primeiro); alvos sem
+    certificado ficam no fim. Devolve uma ResultTable (utils.results).
+    """
+    from utils.results import ResultTable
+
+    table = rows if isinstance(rows, ResultTable) else ResultTable(rows)
+    return table.sort(key=lambda row: (row.get("days_left") is None, row.get("days_left") or 0,
+                                       row["host"], row["port"]))
+
+
+def iter_netcat_batch(targets: Iterable[Tuple[str, int]], timeout: int = 5, workers: int = 10,
+                      udp: bool = False, banner: bool = False, banner_bytes: int = 1024, adaptive: bool = False,
+                      deadline_at: Optional[float] = None, limits: Optional[BatchLimits] = None,
+                      reachability: Optional[Reachability] = None) -> Iterator[dict]:
+    """Executa o netcat em processo para cada alvo, sem fork por teste."""
+    from tests.connectivity_tests import test_netcat_connection
+
+    timeouts = ProbeTimeouts(timeout, adaptive, deadline_at)
+    for (host, port), probe, error in iter_thread_batch(
+        _with_timeouts(lambda h, p, t: test_netcat_connection(h, p, t, udp, banner, banner_bytes), timeouts),
+        targets, workers, pool="netcat", limits=limits, skip=_pruned(timeouts, reachability)
+    ):
+        if error is not None:
+            logger.error("❌ Erro ao testar %s:%s - %s", host, port, error,
+                         extra=probe_extra("netcat", host, port, "error"))
+            yield {"host": host, "port": port, "status": "error"}
+        elif probe is None:
+            yield deadline_row(host, port)
+        elif _skipped(probe):
+            yield probe
+        else:
+            row = batch_row(host, port, probe)
+            _observe(row, timeouts, reachability)
+            yield row
+
+
+# Ordem fixa dos campos opcionais de uma linha, para trafegá-la como tupla
+# (bem mais barato de serializar entre processos do que um dict por alvo).
+ROW_FIELDS = ("ip", "error", "http_code", "banner", "dns_cache", "dns_ms", "connect_ms", "tls_ms", "ttfb_ms",
+              "total_ms", "subject", "issuer", "sans", "not_before", "not_after", "days_left", "fingerprint",
+              "tls_version", "tls_resumed", "verify_error")
+
+
+def pack_row(row: dict) -> tuple:
+    return (row["host"], row["port"], row["status"]) + tuple(row.get(field) for field in ROW_FIELDS)
+
+
+def unpack_row(packed: tuple) -> dict:
+    row = {"host": packed[0], "port": packed[1], "status": packed[2]}
+    for field, value in zip(ROW_FIELDS, packed[3:]):
+        if value is not None:
+            row[field] = value
+    return row
+
+
+class LatencyHistogram:
+    """
+    Histograma de latência com buckets logarítmicos (razão 1.05, ~2,5% de erro nos
+    percentis) entre 1 µs e 10 min. Memória fixa, independente do número de amostras.
+    """
+
+    RATIO = 1.05
+    MIN_MS = 0.001
+    MAX_MS = 600_000.0
+
+    def __init__(self):
+        self._log_ratio = math.log(self.RATIO)
+        self.counts = [0] * (self._bucket(self.MAX_MS) + 1)
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value_ms: float) -> int:
+        if value_ms <= self.MIN_MS:
+            return 0
+        return int(math.log(min(value_ms, self.MAX_MS) / self.MIN_MS) / self._log_ratio)
+
+    def add(self, value_ms: float):
+        self.counts[self._bucket(value_ms)] += 1
+        self.count += 1
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Ponto médio geométrico do bucket, limitado ao mínimo/máximo observados
+                value = self.MIN_MS * self.RATIO ** (index + 0.5)
+                return round(min(max(value, self.min), self.max), 3)
+        return round(self.max, 3)
+
+    def as_dict(self) -> dict:
+        return {"p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99)}
+
+
+class BatchSummary:
+    """
+    Contadores do lote atualizados a cada resultado, sem guardar as linhas.
+    Os percentis de latência consideram o total_ms dos testes bem-sucedidos.
+    Alvos pulados por utils.reachability contam em `skipped` (e em `total`).
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.failure = 0
+        self.error = 0
+        self.skipped = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, row: dict):
+        self.total += 1
+        status = row["status"]
+        if status == "success":
+            self.success += 1
+            if row.get("total_ms") is not None:
+                self.latency.add(row["total_ms"])
+        elif status == "failure":
+            self.failure += 1
+        elif status == "skipped":
+            self.skipped += 1
+        else:
+            self.error += 1
+
+    def merge(self, other: "BatchSummary"):
+        """Soma os contadores de outro resumo (ex.: de outro processo)."""
+        self.total += other.total
+        self.success += other.success
+        self.failure += other.failure
+        self.error += other.error
+        self.skipped += other.skipped
+        self.latency.merge(other.latency)
+
+    def as_dict(self) -> dict:
+        summary = {"total": self.total, "success": self.success, "failure": self.failure, "error": self.error}
+        if self.skipped:
+            summary["skipped"] = self.skipped
+        if self.latency.count:
+            summary["latency_ms"] = self.latency.as_dict()
+        return summary
+
+
+def ndjson_line(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
@@ -0,0 +1,345 @@
+"""
+Modo coordenador/worker: um lote grande é dividido em lotes menores (leases) que
+vão por HTTP para outras instâncias da API (POST /cluster/lease), cada uma com
+seu próprio motor de testes. O coordenador junta as linhas e os resumos.
+
+Workers vêm de CLUSTER_WORKERS, separados por vírgula: URLs (http://10.0.0.5:8000)
+ou dns+http://nome:porta, que expande para todos os IPs do nome (Service headless
+do Kubernetes), resolvido de novo a cada lote.
+"""
+import itertools
+import json
+import os
+import queue
+import socket
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+from urllib.parse import urlsplit
+from pydantic import BaseModel, ConfigDict, Field
+from utils.batch import BatchSummary
+from utils.logger import setup_logger
+from utils.ratelimit import BatchLimits
+
+logger = setup_logger()
+
+# Alvos por lease e leases simultâneos por worker
+LEASE_SIZE = int(os.environ.get("CLUSTER_LEASE_SIZE", "256"))
+LEASES_PER_WORKER = int(os.environ.get("CLUSTER_LEASES_PER_WORKER", "2"))
+# Tentativas de um lease antes de os alvos restantes virarem erro
+MAX_ATTEMPTS = int(os.environ.get("CLUSTER_MAX_ATTEMPTS", "3"))
+# Tempo (s) que um worker que falhou fica fora da distribuição
+RETRY_AFTER = float(os.environ.get("CLUSTER_RETRY_AFTER", "10"))
+# Obrigatório para a rota de worker (/cluster/lease) e para coordenar um lote
+CLUSTER_TOKEN = os.environ.get("CLUSTER_TOKEN") or None
+PROGRESS_INTERVAL = 5.0
+# Maior lease aceito por um worker
+MAX_LEASE_TARGETS = 65536
+
+
+def cluster_workers(spec: Optional[str] = None) -> List[str]:
+    """URLs base dos workers (sem barra final), na ordem de CLUSTER_WORKERS e sem repetições."""
+    spec = os.environ.get("CLUSTER_WORKERS", "") if spec is None else spec
+    workers = []
+    for item in spec.split(","):
+        item = item.strip().rstrip("/")
+        if not item:
+            continue
+        if not item.startswith("dns+"):
+            workers.append(item)
+            continue
+        url = urlsplit(item[4:])
+        port = url.port or (443 if url.scheme == "https" else 80)
+        try:
+            infos = socket.getaddrinfo(url.hostname, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            logger.warning(f"⚠️ Não foi possível resolver os workers de {item}: {e}")
+            continue
+        for family, _, _, _, sockaddr in sorted(infos, key=lambda info: info[4][0]):
+            ip = f"[{sockaddr[0]}]" if family == socket.AF_INET6 else sockaddr[0]
+            workers.append(f"{url.scheme}://{ip}:{port}")
+    return list(dict.fromkeys(workers))
+
+
+class LeaseLimits(BaseModel):
+    """Opções de BatchLimits aceitas em um lease."""
+    model_config = ConfigDict(extra="forbid")
+
+    rate: Optional[float] = Field(None, gt=0)
+    per_host: Optional[int] = Field(None, gt=0)
+    per_subnet: Optional[int] = Field(None, gt=0)
+    burst: Optional[float] = Field(None, gt=0)
+
+
+class LeasePrune(BaseModel):
+    """Opções de Reachability aceitas em um lease."""
+    model_config = ConfigDict(extra="forbid")
+
+    after: Optional[int] = Field(3, ge=1)
+    subnet_fraction: Optional[float] = Field(None, gt=0, le=1)
+    precheck: bool = False
+    precheck_timeout: float = Field(1.0, gt=0, le=60)
+    subnet_min_hosts: int = Field(8, ge=1)
+
+
+class LeaseOptions(BaseModel):
+    """Opções de ShardedBatch que um coordenador pode mandar; qualquer outra chave é recusada."""
+    model_config = ConfigDict(extra="forbid")
+
+    timeout: int = Field(5, ge=1, le=300)
+    workers: int = Field(10, ge=1, le=1000)
+    engine: Literal["thread", "async"] = "thread"
+    concurrency: int = Field(1000, ge=1, le=20000)
+    udp: bool = False
+    banner: bool = False
+    banner_bytes: int = Field(1024, ge=1, le=65536)
+    adaptive: bool = False
+    deadline: Optional[float] = Field(None, gt=0)  # segundos restantes, não horário
+    limits: Optional[LeaseLimits] = None
+    prune: Optional[LeasePrune] = None
+
+
+class LeaseRequest(BaseModel):
+    """Corpo de POST /cluster/lease."""
+    model_config = ConfigDict(extra="forbid")
+
+    probe: Literal["socket", "ssl", "netcat"] = "socket"
+    options: LeaseOptions = Field(default_factory=LeaseOptions)
+    targets: List[Tuple[str, Annotated[int, Field(ge=1, le=65535)]]] = Field(max_length=MAX_LEASE_TARGETS)
+
+
+class Lease:
+    """Um bloco de alvos; `remaining` guarda os que ainda não têm resultado."""
+
+    __slots__ = ("id", "remaining", "attempts", "holders", "started")
+
+    def __init__(self, lease_id: int, targets: List[Tuple[str, int]]):
+        self.id = lease_id
+        self.remaining = OrderedDict(((host, port), (host, port)) for host, port in targets)
+        self.attempts = 0
+        self.holders = set()
+        self.started = None
+
+    @property
+    def finished(self) -> bool:
+        return not self.remaining
+
+
+class WorkerState:
+    __slots__ = ("url", "slots", "leases", "rows", "duplicates", "failures", "stolen", "down_until", "last_error")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.slots = 0
+        self.leases = 0
+        self.rows = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.stolen = 0
+        self.down_until = 0.0
+        self.last_error = None
+
+    def as_dict(self) -> dict:
+        return {"url": self.url, "leases": self.leases, "rows": self.rows, "duplicates": self.duplicates,
+                "failures": self.failures, "stolen": self.stolen, "up": self.down_until <= time.monotonic(),
+                "last_error": self.last_error}
+
+
+class Coordinator:
+    """
+    Distribui alvos entre workers HTTP em leases de `lease_size` alvos.
+
+    - Cada worker recebe até `per_worker` leases por vez; quem termina antes pede
+      o próximo, então workers rápidos levam mais alvos.
+    - No fim do lote, um worker ocioso recebe uma cópia do que falta no lease mais
+      antigo de outro worker (roubo de trabalho); vale a primeira linha de cada alvo.
+    - Se um worker cai, fica mudo por `lease_timeout` ou devolve erro, o que faltava
+      do lease volta para a fila (na frente) e o worker fica fora por RETRY_AFTER.
+      Depois de MAX_ATTEMPTS tentativas os alvos restantes saem como erro.
+
+    As opções são as de ShardedBatch (timeout, workers, engine, limits...). A taxa
+    de `limits` é dividida entre os leases simultâneos; limites por host e por
+    sub-rede e a poda de hosts inalcançáveis (options["prune"]) valem dentro de
+    cada lease. `summary` soma as linhas aceitas.
+    """
+
+    def __init__(self, workers: List[str], kind: str, options: dict, lease_size: int = LEASE_SIZE,
+                 per_worker: int = LEASES_PER_WORKER, lease_timeout: Optional[float] = None,
+                 max_attempts: int = MAX_ATTEMPTS, token: Optional[str] = CLUSTER_TOKEN):
+        if not workers:
+            raise ValueError("nenhum worker configurado (CLUSTER_WORKERS)")
+        if kind not in ("socket", "ssl", "netcat"):
+            raise ValueError(f"tipo de teste não suportado: {kind}")
+        if not token:
+            raise ValueError("CLUSTER_TOKEN não definido; os workers recusam leases sem token")
+        self.kind = kind
+        self.workers = [WorkerState(url) for url in workers]
+        self.lease_size = max(lease_size, 1)
+        self.per_worker = max(per_worker, 1)
+        self.lease_timeout = lease_timeout or max(60.0, options.get("timeout", 5) * 4)
+        self.max_attempts = max(max_attempts, 1)
+        self.token = token
+        self.options = dict(options)
+        limits = BatchLimits.from_options(options.get("limits"))
+        if limits:
+            self.options["limits"] = limits.as_options(len(self.workers) * self.per_worker)
+        self.summary = BatchSummary()
+        self.completed = 0
+        self.lease_seconds = deque(maxlen=256)  # duração dos últimos leases, para o roubo de trabalho
+
+    def stats(self) -> List[dict]:
+        return [worker.as_dict() for worker in self.workers]
+
+    def _payload(self, targets: List[Tuple[str, int]]) -> bytes:
+        options = dict(self.options)
+        deadline_at = options.pop("deadline_at", None)
+        if deadline_at is not None:
+            # Relógios de máquinas diferentes: vai o tempo restante, não o horário
+            options["deadline"] = max(deadline_at - time.time(), 0.001)
+        return json.dumps({"probe": self.kind, "options": options,
+                           "targets": [[host, port] for host, port in targets]}).encode()
+
+    def _run_lease(self, worker: WorkerState, lease: Lease, targets: List[Tuple[str, int]], events: queue.Queue):
+        """Thread do lease: envia os alvos e repassa cada linha NDJSON como evento."""
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.token}"}
+        request = urllib.request.Request(f"{worker.url}/cluster/lease", data=self._payload(targets),
+                                         headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.lease_timeout) as response:
+                for line in response:
+                    if lease.finished:
+                        break  # outro worker já terminou este lease
+                    message = json.loads(line)
+                    if "summary" in message:
+                        break
+                    events.put(("row", worker, lease, message))
+                else:
+                    raise ConnectionError("o stream terminou sem o resumo")
+            events.put(("done", worker, lease, None))
+        except Exception as e:
+            events.put(("failed", worker, lease, f"{type(e).__name__}: {e}"))
+
+    def _available(self, now: float) -> List[WorkerState]:
+        return [worker for worker in self.workers if worker.down_until <= now and worker.slots < self.per_worker]
+
+    def _steal(self, worker: WorkerState, active: Dict[int, Lease], now: float) -> Optional[Lease]:
+        """Lease mais antigo de outro worker, parado há mais que o dobro da duração média de um lease."""
+        average = sum(self.lease_seconds) / len(self.lease_seconds) if self.lease_seconds else 1.0
+        candidates = [lease for lease in active.values()
+                      if len(lease.holders) == 1 and worker not in lease.holders
+                      and now - lease.started > max(2 * average, 1.0)]
+        return min(candidates, key=lambda lease: lease.started) if candidates else None
+
+    def run(self, targets: Iterable[Tuple[str, int]]) -> Iterator[dict]:
+        targets = iter(targets)
+        requeued = deque()
+        active: Dict[int, Lease] = {}
+        events = queue.Queue()
+        lease_ids = itertools.count(1)
+        exhausted = False
+        all_down_since = None
+        last_progress = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=len(self.workers) * self.per_worker,
+                                      thread_name_prefix="cluster-lease")
+
+        def dispatch(worker: WorkerState, lease: Lease, now: float):
+            if lease.started is None:
+                lease.started = now
+            lease.holders.add(worker)
+            worker.slots += 1
+            worker.leases += 1
+            executor.submit(self._run_lease, worker, lease, list(lease.remaining.values()), events)
+
+        def give_up(lease: Lease, error: str) -> List[dict]:
+            logger.error(f"❌ Lease {lease.id} falhou {lease.attempts} vez(es); {len(lease.remaining)} alvo(s) "
+                         f"ficam sem teste: {error}")
+            rows = [{"host": host, "port": port, "status": "error", "error": "cluster_worker_failed"}
+                    for host, port in lease.remaining.values()]
+            lease.remaining.clear()
+            active.pop(lease.id, None)
+            return rows
+
+        try:
+            while True:
+                now = time.monotonic()
+                for worker in self._available(now):
+                    while worker.slots < self.per_worker:
+                        if requeued:
+                            lease = requeued.popleft()
+                        elif not exhausted:
+                            chunk = list(itertools.islice(targets, self.lease_size))
+                            if not chunk:
+                                exhausted = True
+                                continue
+                            lease = Lease(next(lease_ids), chunk)
+                        else:
+                            lease = self._steal(worker, active, now)
+                            if lease is None:
+                                break
+                            worker.stolen += 1
+                            logger.info(f"🪝 {worker.url} assume o restante do lease {lease.id} "
+                                        f"({len(lease.remaining)} alvo(s))")
+                        active[lease.id] = lease
+                        dispatch(worker, lease, now)
+
+                if exhausted and not requeued and not active:
+                    return
+
+                if not any(worker.slots for worker in self.workers):
+                    # Nenhum lease em andamento: todos os workers estão fora
+                    all_down_since = all_down_since or now
+                    if now - all_down_since > self.lease_timeout:
+                        raise RuntimeError("nenhum worker do cluster está respondendo")
+                else:
+                    all_down_since = None
+
+                try:
+                    kind, worker, lease, payload = events.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+
+                if kind == "row":
+                    key = (payload["host"], payload["port"])
+                    if lease.remaining.pop(key, None) is None:
+                        worker.duplicates += 1
+                        continue
+                    worker.rows += 1
+                    self.completed += 1
+                    self.summary.add(payload)
+                    yield payload
+                    if lease.finished:
+                        active.pop(lease.id, None)
+                        self.lease_seconds.append(time.monotonic() - lease.started)
+                    now = time.monotonic()
+                    if now - last_progress >= PROGRESS_INTERVAL:
+                        logger.info(f"📈 Progresso: {self.completed} alvos concluídos em {len(self.workers)} worker(s)")
+                        last_progress = now
+                    continue
+
+                worker.slots -= 1
+                lease.holders.discard(worker)
+                if kind == "failed":
+                    worker.failures += 1
+                    worker.last_error = payload
+                    worker.down_until = time.monotonic() + RETRY_AFTER
+                    logger.warning(f"⚠️ Worker {worker.url} falhou no lease {lease.id}: {payload}")
+                if lease.finished or lease.holders:
+                    continue
+                # Terminou (ou caiu) sem devolver todos os alvos e ninguém mais está com o lease
+                lease.attempts += 1
+                if lease.attempts >= self.max_attempts:
+                    for row in give_up(lease, payload or "alvos sem resultado"):
+                        self.completed += 1
+                        self.summary.add(row)
+                        yield row
+                else:
+                    active.pop(lease.id, None)
+                    lease.started = None
+                    requeued.appendleft(lease)
+        finally:
+            # Leases ainda abertos terminam sozinhos ao ver o lease vazio ou no timeout
+            for lease in active.values():
+                lease.remaining.clear()
+            executor.shutdown(wait=False)
@@ -0,0 +1,139 @@
+"""
+Processo residente para os testes individuais da CLI (socket, netcat, ssl, curl e ping).
+
+`python main.py daemon` deixa um processo com os módulos de teste já importados
+(e os caches de DNS, sessões TLS e certificados quentes) ouvindo em um socket
+Unix. Quando o socket existe, main.py repassa esses comandos ao daemon antes
+mesmo de importar o typer: o cliente só paga o interpretador e este módulo.
+
+Protocolo: uma linha JSON por conexão, {"argv": [...], "level": ..., "format": ...};
+a resposta é uma linha {"logs": [linha formatada, ...], "exit_code": N}. O
+daemon formata o log com o LOG_LEVEL/LOG_FORMAT do cliente, que só escreve as
+linhas no stderr (sem importar nem o logging).
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import List, Optional
+
+# Comandos que o cliente repassa ao daemon
+FORWARDED_COMMANDS = ("socket", "netcat", "ssl", "curl", "ping")
+# Espera máxima do cliente pela resposta (o teste em si tem o próprio --timeout)
+CLIENT_TIMEOUT = 300
+
+
+def default_socket_path() -> str:
+    return os.environ.get("CONNECTIVITY_DAEMON_SOCKET") or \
+        os.path.join(tempfile.gettempdir(), f"connectivity-tool-{os.getuid()}.sock")
+
+
+def forward(argv: List[str], path: Optional[str] = None) -> Optional[int]:
+    """
+    Executa `argv` no daemon e escreve as linhas de log no stderr. Devolve o
+    código de saída ou None se não há daemon (o chamador roda o comando local).
+    """
+    if not argv or argv[0] not in FORWARDED_COMMANDS or os.environ.get("CONNECTIVITY_DAEMON") == "0":
+        return None
+    if "--help" in argv:
+        return None  # a ajuda sai no stdout do daemon; mais simples gerar aqui
+    path = path or default_socket_path()
+    if not os.path.exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None  # socket órfão de um daemon que já parou
+    with client:
+        client.settimeout(CLIENT_TIMEOUT)
+        request = {"argv": argv, "level": os.environ.get("LOG_LEVEL", "INFO").upper(),
+                   "format": os.environ.get("LOG_FORMAT", "text")}
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as reader:
+            line = reader.readline()
+    if not line:
+        return None  # o daemon caiu no meio; roda local
+    reply = json.loads(line)
+    if reply["logs"]:
+        sys.stderr.write("\n".join(reply["logs"]) + "\n")
+    return reply["exit_code"]
+
+
+def serve(app, path: Optional[str] = None):
+    """Atende os comandos repassados até Ctrl+C, um por thread."""
+    import logging
+    import socketserver
+    import threading
+    import signal
+    from utils.logger import LOGGER_NAME, TEXT_FORMAT, JsonFormatter, setup_logger
+
+    logger = setup_logger()
+    path = path or default_socket_path()
+    formatters = {"text": logging.Formatter(TEXT_FORMAT), "json": JsonFormatter()}
+    captured = {}  # id da thread -> (nível mínimo, formatador, linhas) do comando que ela executa
+
+    class Capture(logging.Handler):
+        def emit(self, record: logging.LogRecord):
+            target = captured.get(record.thread)
+            if target is not None and record.levelno >= target[0]:
+                target[2].append(target[1].format(record))
+
+    logging.getLogger(LOGGER_NAME).addHandler(Capture())
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline() or b"{}")
+            argv = request.get("argv") or []
+            level = logging.getLevelName(request.get("level", "INFO"))
+            lines = []
+            captured[threading.get_ident()] = (level if isinstance(level, int) else logging.INFO,
+                                               formatters.get(request.get("format"), formatters["text"]), lines)
+            try:
+                if not argv or argv[0] not in FORWARDED_COMMANDS:
+                    logger.error(f"❌ Comando não atendido pelo daemon: {' '.join(argv)}")
+                    exit_code = 2
+                else:
+                    exit_code = _run(app, argv)
+            finally:
+                captured.pop(threading.get_ident(), None)
+            self.wfile.write(json.dumps({"logs": lines, "exit_code": exit_code}, ensure_ascii=False).encode()
+                             + b"\n")
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(path):
+        os.unlink(path)  # sobra de um daemon anterior
+    server = Server(path, Handler)
+    os.chmod(path, 0o600)
+    # kill/SIGTERM também remove o socket (cai no finally como o Ctrl+C)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    logger.info(f"🔥 Daemon ouvindo em {path} (comandos: {', '.join(FORWARDED_COMMANDS)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def _run(app, argv: List[str]) -> int:
+    import typer
+    from utils.logger import setup_logger
+
+    logger = setup_logger()
+    try:
+        app(args=argv, prog_name="main.py", standalone_mode=False)
+        return 0
+    except typer.Exit as e:
+        return e.exit_code
+    except typer.TyperException as e:  # uso incorreto: opção faltando, valor inválido...
+        logger.error(f"❌ {e.format_message()}")
+        return getattr(e, "exit_code", 2)
+    except Exception as e:
+        logger.error(f"❌ Erro no daemon: {e}")
+        return 1
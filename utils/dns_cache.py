@@ -0,0 +1,234 @@
+import errno
+import itertools
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import List, Optional, Tuple
+
+# Resultado de uma resolução: endereços (family, ip) na ordem do getaddrinfo,
+# se veio do cache e quanto tempo levou em milissegundos.
+Resolution = namedtuple("Resolution", ["addresses", "cache_hit", "elapsed_ms"])
+
+
+class _InFlight:
+    __slots__ = ("event", "addresses", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.addresses = None
+        self.error = None
+
+
+class DNSCache:
+    """
+    Cache de resolução de nomes compartilhado pelo processo.
+
+    - Respostas positivas ficam válidas por `ttl` segundos e falhas (gaierror) por
+      `negative_ttl` segundos, para não martelar o resolvedor com nomes inexistentes.
+    - O tamanho é limitado a `max_size` nomes, com descarte LRU.
+    - Consultas simultâneas ao mesmo nome esperam uma única chamada a getaddrinfo.
+    """
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30, max_size: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # host -> (expira_em, endereços | gaierror)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, host: str) -> Optional[List[Tuple[int, str]]]:
+        """Retorna os endereços em cache (ou levanta o erro em cache) sem resolver; None se não houver."""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[host]
+                return None
+            self._entries.move_to_end(host)
+            self.hits += 1
+        if isinstance(value, socket.gaierror):
+            raise socket.gaierror(*value.args)
+        return value
+
+    def resolve(self, host: str) -> Resolution:
+        start = time.perf_counter()
+        cached = self.lookup(host)
+        if cached is not None:
+            return Resolution(cached, True, (time.perf_counter() - start) * 1000)
+
+        with self._lock:
+            flight = self._inflight.get(host)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[host] = _InFlight()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if leader:
+            try:
+                flight.addresses = self._getaddrinfo(host)
+                self._store(host, flight.addresses, self.ttl)
+            except socket.gaierror as e:
+                flight.error = e
+                self._store(host, e, self.negative_ttl)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    self._inflight.pop(host, None)
+                flight.event.set()
+        else:
+            flight.event.wait()
+
+        if flight.error is not None:
+            raise type(flight.error)(*flight.error.args)
+        return Resolution(flight.addresses, not leader, (time.perf_counter() - start) * 1000)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _store(self, host, value, ttl):
+        with self._lock:
+            self._entries[host] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(host)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _getaddrinfo(host: str) -> List[Tuple[int, str]]:
+        addresses = []
+        for family, _, _, _, sockaddr in socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM):
+            address = (family, sockaddr[0])
+            if address not in addresses:
+                addresses.append(address)
+        return addresses
+
+
+resolver = DNSCache()
+
+
+def sockaddr_for(family: int, ip: str, port: int):
+    return (ip, port, 0, 0) if family == socket.AF_INET6 else (ip, port)
+
+
+# "Connection Attempt Delay" da RFC 8305: espera antes de disparar o próximo endereço
+HAPPY_EYEBALLS_DELAY = 0.25
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN}
+
+
+def interleave_families(addresses: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Alterna as famílias (RFC 8305, seção 4), começando pela primeira do getaddrinfo."""
+    by_family = OrderedDict()
+    for address in addresses:
+        by_family.setdefault(address[0], []).append(address)
+    if len(by_family) < 2:
+        return list(addresses)
+    return [address for group in itertools.zip_longest(*by_family.values()) for address in group if address]
+
+
+def _connect_one(addresses: List[Tuple[int, str]], port: int, timeout: Optional[float]) -> socket.socket:
+    family, ip = addresses[0]
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(sockaddr_for(family, ip, port))
+        return sock
+    except BaseException:
+        sock.close()
+        raise
+
+
+def connect_addresses(addresses: List[Tuple[int, str]], port: int, timeout: Optional[float] = None,
+                      delay: float = HAPPY_EYEBALLS_DELAY) -> socket.socket:
+    """
+    Conecta no primeiro endereço que responder, no estilo Happy Eyeballs (RFC 8305):
+    as famílias se alternam e uma nova tentativa começa a cada `delay` segundos
+    (ou logo após uma falha), sem cancelar as anteriores. Um IPv6 morto não
+    consome mais o timeout inteiro antes do IPv4. `timeout` vale para a conexão
+    como um todo e fica configurado no socket devolvido.
+    """
+    addresses = interleave_families(addresses)
+    if len(addresses) <= 1:
+        if not addresses:
+            raise OSError("nenhum endereço para conectar")
+        return _connect_one(addresses, port, timeout)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = iter(addresses)
+    next_start = time.monotonic()
+    error = None
+    winner = None
+    with selectors.DefaultSelector() as selector:
+        try:
+            while winner is None:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise TimeoutError("timed out")
+                if next_start is not None and (now >= next_start or not selector.get_map()):
+                    address = next(pending, None)
+                    if address is None:
+                        next_start = None
+                    else:
+                        family, ip = address
+                        sock = socket.socket(family, socket.SOCK_STREAM)
+                        sock.setblocking(False)
+                        code = sock.connect_ex(sockaddr_for(family, ip, port))
+                        if code == 0:
+                            winner = sock
+                            break
+                        if code in _IN_PROGRESS:
+                            selector.register(sock, selectors.EVENT_WRITE)
+                            next_start = now + delay
+                        else:
+                            error = OSError(code, os.strerror(code))
+                            sock.close()
+                        continue
+                if not selector.get_map():
+                    raise error or OSError("nenhum endereço para conectar")
+                waits = [t - now for t in (deadline, next_start) if t is not None]
+                for key, _ in selector.select(max(min(waits), 0) if waits else None):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if code == 0 and winner is None:
+                        winner = sock
+                    else:
+                        error = OSError(code, os.strerror(code)) if code else error
+                        sock.close()
+                        if next_start is not None:
+                            next_start = now  # falhou: o próximo endereço não espera o delay
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+    winner.settimeout(timeout)
+    return winner
+
+
+def connect_cached(host: str, port: int, timeout: Optional[float] = None,
+                   cache: DNSCache = None) -> Tuple[socket.socket, Resolution]:
+    """
+    Equivalente a socket.create_connection, mas resolvendo o nome pelo cache.
+    Retorna o socket conectado e a Resolution usada.
+    """
+    resolution = (cache or resolver).resolve(host)
+    return connect_addresses(resolution.addresses, port, timeout), resolution
+
+
+def create_connection(address: Tuple[str, int], timeout: Optional[float] = None) -> socket.socket:
+    """Substituto direto de socket.create_connection usando o cache de DNS."""
+    return connect_cached(address[0], address[1], timeout)[0]
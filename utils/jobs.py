@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional
+from utils.results import ResultTable
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "queued", "running", "done", "cancelled", "failed"
+FINISHED = (DONE, CANCELLED, FAILED)
+
+
+class Job:
+    """Um lote em execução fora do event loop, com progresso e resultados incrementais."""
+
+    def __init__(self, kind: str, rows: Callable[[], Iterator[dict]], estimate: Optional[int] = None,
+                 cleanup: Optional[Callable[[], None]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.error = None
+        self.estimate = estimate
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Colunar: o job guarda todas as linhas até sair da lista de jobs
+        self.results = ResultTable()
+        self.summary = self.results.summary
+        self._rows = rows
+        self._cleanup = cleanup
+        self._cancel = threading.Event()
+        self._changed = threading.Condition()
+
+    def run(self):
+        rows = None
+        try:
+            # Cancelado ainda na fila: não roda, mas o finally remove o upload mesmo assim
+            if self._cancel.is_set():
+                self._finish(CANCELLED)
+                return
+            self.status = RUNNING
+            self.started = time.time()
+            rows = self._rows()
+            for row in rows:
+                with self._changed:
+                    self.results.append(row)  # atualiza também self.summary
+                    self._changed.notify_all()
+                if self._cancel.is_set():
+                    break
+            self._finish(CANCELLED if self._cancel.is_set() else DONE)
+        except Exception as e:
+            logger.error(f"❌ Job {self.id} falhou: {e}")
+            self.error = str(e)
+            self._finish(FAILED)
+        finally:
+            close = getattr(rows, "close", None)
+            # Fechar o gerador cancela os testes ainda não iniciados
+            if close:
+                close()
+            if self._cleanup:
+                self._cleanup()
+
+    def _finish(self, status: str):
+        with self._changed:
+            self.status = status
+            self.finished = time.time()
+            self._changed.notify_all()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == QUEUED:
+            self._finish(CANCELLED)
+
+    def wait_for(self, index: int, timeout: float) -> bool:
+        """Espera até existir o resultado `index` ou o job terminar. Retorna se há novidade."""
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: len(self.results) > index or self.status in FINISHED, timeout
+            )
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def page(self, offset: int, limit: int) -> List[dict]:
+        return self.results[offset:offset + limit]
+
+    def progress(self) -> dict:
+        with self._changed:
+            completed = len(self.results)
+            summary = self.summary.as_dict()
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        info = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "completed": completed,
+            "estimate": self.estimate,
+            "elapsed_s": round(elapsed, 3),
+            "rate_per_s": round(completed / elapsed, 1) if elapsed else 0.0,
+            "summary": summary,
+        }
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class JobManager:
+    """
+    Executa jobs em threads próprias (no máximo `max_running` ao mesmo tempo) e
+    guarda os `keep` mais recentes para consulta.
+    """
+
+    def __init__(self, max_running: int = 4, keep: int = 100):
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def submit(self, job: Job) -> Job:
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.status in FINISHED]
+            for old in finished[:max(len(self._jobs) - self.keep, 0)]:
+                del self._jobs[old.id]
+        self._executor.submit(job.run)
+        logger.info(f"🧾 Job {job.id} ({job.kind}) enfileirado")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+
+def spool_upload(source, directory: Optional[str] = None):
+    """
+    Copia o upload para um arquivo temporário próprio (o UploadFile é fechado ao fim
+    da requisição) e conta as linhas, que servem de estimativa do total de alvos.
+    Retorna (caminho, linhas).
+    """
+    import tempfile
+
+    source.seek(0)
+    lines = 0
+    last = b""
+    fd, path = tempfile.mkstemp(prefix="net-tools-job-", suffix=".txt", dir=directory)
+    with os.fdopen(fd, "wb") as out:
+        for chunk in iter(lambda: source.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+            out.write(chunk)
+            last = chunk
+    if last and not last.endswith(b"\n"):
+        lines += 1
+    return path, lines
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+jobs = JobManager(max_running=int(os.environ.get("JOBS_MAX_RUNNING", "4")))
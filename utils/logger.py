@@ -1,8 +1,214 @@
+import atexit
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from utils.ratelimit import destination_subnet
+
+LOGGER_NAME = "connectivity_tool"
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# Como tratar as linhas por teste (registros com extra={"probe": ...}):
+#   all       - todas
+#   sample    - uma a cada N por nível (LOG_SAMPLE, ex.: "INFO=0.01,ERROR=0.1")
+#   aggregate - contagens por grupo de alvos a cada LOG_AGGREGATE_WINDOW segundos
+#   summary   - nenhuma; só progresso e resumo do lote
+PROBE_MODES = ("all", "sample", "aggregate", "summary")
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+_local = threading.local()
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos passados em `extra` (host, port, probe...)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # O QueueHandler padrão formata a mensagem na thread de quem loga; aqui a
+        # formatação (msg % args, JSON) fica toda para a thread do listener.
+        return record
+
+
+class _ProbePolicy:
+    def __init__(self):
+        self.single = os.environ.get("LOG_PROBES", "all")
+        self.batch = os.environ.get("LOG_BATCH_PROBES", "summary")
+        self.window = float(os.environ.get("LOG_AGGREGATE_WINDOW", "10"))
+        self.every = {}
+        self.set_sampling(os.environ.get("LOG_SAMPLE", "INFO=0.01,WARNING=0.1,ERROR=0.1"))
+        self._counters = {}
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+        self._flusher = None
+
+    def set_sampling(self, spec: str):
+        """"INFO=0.01,ERROR=0.1" -> mantém 1 a cada 100 INFO e 1 a cada 10 ERROR."""
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            level, _, rate = item.partition("=")
+            levelno = logging.getLevelName(level.strip().upper())
+            if isinstance(levelno, int) and float(rate) > 0:
+                self.every[levelno] = max(1, round(1 / float(rate)))
+
+    def keep_sample(self, levelno: int) -> bool:
+        every = self.every.get(levelno, 1)
+        if every == 1:
+            return True
+        counter = self._counters.get(levelno)
+        if counter is None:
+            counter = self._counters.setdefault(levelno, itertools.count())
+        return next(counter) % every == 0
+
+    def aggregate(self, record: logging.LogRecord):
+        status = getattr(record, "status", None)
+        if status is None:
+            return  # linhas auxiliares (ex.: "Testando ...") não entram na contagem
+        key = (status == "success", record.probe, destination_subnet(str(getattr(record, "host", "?"))))
+        with self._counts_lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="log-aggregate", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        with self._counts_lock:
+            counts, self._counts = self._counts, {}
+        logger = logging.getLogger(LOGGER_NAME)
+        window = f"{self.window:g}"
+        for (ok, probe, group), count in sorted(counts.items(), key=lambda item: -item[1]):
+            extra = {"aggregated": True, "probe": probe, "group": group, "count": count, "window_s": self.window}
+            if ok:
+                logger.info("📈 %d teste(s) de %s OK para %s nos últimos %ss", count, probe, group, window,
+                            extra=extra)
+            else:
+                logger.error("📉 %d falha(s) de %s para %s nos últimos %ss", count, probe, group, window,
+                             extra=extra)
+
+
+_policy = _ProbePolicy()
+
+
+class ProbeLogFilter(logging.Filter):
+    """
+    Aplica a política de linhas por teste na thread de quem loga, antes de o
+    registro entrar na fila: o que é descartado não custa formatação nem I/O.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        probe = getattr(record, "probe", None)
+        if probe is None or getattr(record, "aggregated", False):
+            return True
+        mode = _policy.batch if getattr(_local, "batch", False) else _policy.single
+        if mode == "all":
+            return True
+        if mode == "summary":
+            return False
+        if mode == "sample":
+            return _policy.keep_sample(record.levelno)
+        _policy.aggregate(record)
+        return False
+
+
+def probe_extra(probe: str, host: str, port: Optional[int] = None, status: Optional[str] = None) -> dict:
+    """Campos de uma linha por teste; `status` marca a linha de resultado (contada no modo aggregate)."""
+    return {"probe": probe, "host": host, "port": port, "status": status}
+
+
+def mark_batch_thread(batch: bool = True) -> bool:
+    """
+    Marca a thread atual como parte de um lote (aplica LOG_BATCH_PROBES às linhas
+    por teste). Devolve a marcação anterior, para quem precisar restaurá-la.
+    """
+    previous = getattr(_local, "batch", False)
+    _local.batch = batch
+    return previous
+
+
+def configure_probe_logging(single: Optional[str] = None, batch: Optional[str] = None,
+                            sample: Optional[str] = None, window: Optional[float] = None):
+    for mode in (single, batch):
+        if mode is not None and mode not in PROBE_MODES:
+            raise ValueError(f"modo de log inválido: {mode} (use {', '.join(PROBE_MODES)})")
+    if single is not None:
+        _policy.single = single
+    if batch is not None:
+        _policy.batch = batch
+    if sample is not None:
+        _policy.set_sampling(sample)
+    if window is not None:
+        _policy.window = window
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """Troca nível (INFO, DEBUG...) e/ou formato (text ou json) do log já configurado."""
+    setup_logger()
+    if level:
+        logging.getLogger().setLevel(level.upper())
+    if fmt and _handler is not None:
+        _handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+
+def _shutdown():
+    _policy.flush()
+    if _listener is not None:
+        _listener.stop()
+
 
 def setup_logger():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s"
-    )
-    return logging.getLogger("connectivity_tool")
\ No newline at end of file
+    """
+    Configura o log uma única vez e devolve o logger da ferramenta.
+
+    Por padrão (LOG_ASYNC=1) as threads só enfileiram registros; a formatação e a
+    escrita em stderr ficam em uma thread própria. LOG_FORMAT=json troca o texto
+    por JSON estruturado e LOG_LEVEL ajusta o nível.
+    """
+    global _handler, _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _handler is not None or any(isinstance(f, ProbeLogFilter) for f in logger.filters):
+            return logger
+        logger.addFilter(ProbeLogFilter())
+        root = logging.getLogger()
+        if root.handlers:
+            # Outro framework (uvicorn, streamlit) já configurou o log
+            return logger
+
+        _handler = logging.StreamHandler()
+        fmt = os.environ.get("LOG_FORMAT", "text")
+        _handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+        handler = _handler
+        if os.environ.get("LOG_ASYNC", "1") != "0":
+            _listener = logging.handlers.QueueListener(queue.SimpleQueue(), _handler, respect_handler_level=True)
+            handler = _LazyQueueHandler(_listener.queue)
+            _listener.start()
+        logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), handlers=[handler])
+        atexit.register(_shutdown)
+    return logger
@@ -0,0 +1,241 @@
+import bisect
+import functools
+import inspect
+import os
+import threading
+from typing import Iterable, Iterator, Sequence
+
+# Limites (em segundos) dos buckets dos histogramas de duração dos testes
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Child:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        if registry.enabled:
+            with self._lock:
+                self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        if registry.enabled:
+            self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        if registry.enabled:
+            index = bisect.bisect_left(self._buckets, value)
+            with self._lock:
+                self.counts[index] += 1
+                self.sum += value
+                self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _new_child(self):
+        return _Child()
+
+    def labels(self, *values):
+        """Série com os valores de label informados (criada no primeiro uso e reaproveitada)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera os labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self):
+        with self._lock:
+            series = list(self._children.items())
+        for values, child in series:
+            yield tuple(str(v) for v in values), child
+
+    def _labels(self, values, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in self._series():
+            yield f"{self.name}{self._labels(values)} {_number(child.value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def render(self) -> Iterator[str]:
+        # A exposição do Prometheus usa o sufixo _total nos contadores
+        for line in super().render():
+            yield line if line.startswith("#") else line.replace(self.name, self.name + "_total", 1)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for values, child in self._series():
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = self._labels(values, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{self._labels(values)} {_number(total)}"
+            yield f"{self.name}_count{self._labels(values)} {count}"
+
+
+class Registry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Todas as métricas no formato texto do Prometheus (0.0.4)."""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# METRICS_ENABLED=0 desliga a coleta (cada operação vira um if)
+registry = Registry(enabled=os.environ.get("METRICS_ENABLED", "1") != "0")
+
+PROBES = Counter("connectivity_probes", "Testes concluídos por tipo, grupo de alvos e resultado",
+                 ("probe", "group", "result"))
+PROBE_DURATION = Histogram("connectivity_probe_duration_seconds", "Duração total dos testes bem-sucedidos",
+                           ("probe", "group"))
+IN_FLIGHT = Gauge("connectivity_probes_in_flight", "Testes em andamento", ("probe",))
+POOL_WORKERS = Gauge("connectivity_pool_workers", "Workers disponíveis nos pools de teste", ("pool",))
+POOL_ACTIVE = Gauge("connectivity_pool_active", "Workers ocupados nos pools de teste", ("pool",))
+POOL_QUEUED = Gauge("connectivity_pool_queued", "Testes submetidos aguardando um worker livre", ("pool",))
+
+
+def observe_row(kind: str, group: str, row: dict):
+    """Conta o resultado de uma linha de teste (success ou a classe do erro) e a duração."""
+    if not registry.enabled:
+        return
+    if row["status"] == "success":
+        PROBES.labels(kind, group, "success").inc()
+        if row.get("total_ms") is not None:
+            PROBE_DURATION.labels(kind, group).observe(row["total_ms"] / 1000)
+    else:
+        PROBES.labels(kind, group, row.get("error") or row["status"]).inc()
+
+
+def observe_rows(kind: str, group: str, rows: Iterable[dict]) -> Iterator[dict]:
+    for row in rows:
+        observe_row(kind, group, row)
+        yield row
+
+
+def track_in_flight(kind: str):
+    """Decorador: mantém o gauge de testes em andamento (funções comuns ou async)."""
+    gauge = IN_FLIGHT.labels(kind)
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                gauge.inc()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    gauge.dec()
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            gauge.inc()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                gauge.dec()
+        return wrapper
+    return decorator
+
+
+def group_name(path: str) -> str:
+    """Grupo de alvos derivado do nome da lista (lista.txt -> lista)."""
+    return os.path.splitext(os.path.basename(path or ""))[0] or "default"
+
+
+def start_exporter(port: int, host: str = "0.0.0.0"):
+    """Sobe um servidor HTTP em segundo plano com GET /metrics (para execuções via CLI)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
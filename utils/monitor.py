@@ -0,0 +1,276 @@
+import csv
+import math
+import random
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+from utils.batch import LatencyHistogram
+from utils.logger import mark_batch_thread, probe_extra, setup_logger
+from utils.metrics import POOL_ACTIVE, POOL_QUEUED, POOL_WORKERS, observe_row
+from utils.timeouts import ProbeTimeouts
+
+logger = setup_logger()
+
+# Códigos de status guardados no buffer (um byte por amostra)
+_STATUS_CODES = {"success": 1, "failure": 0, "error": -1}
+_STATUS_NAMES = {code: name for name, code in _STATUS_CODES.items()}
+
+
+class MonitorTarget:
+    __slots__ = ("host", "port", "interval", "group", "history", "last_status", "running")
+
+    def __init__(self, host: str, port: int, interval: float, capacity: int, group: str = "default"):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.group = group
+        self.history = RingBuffer(capacity)
+        self.last_status = None
+        self.running = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+def parse_monitor_targets(lines: Iterable[str], default_interval: float, capacity: int,
+                          group: str = "default") -> List[MonitorTarget]:
+    """
+    Lê host:porta[:intervalo[:grupo]] ou host,porta[,intervalo[,grupo]] (intervalo em
+    segundos; o grupo vira label nas métricas). Linhas vazias e comentários (#) são
+    ignorados; alvos repetidos ficam com a última linha.
+    """
+    targets = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        row = next(csv.reader([line], delimiter="," if "," in line else ":"))
+        if len(row) not in (2, 3, 4):
+            logger.warning(f"⚠️ Linha inválida: {row}")
+            continue
+        try:
+            host, port = row[0].strip(), int(row[1])
+            interval = float(row[2]) if len(row) >= 3 and row[2].strip() else default_interval
+        except ValueError:
+            logger.warning(f"⚠️ Porta ou intervalo inválido: {row}")
+            continue
+        if interval <= 0:
+            logger.warning(f"⚠️ Intervalo inválido: {row}")
+            continue
+        target_group = row[3].strip() if len(row) == 4 and row[3].strip() else group
+        targets[(host, port)] = MonitorTarget(host, port, interval, capacity, target_group)
+    return list(targets.values())
+
+
+class RingBuffer:
+    """
+    Últimas `capacity` amostras de um alvo em arrays de tamanho fixo
+    (horário, status e latência), sem um objeto Python por amostra.
+    """
+
+    __slots__ = ("capacity", "count", "_next", "_times", "_status", "_latency")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        self._next = 0
+        self._times = array("d", bytes(8 * capacity))
+        self._status = array("b", bytes(capacity))
+        self._latency = array("f", bytes(4 * capacity))
+
+    def append(self, timestamp: float, status: str, latency_ms: Optional[float]):
+        i = self._next
+        self._times[i] = timestamp
+        self._status[i] = _STATUS_CODES.get(status, -1)
+        self._latency[i] = math.nan if latency_ms is None else latency_ms
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _indexes(self):
+        """Posições das amostras guardadas, da mais antiga para a mais recente."""
+        start = (self._next - self.count) % self.capacity
+        return ((start + n) % self.capacity for n in range(self.count))
+
+    def samples(self, since: float = 0.0, limit: Optional[int] = None) -> List[dict]:
+        samples = []
+        for i in self._indexes():
+            if self._times[i] >= since:
+                latency = self._latency[i]
+                samples.append({
+                    "time": self._times[i],
+                    "status": _STATUS_NAMES[self._status[i]],
+                    "total_ms": None if math.isnan(latency) else round(latency, 3),
+                })
+        return samples[-limit:] if limit else samples
+
+    def stats(self, since: float = 0.0) -> dict:
+        """Disponibilidade e percentis de latência das amostras a partir de `since`."""
+        total = up = 0
+        latency = LatencyHistogram()
+        for i in self._indexes():
+            if self._times[i] < since:
+                continue
+            total += 1
+            if self._status[i] == 1:
+                up += 1
+                if not math.isnan(self._latency[i]):
+                    latency.add(self._latency[i])
+        stats = {"samples": total, "uptime_pct": round(100 * up / total, 2) if total else None}
+        if latency.count:
+            stats["latency_ms"] = latency.as_dict()
+        return stats
+
+
+class TimingWheel:
+    """
+    Roda de tempo com hash (Varghese & Lauck): `slots` posições de `tick`
+    segundos cada. Agendar e disparar custam O(1) por item, qualquer que seja
+    o número de alvos; atrasos maiores que uma volta guardam o número de voltas.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 512):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.cursor = 0
+        self._lock = threading.Lock()
+
+    def schedule(self, item, delay: float):
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self._lock:
+            rounds, offset = divmod(ticks, len(self.slots))
+            if offset == 0:
+                rounds, offset = rounds - 1, len(self.slots)
+            self.slots[(self.cursor + offset) % len(self.slots)].append([rounds, item])
+
+    def advance(self) -> list:
+        """Avança um tick e devolve os itens vencidos."""
+        with self._lock:
+            self.cursor = (self.cursor + 1) % len(self.slots)
+            bucket = self.slots[self.cursor]
+            due = [entry[1] for entry in bucket if entry[0] == 0]
+            if len(due) != len(bucket):
+                remaining = [entry for entry in bucket if entry[0] > 0]
+                for entry in remaining:
+                    entry[0] -= 1
+                self.slots[self.cursor] = remaining
+            else:
+                bucket.clear()
+            return due
+
+
+def _probe_row(kind: str, host: str, port: int, timeout: int) -> dict:
+    from tests.connectivity_tests import test_socket_connection, test_netcat_connection
+    from utils.batch import batch_row, ssl_row
+
+    if kind == "ssl":
+        return ssl_row(host, port, timeout)
+    if kind == "netcat":
+        return batch_row(host, port, test_netcat_connection(host, port, timeout))
+    return batch_row(host, port, test_socket_connection(host, port, timeout))
+
+
+class Monitor:
+    """
+    Testa cada alvo continuamente no seu intervalo. Os disparos são agendados
+    numa TimingWheel com um desvio aleatório (`jitter`, fração do intervalo) e a
+    primeira rodada é espalhada ao longo do intervalo, para milhares de alvos não
+    dispararem juntos. Um alvo nunca tem dois testes simultâneos. Com `adaptive`,
+    o timeout de cada teste segue o RTT observado do alvo (ver utils.timeouts).
+    """
+
+    def __init__(self, targets: List[MonitorTarget], kind: str = "socket", timeout: int = 5, workers: int = 50,
+                 jitter: float = 0.1, tick: float = 0.1,
+                 on_result: Optional[Callable[[MonitorTarget, dict], None]] = None, adaptive: bool = False):
+        if kind not in ("socket", "ssl", "netcat"):
+            raise ValueError(f"tipo de teste não suportado: {kind}")
+        self.kind = kind
+        self.timeout = timeout
+        self.timeouts = ProbeTimeouts(timeout, adaptive)
+        self.jitter = jitter
+        self.on_result = on_result
+        self.targets = {target.key: target for target in targets}
+        self.started = None
+        self._wheel = TimingWheel(tick)
+        self._workers = workers
+        self._executor = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _delay(self, interval: float) -> float:
+        return max(interval * (1 + random.uniform(-self.jitter, self.jitter)), self._wheel.tick)
+
+    def start(self):
+        self.started = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="monitor")
+        POOL_WORKERS.labels("monitor").inc(self._workers)
+        for target in self.targets.values():
+            self._wheel.schedule(target, random.uniform(0, target.interval))
+        self._thread = threading.Thread(target=self._loop, name="monitor-wheel", daemon=True)
+        self._thread.start()
+        logger.info(f"📡 Monitorando {len(self.targets)} alvo(s) ({self.kind})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            POOL_WORKERS.labels("monitor").dec(self._workers)
+
+    def _loop(self):
+        # Ticks com horário absoluto: um tick atrasado é compensado nos seguintes
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            next_tick += self._wheel.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            for target in self._wheel.advance():
+                if target.running:
+                    # Teste anterior ainda em andamento: tenta de novo no próximo intervalo
+                    self._wheel.schedule(target, self._delay(target.interval))
+                    continue
+                target.running = True
+                POOL_QUEUED.labels("monitor").inc()
+                self._executor.submit(self._probe, target)
+
+    def _probe(self, target: MonitorTarget):
+        started = time.monotonic()
+        mark_batch_thread()
+        POOL_QUEUED.labels("monitor").dec()
+        POOL_ACTIVE.labels("monitor").inc()
+        try:
+            try:
+                row = _probe_row(self.kind, target.host, target.port, self.timeouts.for_target(target.host))
+            except Exception as e:
+                logger.error("❌ Erro ao testar %s - %s", target.key, e,
+                             extra=probe_extra(self.kind, target.host, target.port, "error"))
+                row = {"host": target.host, "port": target.port, "status": "error"}
+            self.timeouts.observe(row)
+            target.history.append(time.time(), row["status"], row.get("total_ms"))
+            observe_row(self.kind, target.group, row)
+            if self.on_result:
+                self.on_result(target, row)
+            target.last_status = row["status"]
+        finally:
+            POOL_ACTIVE.labels("monitor").dec()
+            target.running = False
+            if not self._stop.is_set():
+                # O próximo disparo conta a partir do início deste teste
+                self._wheel.schedule(target, self._delay(target.interval) - (time.monotonic() - started))
+
+    def target_stats(self, target: MonitorTarget, window: Optional[float] = None) -> dict:
+        since = time.time() - window if window else 0.0
+        return {
+            "host": target.host,
+            "port": target.port,
+            "interval": target.interval,
+            "last_status": target.last_status,
+            **target.history.stats(since),
+        }
+
+    def status(self, window: Optional[float] = None) -> List[dict]:
+        return [self.target_stats(target, window) for target in self.targets.values()]
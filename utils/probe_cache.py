@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ProbeCache:
+    """
+    Cache de resultados de teste com coalescência de requisições.
+
+    - Requisições idênticas simultâneas (mesma chave) compartilham um único teste em
+      andamento, mesmo com o cache desligado (ttl=0).
+    - Com ttl > 0, o resultado fica guardado por `ttl` segundos, limitado a
+      `max_size` entradas com descarte LRU.
+    - `max_age` (vindo do Cache-Control do cliente) restringe a idade aceitável de
+      uma entrada; max_age=0 (no-cache) força um teste novo.
+    """
+
+    def __init__(self, ttl: float = 0, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # chave -> (criado_em, valor)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_run(self, key: Hashable, fn: Callable, max_age: Optional[float] = None) -> Tuple[object, str, float]:
+        """Retorna (valor, "HIT" | "MISS" | "COALESCED", idade em segundos)."""
+        now = time.monotonic()
+        limit = self.ttl if max_age is None else min(self.ttl, max_age)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl and age <= limit:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], "HIT", age
+                if age >= self.ttl:
+                    del self._entries[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "COALESCED", 0.0
+
+        try:
+            flight.value = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if flight.error is None and self.ttl > 0:
+                    self._entries[key] = (time.monotonic(), flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+            flight.event.set()
+        return flight.value, "MISS", 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)")
+
+
+def requested_max_age(cache_control: Optional[str]) -> Optional[float]:
+    """Interpreta o Cache-Control da requisição: no-cache/no-store => 0; max-age=N => N."""
+    if not cache_control:
+        return None
+    value = cache_control.lower()
+    if "no-cache" in value or "no-store" in value:
+        return 0
+    match = _MAX_AGE.search(value)
+    return float(match.group(1)) if match else None
+
+
+# Desligado por padrão; PROBE_CACHE_TTL (segundos) liga o cache para a API
+probe_cache = ProbeCache(
+    ttl=float(os.environ.get("PROBE_CACHE_TTL", "0")),
+    max_size=int(os.environ.get("PROBE_CACHE_SIZE", "1024")),
+)
@@ -0,0 +1,182 @@
+import functools
+import ipaddress
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+
+
+@functools.lru_cache(maxsize=65536)
+def destination_subnet(host: str) -> str:
+    """Sub-rede do alvo (/24 para IPv4, /64 para IPv6); nomes são a própria chave."""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    return str(ipaddress.ip_network(f"{ip}/{24 if ip.version == 4 else 64}", strict=False))
+
+
+class TokenBucket:
+    """
+    Balde de fichas compartilhado entre threads: `rate` testes por segundo, com
+    rajadas de até `burst`. reserve() nunca bloqueia; devolve quanto esperar
+    antes de usar a ficha reservada (a dívida fica no saldo negativo).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate) - 1
+            self._last = now
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def wait(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        import asyncio
+
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class DestinationScheduler:
+    """
+    Entrega os alvos em rodízio entre hosts, respeitando o máximo de testes em
+    andamento por host e por sub-rede. Lê no máximo `lookahead` alvos à frente;
+    um host no limite não segura a fila: o rodízio passa para o próximo.
+
+    next() devolve o próximo alvo liberado ou None se, no momento, todos os
+    hosts lidos estão no limite; release() deve ser chamado quando o teste acaba.
+    """
+
+    def __init__(self, targets: Iterable[tuple], per_host: Optional[int] = None, per_subnet: Optional[int] = None,
+                 lookahead: int = 4096):
+        self.per_host = per_host
+        self.per_subnet = per_subnet
+        self.lookahead = lookahead
+        self._targets = iter(targets)
+        self._exhausted = False
+        self._queues = OrderedDict()  # host -> alvos ainda não entregues, na ordem do rodízio
+        self._buffered = 0
+        self._host_active = {}
+        self._subnet_active = {}
+
+    def _fill(self):
+        while not self._exhausted and self._buffered < self.lookahead:
+            try:
+                target = next(self._targets)
+            except StopIteration:
+                self._exhausted = True
+                return
+            queue = self._queues.get(target[0])
+            if queue is None:
+                queue = self._queues[target[0]] = deque()
+            queue.append(target)
+            self._buffered += 1
+
+    def _blocked(self, host: str) -> bool:
+        if self.per_host is not None and self._host_active.get(host, 0) >= self.per_host:
+            return True
+        return self.per_subnet is not None and \
+            self._subnet_active.get(destination_subnet(host), 0) >= self.per_subnet
+
+    def next(self) -> Optional[tuple]:
+        self._fill()
+        for _ in range(len(self._queues)):
+            host, queue = next(iter(self._queues.items()))
+            self._queues.move_to_end(host)
+            if self._blocked(host):
+                continue
+            target = queue.popleft()
+            if not queue:
+                del self._queues[host]
+            self._buffered -= 1
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+            subnet = destination_subnet(host)
+            self._subnet_active[subnet] = self._subnet_active.get(subnet, 0) + 1
+            return target
+        return None
+
+    def take(self, count: int) -> list:
+        """Até `count` alvos liberados agora."""
+        taken = []
+        while len(taken) < count:
+            target = self.next()
+            if target is None:
+                break
+            taken.append(target)
+        return taken
+
+    def release(self, target: tuple):
+        host = target[0]
+        subnet = destination_subnet(host)
+        for active, key in ((self._host_active, host), (self._subnet_active, subnet)):
+            if active[key] <= 1:
+                del active[key]
+            else:
+                active[key] -= 1
+
+
+class BatchLimits:
+    """
+    Limites de um lote: `rate` testes por segundo no total (balde de fichas) e
+    testes simultâneos por host (`per_host`) e por sub-rede /24 ou /64
+    (`per_subnet`). Com limite por destino os alvos saem em rodízio entre hosts.
+    """
+
+    def __init__(self, rate: Optional[float] = None, per_host: Optional[int] = None,
+                 per_subnet: Optional[int] = None, burst: Optional[float] = None):
+        for name, value in (("rate", rate), ("per_host", per_host), ("per_subnet", per_subnet), ("burst", burst)):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} deve ser maior que zero")
+        self.rate = rate
+        self.per_host = per_host
+        self.per_subnet = per_subnet
+        self.burst = burst
+        self.bucket = TokenBucket(rate, burst) if rate else None
+
+    @classmethod
+    def from_options(cls, options: Optional[dict]) -> Optional["BatchLimits"]:
+        """Reconstrói os limites a partir de as_options() (ex.: em um processo de --processes)."""
+        return cls(**options) if options else None
+
+    def as_options(self, processes: int = 1) -> dict:
+        """
+        Limites de cada um de `processes` processos: a taxa é dividida entre eles;
+        os limites por destino valem inteiros porque cada sub-rede vai sempre para
+        o mesmo processo (ver ShardedBatch).
+        """
+        return {"rate": self.rate / processes if self.rate else None, "per_host": self.per_host,
+                "per_subnet": self.per_subnet,
+                "burst": max(1.0, self.burst / processes) if self.burst else None}
+
+    @property
+    def per_destination(self) -> bool:
+        return self.per_host is not None or self.per_subnet is not None
+
+    def schedule(self, targets: Iterable[tuple], lookahead: int = 4096) -> DestinationScheduler:
+        return DestinationScheduler(targets, self.per_host, self.per_subnet, lookahead)
+
+    def wait(self):
+        """Espera a vez do próximo teste na taxa global (sem taxa, volta na hora)."""
+        if self.bucket is not None:
+            self.bucket.wait()
+
+    async def wait_async(self):
+        if self.bucket is not None:
+            await self.bucket.wait_async()
+
+    def __bool__(self) -> bool:
+        return self.bucket is not None or self.per_destination
+
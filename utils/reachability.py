@@ -0,0 +1,180 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+from utils.logger import setup_logger
+from utils.ratelimit import destination_subnet
+
+logger = setup_logger()
+
+ALIVE, DOWN = -1, -2
+# Classes de erro que provam que o host respondeu (RST, handshake, HTTP...) e as que contam como silêncio
+ALIVE_ERRORS = frozenset(("refused", "reset", "tls", "certificate", "http"))
+SILENT_ERRORS = frozenset(("timeout", "unreachable"))
+
+
+class Reachability:
+    """
+    Poda de hosts inalcançáveis em um lote: depois de `after` timeouts seguidos em
+    um host, os alvos restantes dele saem como status=skipped sem conectar. Com
+    `subnet_fraction`, o mesmo vale para os hosts ainda sem veredito de uma /24
+    (/64) em que essa fração dos hosts já vistos (no mínimo `subnet_min_hosts`)
+    está fora. Com `precheck`, um ping (tests.icmp_ping: ICMP ou, sem permissão,
+    TCP) decide se o host está vivo antes do primeiro teste dele. Qualquer
+    sucesso ou RST marca o host como vivo de vez e volta a liberar os testes.
+
+    O estado é limitado a `max_hosts` hosts (descarte LRU) e seguro entre threads.
+    """
+
+    def __init__(self, after: Optional[int] = 3, subnet_fraction: Optional[float] = None, precheck: bool = False,
+                 precheck_timeout: float = 1.0, subnet_min_hosts: int = 8, max_hosts: int = 65536):
+        if after is not None and after < 1:
+            raise ValueError("after deve ser maior que zero")
+        if subnet_fraction is not None and not 0 < subnet_fraction <= 1:
+            raise ValueError("subnet_fraction deve estar entre 0 e 1")
+        self.after = after
+        self.subnet_fraction = subnet_fraction
+        self.precheck = precheck
+        self.precheck_timeout = precheck_timeout
+        self.subnet_min_hosts = subnet_min_hosts
+        self.max_hosts = max_hosts
+        self._hosts = OrderedDict()  # host -> timeouts seguidos (>= 0), ALIVE ou DOWN
+        self._subnets = {}  # sub-rede -> [hosts vivos, hosts fora]
+        self._prechecks = {}  # host -> Future do ping em andamento
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options: Optional[dict]) -> Optional["Reachability"]:
+        """Reconstrói a partir de as_options() (ex.: em um processo de --processes ou em um worker do cluster)."""
+        return cls(**options) if options else None
+
+    def as_options(self) -> dict:
+        return {"after": self.after, "subnet_fraction": self.subnet_fraction, "precheck": self.precheck,
+                "precheck_timeout": self.precheck_timeout, "subnet_min_hosts": self.subnet_min_hosts}
+
+    def _subnet(self, host: str) -> Optional[list]:
+        subnet = destination_subnet(host)
+        if subnet == host:
+            return None  # nome, não IP
+        counts = self._subnets.get(subnet)
+        if counts is None:
+            counts = self._subnets[subnet] = [0, 0]
+        return counts
+
+    def _set(self, host: str, state: int):
+        """Grava o estado do host, mantendo as contagens da sub-rede; chamar com o lock."""
+        previous = self._hosts.get(host, 0)
+        if previous in (ALIVE, DOWN) or state in (ALIVE, DOWN):
+            counts = self._subnet(host)
+            if counts is not None:
+                if previous in (ALIVE, DOWN):
+                    counts[previous == DOWN] -= 1
+                if state in (ALIVE, DOWN):
+                    counts[state == DOWN] += 1
+        self._hosts[host] = state
+        self._hosts.move_to_end(host)
+        if len(self._hosts) > self.max_hosts:
+            evicted, evicted_state = self._hosts.popitem(last=False)
+            if evicted_state in (ALIVE, DOWN):
+                counts = self._subnet(evicted)
+                if counts is not None:
+                    counts[evicted_state == DOWN] -= 1
+
+    def _subnet_down(self, host: str) -> bool:
+        if self.subnet_fraction is None:
+            return False
+        counts = self._subnets.get(destination_subnet(host))
+        if counts is None:
+            return False
+        seen = counts[0] + counts[1]
+        return seen >= self.subnet_min_hosts and counts[1] >= self.subnet_fraction * seen
+
+    def reason(self, host: str) -> Optional[str]:
+        """Por que os testes do host estão podados (host_unreachable ou subnet_unreachable); None se não estão."""
+        with self._lock:
+            state = self._hosts.get(host, 0)
+            if state == DOWN:
+                return "host_unreachable"
+            if state != ALIVE and self._subnet_down(host):
+                return "subnet_unreachable"
+        return None
+
+    def _start_precheck(self, host: str) -> Optional[Future]:
+        """Future do ping de checagem do host, iniciando-o se ninguém iniciou; None se não precisa."""
+        if not self.precheck:
+            return None
+        with self._lock:
+            if host in self._prechecks:
+                return self._prechecks[host]
+            if self._hosts.get(host, 0) in (ALIVE, DOWN) or self._subnet_down(host):
+                return None
+            done = self._prechecks[host] = Future()
+        from tests.icmp_ping import pinger
+
+        try:
+            ping = pinger().submit(host, count=1, interval=0.0, timeout=self.precheck_timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Checagem de {host} indisponível: {e}")
+            self._finish_precheck(host, done, None)
+            return done
+        ping.add_done_callback(lambda future: self._finish_precheck(host, done, future))
+        return done
+
+    def _finish_precheck(self, host: str, done: Future, ping: Optional[Future]):
+        result = ping.result() if ping is not None and ping.exception() is None else None
+        with self._lock:
+            state = self._hosts.get(host, 0)
+            if result:
+                self._set(host, ALIVE)
+            elif result is not None and result.error in SILENT_ERRORS and state != ALIVE:
+                # Sem resposta ao ping; falha de DNS ou sem permissão para ICMP não contam
+                self._set(host, DOWN)
+                logger.info(f"🚫 {host} não respondeu à checagem; os testes dele serão pulados")
+            self._prechecks.pop(host, None)
+        done.set_result(None)
+
+    def check(self, host: str) -> Optional[str]:
+        """Antes de testar um alvo: roda (ou espera) a checagem do host e devolve o motivo para pular, se houver."""
+        precheck = self._start_precheck(host)
+        if precheck is not None:
+            precheck.result()
+        return self.reason(host)
+
+    async def check_async(self, host: str) -> Optional[str]:
+        import asyncio
+
+        precheck = self._start_precheck(host)
+        if precheck is not None:
+            await asyncio.wrap_future(precheck)
+        return self.reason(host)
+
+    def observe(self, row: dict):
+        """Atualiza o host a partir de uma linha de resultado (sucesso/RST: vivo; timeout: mais um seguido)."""
+        error = row.get("error")
+        if row["status"] == "success" or error in ALIVE_ERRORS:
+            state = ALIVE
+        elif error in SILENT_ERRORS:
+            state = None
+        else:
+            return
+        host = row["host"]
+        with self._lock:
+            previous = self._hosts.get(host, 0)
+            if state == ALIVE:
+                if previous != ALIVE:
+                    if previous == DOWN:
+                        logger.info(f"🔁 {host} respondeu; voltando a testá-lo")
+                    self._set(host, ALIVE)
+                return
+            if previous < 0 or self.after is None:
+                return  # já tem veredito, ou a poda por timeouts está desligada
+            if previous + 1 >= self.after:
+                self._set(host, DOWN)
+                logger.info(f"🚫 {host} sem resposta após {previous + 1} timeout(s) seguidos; "
+                            f"os testes restantes dele serão pulados")
+            else:
+                self._set(host, previous + 1)
+
+
+def skipped_row(host: str, port: int, reason: str) -> dict:
+    return {"host": host, "port": port, "status": "skipped", "error": reason}
@@ -0,0 +1,227 @@
+import csv
+import io
+import json
+import socket
+from array import array
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+from utils.batch import ROW_FIELDS, BatchSummary
+
+# Colunas de tamanho fixo; o resto de cada linha (certificado, banner, http_code,
+# previous_status...) fica em um dict esparso só para as linhas que o têm
+TIMING_FIELDS = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms")
+STRING_FIELDS = ("ip", "error", "dns_cache")
+CSV_FIELDS = ("host", "port", "status") + ROW_FIELDS
+_COLUMNS = frozenset(("host", "port", "status") + TIMING_FIELDS + STRING_FIELDS)
+_NAN = float("nan")
+# Referências com este bit são um IPv4 embutido no próprio número, sem passar pela tabela de strings
+_IPV4 = 1 << 32
+# Linhas por bloco na serialização (menos chamadas de write/yield)
+CHUNK_ROWS = 1000
+
+
+class ResultTable:
+    """
+    Resultados de um lote em colunas: hosts e IPs IPv4 viram inteiros, nomes e
+    classes de erro são internados em uma tabela de strings, porta e status são
+    inteiros pequenos e os tempos ficam em arrays de double (NaN = ausente).
+    Cerca de 70 bytes por linha de socket, contra centenas de um dict por alvo; em
+    troca, montar e ler as linhas custa uns 2x o tempo de uma lista de dicts.
+
+    append() atualiza também `summary` (contagens e histograma de latência), então
+    o resumo sai sem percorrer as linhas de novo. Linhas são lidas como dicts,
+    iguais às originais, por índice, fatia ou iteração. Um leitor em outra thread
+    pode ler até len() sem lock: o status é a última coluna gravada.
+
+    Linhas sem host/porta (as do curl, identificadas pela `url`) ficam com host 0
+    e porta 0; a URL vai para o dict esparso (vazia se a linha não tiver uma).
+    """
+
+    def __init__(self, rows: Optional[Iterable[dict]] = None):
+        self._strings = [None]
+        self._string_index = {None: 0}
+        self._statuses = []
+        self._status_index = {}
+        self._host = array("Q")
+        self._port = array("H")
+        self._status = array("B")
+        self._timings = {field: array("d") for field in TIMING_FIELDS}
+        self._refs = {field: array("Q" if field == "ip" else "I") for field in STRING_FIELDS}
+        self._extra = {}
+        self._extra_keys = {}  # campos fora das colunas, na ordem em que apareceram (cabeçalho do CSV)
+        # Colunas na ordem de ROW_FIELDS, para remontar as linhas na ordem original
+        self._plan = tuple((field, self._timings[field], True) if field in self._timings
+                           else (field, self._refs[field], False)
+                           for field in ROW_FIELDS if field in _COLUMNS)
+        self.summary = BatchSummary()
+        if rows is not None:
+            self.extend(rows)
+
+    def _intern(self, value) -> int:
+        index = self._string_index.get(value)
+        if index is None:
+            index = self._string_index[value] = len(self._strings)
+            self._strings.append(value)
+        return index
+
+    def _address(self, value) -> int:
+        """Host ou IP: IPv4 na forma canônica vai como número; o resto, pela tabela de strings."""
+        index = self._string_index.get(value)
+        if index is not None:
+            return index
+        try:
+            packed = socket.inet_aton(value)
+        except (OSError, TypeError):
+            return self._intern(value)
+        if socket.inet_ntoa(packed) != value:  # "10.1", "010.0.0.1"... ficam como texto
+            return self._intern(value)
+        return _IPV4 | int.from_bytes(packed, "big")
+
+    def _string(self, ref: int):
+        if ref & _IPV4:
+            return socket.inet_ntoa((ref & 0xFFFFFFFF).to_bytes(4, "big"))
+        return self._strings[ref]
+
+    def append(self, row: dict):
+        self.summary.add(row)
+        status = self._status_index.get(row["status"])
+        if status is None:
+            status = self._status_index[row["status"]] = len(self._statuses)
+            self._statuses.append(row["status"])
+        host = row.get("host")
+        self._host.append(self._address(host))  # None -> 0: linha de URL
+        self._port.append(row.get("port") or 0)
+        present = 1 if host is None else 3
+        for field, column, timing in self._plan:
+            value = row.get(field)
+            if value is not None:
+                present += 1
+            if timing:
+                column.append(_NAN if value is None else value)
+            elif field == "ip":
+                column.append(self._address(value))
+            else:
+                column.append(self._intern(value))
+        if len(row) > present:
+            extra = {key: value for key, value in row.items() if key not in _COLUMNS}
+            if extra:
+                self._extra[len(self._status)] = extra
+                for key in extra:
+                    self._extra_keys.setdefault(key, None)
+        self._status.append(status)
+
+    def extend(self, rows: Iterable[dict]):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self) -> int:
+        return len(self._status)
+
+    def _row(self, i: int) -> dict:
+        string = self._string
+        status = self._statuses[self._status[i]]
+        extra = self._extra.get(i)
+        if self._host[i]:
+            row = {"host": string(self._host[i]), "port": self._port[i], "status": status}
+        else:
+            row = {"url": extra.get("url", "") if extra else "", "status": status}
+        if extra is None:
+            for field, column, timing in self._plan:
+                value = column[i]
+                if timing:
+                    if value == value:  # NaN = ausente
+                        row[field] = value
+                elif value:
+                    row[field] = string(value)
+            return row
+        for field in ROW_FIELDS:
+            column = self._timings.get(field)
+            if column is not None:
+                value = column[i]
+                if value == value:
+                    row[field] = value
+                continue
+            column = self._refs.get(field)
+            if column is not None:
+                if column[i]:
+                    row[field] = string(column[i])
+            elif field in extra:
+                row[field] = extra[field]
+        for key, value in extra.items():
+            row.setdefault(key, value)
+        return row
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict, List[dict]]:
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("índice fora da tabela")
+        return self._row(index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def sort(self, key: Callable[[dict], object]):
+        """Reordena as linhas por key(linha); só as chaves ficam em memória durante a ordenação."""
+        order = sorted(range(len(self)), key=lambda i: key(self._row(i)))
+        self._host = array("Q", (self._host[i] for i in order))
+        self._port = array("H", (self._port[i] for i in order))
+        self._status = array("B", (self._status[i] for i in order))
+        for columns in (self._timings, self._refs):
+            for column in columns.values():
+                # No lugar: self._plan guarda referências para estes mesmos arrays
+                column[:] = array(column.typecode, (column[i] for i in order))
+        position = {old: new for new, old in enumerate(order) if old in self._extra}
+        self._extra = {position[old]: extra for old, extra in self._extra.items()}
+        return self
+
+    def _chunks(self) -> Iterator[List[dict]]:
+        for start in range(0, len(self), CHUNK_ROWS):
+            yield self[start:start + CHUNK_ROWS]
+
+    def iter_ndjson(self) -> Iterator[str]:
+        """Blocos de linhas NDJSON."""
+        for chunk in self._chunks():
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk)
+
+    def iter_json(self, **fields) -> Iterator[str]:
+        """{"results": [...], **fields} em blocos, sem montar o documento inteiro."""
+        yield '{"results": ['
+        first = True
+        for chunk in self._chunks():
+            # Um json.dumps por bloco (sem os colchetes) sai bem mais barato que um por linha
+            body = json.dumps(chunk, ensure_ascii=False)[1:-1]
+            yield body if first else ", " + body
+            first = False
+        yield "]"
+        for name, value in fields.items():
+            yield f", {json.dumps(name)}: {json.dumps(value, ensure_ascii=False)}"
+        yield "}\n"
+
+    def iter_csv(self, fields: Iterable[str] = CSV_FIELDS) -> Iterator[str]:
+        """CSV com as colunas de `fields` mais os campos extras que apareceram; listas viram "a b c"."""
+        fields = tuple(fields)
+        header = list(fields) + [key for key in self._extra_keys if key not in fields]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for chunk in self._chunks():
+            writer.writerows([csv_value(row.get(field)) for field in header] for row in chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def as_dict(self) -> dict:
+        return {"results": list(self), "summary": self.summary.as_dict()}
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return value
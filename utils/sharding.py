@@ -0,0 +1,196 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, Tuple
+from utils.batch import BatchSummary, iter_netcat_batch, iter_socket_batch, iter_ssl_batch, pack_row, unpack_row
+from utils.logger import setup_logger
+from utils.ratelimit import BatchLimits, destination_subnet
+from utils.reachability import Reachability
+
+logger = setup_logger()
+
+# Tamanho dos blocos de alvos enviados aos processos e de resultados devolvidos
+CHUNK_SIZE = 256
+# Intervalo máximo (s) que um processo segura resultados antes de enviá-los
+FLUSH_INTERVAL = 0.2
+PROGRESS_INTERVAL = 5.0
+
+
+def _chunks_from(in_queue) -> Iterator[Tuple[str, int]]:
+    for chunk in iter(in_queue.get, None):
+        yield from chunk
+
+
+def run_probes(kind: str, options: dict, targets) -> Iterator[dict]:
+    """
+    Roda um lote com o motor de `kind` (socket, ssl ou netcat) e as opções de
+    ShardedBatch; é o que cada processo de --processes e cada worker do cluster executa.
+    """
+    timeouts = {"adaptive": options.get("adaptive", False), "deadline_at": options.get("deadline_at"),
+                "limits": BatchLimits.from_options(options.get("limits")),
+                "reachability": Reachability.from_options(options.get("prune"))}
+    if kind == "ssl":
+        return iter_ssl_batch(targets, options["timeout"], options["workers"], **timeouts)
+    if kind == "netcat":
+        return iter_netcat_batch(targets, options["timeout"], options["workers"], options.get("udp", False),
+                                 options.get("banner", False), options.get("banner_bytes", 1024), **timeouts)
+    return iter_socket_batch(targets, options["timeout"], options["workers"],
+                             options.get("engine", "thread"), options.get("concurrency", 1000), **timeouts)
+
+
+def _shard_worker(kind: str, options: dict, in_queue, out_queue, send_rows: bool):
+    """
+    Processo de trabalho: consome blocos de alvos da fila compartilhada, roda o
+    próprio motor de testes (threads ou event loop) e devolve resultados em blocos
+    de tuplas. Sem `send_rows`, devolve só o progresso e o resumo ao final.
+    """
+    summary = BatchSummary()
+    pending = []
+    last_flush = time.monotonic()
+    reported = 0
+    try:
+        for row in run_probes(kind, options, _chunks_from(in_queue)):
+            summary.add(row)
+            if send_rows:
+                pending.append(pack_row(row))
+            now = time.monotonic()
+            if (send_rows and len(pending) >= CHUNK_SIZE) or now - last_flush >= FLUSH_INTERVAL:
+                if send_rows:
+                    out_queue.put(("rows", pending))
+                    pending = []
+                else:
+                    out_queue.put(("progress", summary.total - reported))
+                    reported = summary.total
+                last_flush = now
+        if pending:
+            out_queue.put(("rows", pending))
+        out_queue.put(("done", summary))
+    except BaseException as e:
+        out_queue.put(("failed", repr(e)))
+        raise
+
+
+class ShardedBatch:
+    """
+    Distribui o fluxo de alvos entre N processos, cada um com seu próprio motor de
+    testes, e junta os resultados na ordem em que terminam.
+
+    Os alvos vão em blocos por uma fila compartilhada (quem termina antes pega o
+    próximo bloco). Com limite por host/sub-rede em options["limits"] ou com a
+    poda de inalcançáveis (options["prune"]), cada sub-rede vai sempre para o
+    mesmo processo (uma fila por processo), para que o limite valha para o lote
+    inteiro e um host ou sub-rede fora do ar seja descoberto uma vez só, e não
+    uma vez por processo. Quando `emit_rows` é falso, nenhuma linha atravessa processos:
+    cada processo envia apenas contadores de progresso e, no fim, seu BatchSummary,
+    que é somado em `self.summary`.
+    """
+
+    def __init__(self, kind: str, processes: int, options: dict, emit_rows: bool = True):
+        if kind not in ("socket", "ssl", "netcat"):
+            raise ValueError(f"tipo de teste não suportado: {kind}")
+        self.kind = kind
+        self.processes = max(processes, 1)
+        self.options = options
+        self.emit_rows = emit_rows
+        self.summary = BatchSummary()
+        self.completed = 0
+
+    @property
+    def _by_subnet(self) -> bool:
+        limits = self.options.get("limits") or {}
+        return limits.get("per_host") is not None or limits.get("per_subnet") is not None or \
+            bool(self.options.get("prune"))
+
+    def _put(self, in_queue, chunk, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                in_queue.put(chunk, timeout=0.2)
+                return
+            except queue.Full:
+                pass
+
+    def _feed(self, targets, in_queues, stop: threading.Event):
+        targets = iter(targets)
+        try:
+            if len(in_queues) == 1:
+                while not stop.is_set():
+                    chunk = list(itertools.islice(targets, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    self._put(in_queues[0], chunk, stop)
+                return
+            chunks = [[] for _ in in_queues]
+            for target in targets:
+                if stop.is_set():
+                    return
+                index = hash(destination_subnet(target[0])) % len(in_queues)
+                chunks[index].append(target)
+                if len(chunks[index]) >= CHUNK_SIZE:
+                    self._put(in_queues[index], chunks[index], stop)
+                    chunks[index] = []
+            for in_queue, chunk in zip(in_queues, chunks):
+                if chunk:
+                    self._put(in_queue, chunk, stop)
+        finally:
+            for i in range(self.processes):
+                in_queues[i % len(in_queues)].put(None)
+
+    def run(self, targets: Iterable[Tuple[str, int]]) -> Iterator[dict]:
+        ctx = multiprocessing.get_context("spawn")
+        if self._by_subnet:
+            in_queues = [ctx.Queue(maxsize=4) for _ in range(self.processes)]
+        else:
+            in_queues = [ctx.Queue(maxsize=self.processes * 4)]
+        out_queue = ctx.Queue()
+        workers = [
+            ctx.Process(target=_shard_worker, name=f"{self.kind}-shard-{i}",
+                        args=(self.kind, self.options, in_queues[i % len(in_queues)], out_queue, self.emit_rows),
+                        daemon=True)
+            for i in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        stop = threading.Event()
+        feeder = threading.Thread(target=self._feed, args=(targets, in_queues, stop), daemon=True)
+        feeder.start()
+
+        running = self.processes
+        last_progress = time.monotonic()
+        try:
+            while running:
+                try:
+                    kind, payload = out_queue.get(timeout=1)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("os processos de teste terminaram inesperadamente")
+                    continue
+                if kind == "rows":
+                    self.completed += len(payload)
+                    for packed in payload:
+                        row = unpack_row(packed)
+                        self.summary.add(row)
+                        yield row
+                elif kind == "progress":
+                    self.completed += payload
+                elif kind == "done":
+                    running -= 1
+                    if not self.emit_rows:
+                        self.summary.merge(payload)
+                        self.completed = self.summary.total
+                else:
+                    raise RuntimeError(f"falha em um processo de teste: {payload}")
+
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL:
+                    logger.info(f"📈 Progresso: {self.completed} alvos concluídos")
+                    last_progress = now
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join(timeout=1)
+                if worker.is_alive():
+                    worker.terminate()
+            feeder.join(timeout=1)
@@ -0,0 +1,228 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT,
+    started REAL NOT NULL,
+    finished REAL,
+    total INTEGER, success INTEGER, failure INTEGER, error INTEGER, skipped INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    time REAL NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    total_ms REAL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS results_target ON results (kind, host, port, time);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+-- Último estado de cada alvo: é o que decide quem é testado de novo e o diff
+CREATE TABLE IF NOT EXISTS targets (
+    kind TEXT NOT NULL,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    time REAL NOT NULL,
+    last_success REAL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (kind, host, port)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    run_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    time REAL NOT NULL,
+    before TEXT,
+    after TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_run ON changes (run_id);
+"""
+
+# Linhas gravadas por transação
+BATCH_SIZE = 500
+# Erros de alvos que não chegaram a ser testados (prazo do lote, worker do cluster fora)
+NOT_PROBED_ERRORS = frozenset(("deadline", "cluster_worker_failed"))
+
+
+def _probed(row: dict) -> bool:
+    """Se a linha é resultado de um teste de verdade (e não um alvo pulado ou sem tempo para testar)."""
+    return row["status"] != "skipped" and row.get("error") not in NOT_PROBED_ERRORS
+
+
+class RunReport:
+    """Contadores de uma execução gravada: testados, pulados e transições de estado."""
+
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.skipped = 0
+        self.new = 0
+        self.down = 0  # sucesso -> falha/erro
+        self.up = 0  # falha/erro -> sucesso
+        self.changed = 0  # qualquer mudança de status, inclusive alvos novos
+
+    def as_dict(self) -> dict:
+        return {"run_id": self.run_id, "skipped": self.skipped, "new": self.new, "down": self.down,
+                "up": self.up, "changed": self.changed}
+
+
+class ResultStore:
+    """
+    Resultados dos lotes em SQLite, indexados por alvo e horário.
+
+    Cada linha vai para `results` (histórico completo, com a linha em JSON) e
+    atualiza `targets` (último estado do alvo). Mudanças de status entre
+    execuções ficam em `changes`. A conexão é compartilhada entre threads com um
+    lock; as gravações saem em transações de BATCH_SIZE linhas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._results = []
+        self._targets = []
+        self._changes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def start_run(self, kind: str, source: Optional[str] = None) -> RunReport:
+        with self._lock, self._db:
+            cursor = self._db.execute("INSERT INTO runs (kind, source, started) VALUES (?, ?, ?)",
+                                      (kind, source, time.time()))
+        return RunReport(cursor.lastrowid)
+
+    def finish_run(self, report: RunReport, summary):
+        self.flush()
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE runs SET finished = ?, total = ?, success = ?, failure = ?, error = ?, skipped = ? "
+                "WHERE id = ?",
+                (time.time(), summary.total, summary.success, summary.failure, summary.error, report.skipped,
+                 report.run_id))
+
+    def last_state(self, kind: str, host: str, port: int) -> Optional[Tuple[str, float, Optional[float]]]:
+        """(status, horário, horário do último sucesso) do alvo, ou None se nunca foi testado."""
+        with self._lock:
+            return self._db.execute("SELECT status, time, last_success FROM targets "
+                                    "WHERE kind = ? AND host = ? AND port = ?", (kind, host, port)).fetchone()
+
+    def pending_targets(self, kind: str, targets: Iterable[Tuple[str, int]], report: RunReport,
+                        stale_after: Optional[float] = None) -> Iterator[Tuple[str, int]]:
+        """
+        Filtra os alvos sob demanda: passam os que nunca foram testados, os que
+        falharam na última vez e, com `stale_after` (segundos), os de sucesso mais
+        antigo que isso. Os demais contam em report.skipped.
+        """
+        for host, port in targets:
+            state = self.last_state(kind, host, port)
+            if state is not None and state[0] == "success" and (
+                    stale_after is None or time.time() - state[1] < stale_after):
+                report.skipped += 1
+                continue
+            yield host, port
+
+    def track(self, kind: str, rows: Iterable[dict], report: RunReport) -> Iterator[dict]:
+        """
+        Grava cada linha e a devolve; quando o status mudou desde a execução
+        anterior (ou o alvo é novo), a linha ganha `previous_status`. Linhas de
+        alvos não testados (podados, prazo esgotado) entram só no histórico: o
+        último estado do alvo e as transições não mudam.
+        """
+        for row in rows:
+            now = time.time()
+            host, port, status = row["host"], row["port"], row["status"]
+            self._results.append((report.run_id, kind, host, port, now, status, row.get("error"),
+                                  row.get("total_ms"), json.dumps(row, ensure_ascii=False)))
+            if _probed(row):
+                state = self.last_state(kind, host, port)
+                before = state[0] if state else None
+                last_success = now if status == "success" else (state[2] if state else None)
+                self._targets.append((kind, host, port, status, now, last_success, report.run_id))
+                if before != status:
+                    report.changed += 1
+                    if before is None:
+                        report.new += 1
+                    elif status == "success":
+                        report.up += 1
+                    elif before == "success":
+                        report.down += 1
+                    self._changes.append((report.run_id, kind, host, port, now, before, status))
+                    row = {**row, "previous_status": before}
+            if len(self._results) >= BATCH_SIZE:
+                self.flush()
+            yield row
+
+    def flush(self):
+        with self._lock:
+            if not self._results:
+                return
+            with self._db:
+                self._db.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._results)
+                self._db.executemany("INSERT OR REPLACE INTO targets VALUES (?, ?, ?, ?, ?, ?, ?)", self._targets)
+                self._db.executemany("INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)", self._changes)
+            self._results, self._targets, self._changes = [], [], []
+
+    def last_run(self, kind: Optional[str] = None) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT MAX(id) FROM runs" + (" WHERE kind = ?" if kind else ""),
+                                   (kind,) if kind else ()).fetchone()
+        return row[0] if row else None
+
+    def changes(self, run_id: int, limit: Optional[int] = None) -> List[dict]:
+        """Transições de status de uma execução (before None = alvo novo)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, host, port, time, before, after FROM changes WHERE run_id = ? ORDER BY time"
+                + (" LIMIT ?" if limit else ""), (run_id, limit) if limit else (run_id,)).fetchall()
+        return [dict(zip(("kind", "host", "port", "time", "before", "after"), row)) for row in rows]
+
+    def history(self, host: Optional[str] = None, port: Optional[int] = None, kind: Optional[str] = None,
+                since: Optional[float] = None, limit: int = 50) -> List[dict]:
+        """Resultados mais recentes primeiro, filtrados pelo índice (kind, host, port, time)."""
+        clauses, params = [], []
+        for column, value in (("kind", kind), ("host", host), ("port", port)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("time >= ?")
+            params.append(since)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(f"SELECT run_id, kind, time, data FROM results{where} ORDER BY time DESC LIMIT ?",
+                                    (*params, limit)).fetchall()
+        return [{"run_id": run_id, "kind": kind, "time": ts, **json.loads(data)} for run_id, kind, ts, data in rows]
+
+    def runs(self, limit: int = 20) -> List[dict]:
+        columns = ("id", "kind", "source", "started", "finished", "total", "success", "failure", "error", "skipped")
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(columns)} FROM runs ORDER BY id DESC LIMIT ?",
+                                    (limit,)).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
@@ -0,0 +1,421 @@
+"""
+Especificação de alvos dos lotes, uma por linha:
+
+    host:porta                    google.com:443
+    host,porta                    google.com,443 (CSV, duas colunas; "22,80" entre aspas)
+    host portas                   10.0.0.1 22,80
+    [ipv6]:portas                 [2001:db8::1]:443
+    CIDR                          10.0.0.0/22:22,80,8000-8100
+    faixa de IPs                  10.0.0.1-10.0.0.50:443 ou 10.0.0.1-50:443
+    # comentário                  (também no fim da linha)
+
+As portas seguem o estilo do nmap: lista e faixas (22,80,8000-8100, -1024, 60000-).
+O delimitador é detectado em cada linha. A expansão é preguiçosa: um /16 x 100
+portas nunca é materializado; os alvos saem agrupados por host (todas as portas de
+um host em seguida) e repetidos entre linhas são descartados por um IntervalSet.
+"""
+import bisect
+import csv
+import ipaddress
+import itertools
+import os
+import socket
+from array import array
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Linhas que expandem para mais hosts que isso são recusadas (um /8 de IPv4)
+MAX_HOSTS_PER_LINE = int(os.environ.get("TARGETS_MAX_HOSTS_PER_LINE", str(2 ** 24)))
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+class IntervalSet:
+    """
+    Conjunto de inteiros guardado como intervalos fechados [início, fim].
+
+    Faixas e pontos isolados ficam em "runs" ordenados de tamanhos decrescentes
+    (como uma LSM-tree): inserir custa O(log n) amortizado e consultar O(log² n).
+    Pontos isolados (linhas host:porta) são acumulados em lotes e guardados só
+    como array ordenado, cujas fusões o sorted() faz em C. Inserções de faixas em
+    ordem crescente só estendem o último intervalo. Com `typecode` os valores ficam
+    em array (ex.: "Q", 8 bytes cada) em vez de lista.
+    """
+
+    PENDING = 1024
+
+    def __init__(self, typecode: Optional[str] = None):
+        self.typecode = typecode
+        self._runs = []  # [(inícios, fins)], do maior para o menor
+        self._points = []  # runs ordenados de pontos isolados, do maior para o menor
+        self._pending = set()
+
+    def _new(self, values=()):
+        return array(self.typecode, values) if self.typecode else list(values)
+
+    def add(self, lo: int, hi: int):
+        if lo == hi:
+            self._pending.add(lo)
+            if len(self._pending) >= self.PENDING:
+                self._flush_points()
+            return
+        if self._runs:
+            starts, ends = self._runs[-1]
+            if lo >= starts[-1]:
+                if lo <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], hi)
+                else:
+                    starts.append(lo)
+                    ends.append(hi)
+                    self._rebalance()
+                return
+        self._runs.append((self._new([lo]), self._new([hi])))
+        self._rebalance()
+
+    def _flush_points(self):
+        self._points.append(self._new(sorted(self._pending)))
+        self._pending = set()
+        while len(self._points) > 1 and len(self._points[-2]) <= len(self._points[-1]):
+            newer, older = self._points.pop(), self._points.pop()
+            self._points.append(self._new(sorted(itertools.chain(older, newer))))
+
+    def _rebalance(self):
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= len(self._runs[-1][0]):
+            self._runs.append(self._merge(self._runs.pop(), self._runs.pop()))
+
+    def _merge(self, a, b):
+        pairs = sorted(zip(list(a[0]) + list(b[0]), list(a[1]) + list(b[1])))
+        starts, ends = self._new(), self._new()
+        for lo, hi in pairs:
+            if starts and lo <= ends[-1] + 1:
+                if hi > ends[-1]:
+                    ends[-1] = hi
+            else:
+                starts.append(lo)
+                ends.append(hi)
+        return starts, ends
+
+    def __contains__(self, value: int) -> bool:
+        if value in self._pending:
+            return True
+        for points in self._points:
+            i = bisect.bisect_left(points, value)
+            if i < len(points) and points[i] == value:
+                return True
+        for starts, ends in self._runs:
+            i = bisect.bisect_right(starts, value) - 1
+            if i >= 0 and ends[i] >= value:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        """Número de faixas e pontos guardados."""
+        return (len(self._pending) + sum(len(points) for points in self._points)
+                + sum(len(starts) for starts, _ in self._runs))
+
+
+class TargetSpec:
+    """Uma linha já interpretada: hosts (nome, faixa de IPs) e intervalos de portas."""
+
+    __slots__ = ("name", "first", "last", "ports")
+
+    def __init__(self, ports: List[Tuple[int, int]], name: Optional[str] = None,
+                 first: Optional[Address] = None, last: Optional[Address] = None):
+        self.name = name
+        self.first = first
+        self.last = last
+        self.ports = ports
+
+    @property
+    def host_count(self) -> int:
+        return 1 if self.name is not None else int(self.last) - int(self.first) + 1
+
+    def __len__(self) -> int:
+        return self.host_count * sum(hi - lo + 1 for lo, hi in self.ports)
+
+    def hosts(self) -> Iterator[str]:
+        if self.name is not None:
+            yield self.name
+            return
+        cls = type(self.first)
+        for value in range(int(self.first), int(self.last) + 1):
+            yield str(cls(value))
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        for host in self.hosts():
+            for lo, hi in self.ports:
+                for port in range(lo, hi + 1):
+                    yield host, port
+
+
+def _port(text: str, default: int) -> int:
+    text = text.strip()
+    if not text:
+        return default
+    if not text.isdigit():
+        raise ValueError(f"porta inválida: {text}")
+    return int(text)
+
+
+def parse_ports(spec: str) -> List[Tuple[int, int]]:
+    """"22,80,8000-8100" -> [(22, 22), (80, 80), (8000, 8100)], ordenado e sem sobreposição."""
+    if spec.isdigit() and 1 <= int(spec) <= 65535:
+        return [(int(spec), int(spec))]  # porta única, o caso mais comum
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, _, hi = part.partition("-")
+            lo, hi = _port(lo, 1), _port(hi, 65535)
+        else:
+            lo = hi = _port(part, 0)
+        if not 1 <= lo <= hi <= 65535:
+            raise ValueError(f"porta fora de 1-65535: {part}")
+        ranges.append((lo, hi))
+    if not ranges:
+        raise ValueError("nenhuma porta")
+    ranges.sort()
+    merged = [ranges[0]]
+    for lo, hi in ranges[1:]:
+        if lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _ip_address(text: str) -> Address:
+    """Como ipaddress.ip_address, mas com o inet_pton (em C) fazendo o trabalho pesado."""
+    for family, cls in ((socket.AF_INET, ipaddress.IPv4Address), (socket.AF_INET6, ipaddress.IPv6Address)):
+        try:
+            return cls(int.from_bytes(socket.inet_pton(family, text), "big"))
+        except OSError:
+            pass
+    raise ValueError(f"IP inválido: {text}")
+
+
+def _parse_hosts(spec: str) -> TargetSpec:
+    """Hosts de uma linha (sem as portas). Devolve um TargetSpec ainda sem portas."""
+    if "/" in spec:
+        network = ipaddress.ip_network(spec, strict=False)
+        return TargetSpec([], first=network.network_address, last=network.broadcast_address)
+    if "-" in spec:
+        start, _, end = spec.partition("-")
+        try:
+            first = _ip_address(start.strip())
+        except ValueError:
+            return TargetSpec([], name=spec.lower())  # nome com hífen (ex.: my-host.local)
+        end = end.strip()
+        if first.version == 4 and end.isdigit():
+            # 10.0.0.1-50: faixa no último octeto
+            last = _ip_address(start.rsplit(".", 1)[0] + "." + end)
+        else:
+            last = _ip_address(end)
+        if last.version != first.version or last < first:
+            raise ValueError(f"faixa de IPs inválida: {spec}")
+        return TargetSpec([], first=first, last=last)
+    try:
+        ip = _ip_address(spec)
+    except ValueError:
+        if ":" in spec or not spec:
+            raise ValueError(f"host inválido: {spec}")
+        return TargetSpec([], name=spec.lower())
+    return TargetSpec([], first=ip, last=ip)
+
+
+def _is_host(spec: str) -> bool:
+    """Sem ':' qualquer texto serve de host; com ':' precisa ser IPv6 (endereço, rede ou faixa)."""
+    if not spec or any(c.isspace() for c in spec):
+        return False
+    if ":" not in spec:
+        return True
+    try:
+        _parse_hosts(spec)
+    except ValueError:
+        return False
+    return True
+
+
+def _csv_ports(host: str, rest: str) -> Tuple[str, str]:
+    """Linha CSV: exatamente as colunas host e portas; lista de portas só entre aspas ("22,80")."""
+    row = next(csv.reader([rest]))
+    if len(row) != 1:
+        raise ValueError(f"{len(row) + 1} colunas (esperado host,porta)")
+    return host, row[0]
+
+
+def _split(line: str) -> Tuple[str, str]:
+    """Separa host e portas detectando o delimitador da própria linha."""
+    if line.startswith("["):
+        host, sep, rest = line[1:].partition("]")
+        if not sep or rest[:1] not in (":", ",", " ", "\t"):
+            raise ValueError("IPv6 entre colchetes sem porta")
+        return _csv_ports(host, rest[1:]) if rest[0] == "," else (host, rest[1:])
+    host, sep, ports = line.partition(",")
+    if sep and _is_host(host.strip().strip('"')):
+        return _csv_ports(host, ports)
+    parts = line.split(None, 1)
+    if len(parts) == 2:
+        return parts[0], parts[1]
+    host, sep, ports = line.rpartition(":")
+    if not sep:
+        raise ValueError("porta ausente")
+    return host, ports
+
+
+def parse_line(line: str) -> Optional[TargetSpec]:
+    """Interpreta uma linha; None para linha vazia ou comentário, ValueError se inválida."""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    host, ports = _split(line)
+    spec = _parse_hosts(host.strip().strip('"').strip())
+    spec.ports = parse_ports(ports.strip().strip('"'))
+    if spec.host_count > MAX_HOSTS_PER_LINE:
+        raise ValueError(f"{spec.host_count} hosts na mesma linha (máximo {MAX_HOSTS_PER_LINE})")
+    return spec
+
+
+class TargetDedup:
+    """
+    Lembra os alvos já gerados em IntervalSets compactos. A chave junta porta e IP
+    com a porta na parte alta, então um bloco CIDR para uma faixa de portas ocupa
+    um intervalo por porta, não um por alvo. Nomes ficam em um IntervalSet de portas
+    por nome.
+    """
+
+    def __init__(self):
+        self._v4 = IntervalSet("Q")
+        self._v6 = IntervalSet()
+        self._names = {}  # nome -> IntervalSet de portas
+
+    def _key_space(self, spec: TargetSpec):
+        if spec.name is not None:
+            return None, 0
+        return (self._v4, 32) if spec.first.version == 4 else (self._v6, 128)
+
+    def seen(self, spec: TargetSpec, host: str, port: int, ip: Optional[int] = None) -> bool:
+        if spec.name is not None:
+            ports = self._names.get(host)
+            return ports is not None and port in ports
+        space, bits = self._key_space(spec)
+        return (port << bits | ip) in space
+
+    def add(self, spec: TargetSpec):
+        """Registra todos os alvos da linha (um intervalo por faixa de portas x faixa de IPs)."""
+        if spec.name is not None:
+            ports = self._names.get(spec.name)
+            if ports is None:
+                ports = self._names[spec.name] = IntervalSet()
+            for lo, hi in spec.ports:
+                ports.add(lo, hi)
+            return
+        space, bits = self._key_space(spec)
+        first, last = int(spec.first), int(spec.last)
+        for lo, hi in spec.ports:
+            for port in range(lo, hi + 1):
+                space.add(port << bits | first, port << bits | last)
+
+    def __len__(self) -> int:
+        return len(self._v4) + len(self._v6) + sum(len(ports) for ports in self._names.values())
+
+
+def parse_hosts_line(line: str) -> Optional[TargetSpec]:
+    """
+    Como parse_line, para listas só de hosts (ping): nome, IP, CIDR ou faixa, com
+    a porta opcional (ignorada). O TargetSpec sai com a porta 0 no lugar das portas.
+    """
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    spec = None
+    if not any(c in line for c in ", \t"):
+        try:
+            spec = _parse_hosts(line.strip('"'))
+        except ValueError:
+            pass  # host:porta
+    if spec is None:
+        spec = parse_line(line)
+    if spec.host_count > MAX_HOSTS_PER_LINE:
+        raise ValueError(f"{spec.host_count} hosts na mesma linha (máximo {MAX_HOSTS_PER_LINE})")
+    spec.ports = [(0, 0)]
+    return spec
+
+
+def iter_specs(lines: Iterable[str], parse: Callable[[str], Optional[TargetSpec]] = parse_line) -> Iterator[TargetSpec]:
+    """Linhas interpretadas; inválidas são registradas no log e ignoradas."""
+    for number, line in enumerate(lines, 1):
+        try:
+            spec = parse(line)
+        except ValueError as e:
+            logger.warning(f"⚠️ Linha {number} inválida ({e}): {line.strip()}")
+            continue
+        if spec is not None:
+            yield spec
+
+
+def group_by_host(targets: Iterable[Tuple[str, int]], window: int = 1024) -> Iterator[Tuple[str, int]]:
+    """
+    Junta as portas de um mesmo host que aparecem em linhas diferentes, dentro de
+    janelas de `window` alvos (memória limitada); a ordem dos hosts é a de chegada.
+    """
+    targets = iter(targets)
+    while True:
+        chunk = list(itertools.islice(targets, window))
+        if not chunk:
+            return
+        groups = {}
+        for host, port in chunk:
+            groups.setdefault(host, []).append(port)
+        for host, ports in groups.items():
+            for port in ports:
+                yield host, port
+
+
+def expand_targets(lines: Iterable[str], dedup: bool = True, group_window: int = 1024) -> Iterator[Tuple[str, int]]:
+    """
+    Gera (host, porta) sob demanda a partir das linhas, sem carregar o arquivo
+    nem a expansão inteira. Alvos já gerados por linhas anteriores são pulados e
+    as portas de um mesmo host ficam juntas (ver group_by_host).
+    """
+    targets = _expand(lines, dedup)
+    return group_by_host(targets, group_window) if group_window > 1 else targets
+
+
+def expand_hosts(lines: Iterable[str], dedup: bool = True) -> Iterator[str]:
+    """Hosts das linhas (ver parse_hosts_line), sob demanda e sem repetidos."""
+    for host, _ in _expand(lines, dedup, parse_hosts_line):
+        yield host
+
+
+def _expand(lines: Iterable[str], dedup: bool, parse=parse_line) -> Iterator[Tuple[str, int]]:
+    seen = TargetDedup() if dedup else None
+    first = True
+    for spec in iter_specs(lines, parse):
+        if seen is None or first:
+            yield from spec
+        elif spec.name is not None:
+            for host, port in spec:
+                if not seen.seen(spec, host, port):
+                    yield host, port
+        elif spec.first == spec.last and spec.ports[0][0] == spec.ports[-1][1]:
+            # Caso mais comum (linha ip:porta): uma consulta só
+            if not seen.seen(spec, None, spec.ports[0][0], int(spec.first)):
+                yield str(spec.first), spec.ports[0][0]
+        else:
+            cls = type(spec.first)
+            for ip in range(int(spec.first), int(spec.last) + 1):
+                host = None
+                for lo, hi in spec.ports:
+                    for port in range(lo, hi + 1):
+                        if not seen.seen(spec, None, port, ip):
+                            host = host or str(cls(ip))
+                            yield host, port
+        if seen is not None:
+            seen.add(spec)
+        first = False
@@ -0,0 +1,132 @@
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from utils.ratelimit import destination_subnet
+
+# Timeout adaptativo = MULTIPLIER x p99 do RTT observado, entre FLOOR e o --timeout
+TIMEOUT_MULTIPLIER = float(os.environ.get("TIMEOUT_MULTIPLIER", "4"))
+TIMEOUT_FLOOR = float(os.environ.get("TIMEOUT_FLOOR", "0.5"))
+
+
+class _Samples:
+    """Últimos `size` RTTs (ms) em um array fixo."""
+
+    __slots__ = ("values", "count", "_next")
+
+    def __init__(self, size: int):
+        self.values = array("f", bytes(4 * size))
+        self.count = 0
+        self._next = 0
+
+    def add(self, rtt_ms: float):
+        self.values[self._next] = rtt_ms
+        self._next = (self._next + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+
+    def p99(self) -> float:
+        ordered = sorted(self.values[:self.count])
+        return ordered[min(self.count - 1, math.ceil(self.count * 0.99) - 1)]
+
+
+class RTTHistory:
+    """
+    Histórico de RTT de conexão por host, por sub-rede (/24 ou /64) e global.
+    Um host com poucas amostras herda o p99 da sub-rede e, depois, o global; a
+    memória é limitada a `max_keys` entradas de `window` amostras (descarte LRU).
+    """
+
+    def __init__(self, window: int = 32, min_samples: int = 3, max_keys: int = 20000):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+        self._global = _Samples(1024)
+        self._global_p99 = None
+        self._global_stale = 0
+        self._lock = threading.Lock()
+
+    def _samples(self, key: str) -> _Samples:
+        samples = self._keys.get(key)
+        if samples is None:
+            samples = self._keys[key] = _Samples(self.window)
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+        return samples
+
+    def observe(self, host: str, rtt_ms: float):
+        subnet = destination_subnet(host)
+        with self._lock:
+            self._samples(host).add(rtt_ms)
+            if subnet != host:
+                self._samples(subnet).add(rtt_ms)
+            self._global.add(rtt_ms)
+            self._global_stale += 1
+
+    def p99(self, host: str) -> Optional[float]:
+        """p99 em ms do nível mais específico com amostras suficientes; None sem histórico."""
+        with self._lock:
+            for key in (host, destination_subnet(host)):
+                samples = self._keys.get(key)
+                if samples is not None and samples.count >= self.min_samples:
+                    return samples.p99()
+            if self._global.count >= self.min_samples * 10:
+                # Ordenar 1024 amostras a cada alvo pesa; o p99 global é recalculado a cada 64 novas
+                if self._global_p99 is None or self._global_stale >= 64:
+                    self._global_p99, self._global_stale = self._global.p99(), 0
+                return self._global_p99
+        return None
+
+    def timeout_for(self, host: str, ceiling: float, multiplier: float = TIMEOUT_MULTIPLIER,
+                    floor: float = TIMEOUT_FLOOR) -> float:
+        p99 = self.p99(host)
+        if p99 is None:
+            return ceiling
+        return min(ceiling, max(floor, multiplier * p99 / 1000))
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._global = _Samples(len(self._global.values))
+            self._global_p99 = None
+
+
+rtt_history = RTTHistory()
+
+
+class ProbeTimeouts:
+    """
+    Timeout de cada teste de um lote: `timeout` fixo ou, com `adaptive`, derivado
+    do rtt_history (com `timeout` como teto). Com `deadline_at` (horário Unix,
+    vale entre processos) o timeout nunca passa do prazo restante do lote, e
+    depois dele `for_target` devolve None: o alvo é pulado sem conectar.
+    """
+
+    def __init__(self, timeout: float, adaptive: bool = False, deadline_at: Optional[float] = None,
+                 history: RTTHistory = None):
+        self.timeout = timeout
+        self.adaptive = adaptive
+        self.deadline_at = deadline_at
+        self.history = history or rtt_history
+
+    def for_target(self, host: str) -> Optional[float]:
+        timeout = self.history.timeout_for(host, self.timeout) if self.adaptive else self.timeout
+        if self.deadline_at is None:
+            return timeout
+        remaining = self.deadline_at - time.time()
+        return min(timeout, remaining) if remaining > 0 else None
+
+    def observe(self, row: dict):
+        """Alimenta o histórico com o tempo de conexão de uma linha de resultado sem erro."""
+        if self.adaptive and row.get("connect_ms") is not None and row.get("error") is None:
+            self.history.observe(row["host"], row["connect_ms"])
+
+
+def deadline_row(host: str, port: int) -> dict:
+    return {"host": host, "port": port, "status": "error", "error": "deadline"}
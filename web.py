@@ -5,103 +5,578 @@ from tests.connectivity_tests import (
     test_ssl_connection,
     test_socket_connection
 )
+from tests.icmp_ping import PING_METHODS, ping_host
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
-from typing import List
-import csv
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import anyio
+import hmac
 import io
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import itertools
+import json
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from utils.batch import (
+    iter_targets, iter_urls, iter_socket_batch, iter_ssl_batch, iter_netcat_batch, ssl_report,
+    BatchSummary, ndjson_line
+)
+from utils.cluster import CLUSTER_TOKEN, LEASE_SIZE, Coordinator, LeaseRequest, cluster_workers
+from utils.dns_cache import resolver
+from utils.jobs import Job, jobs, spool_upload, remove_file
 from utils.logger import setup_logger
+from utils.metrics import CONTENT_TYPE, registry, group_name, observe_row, observe_rows
+from utils.monitor import Monitor, parse_monitor_targets
+from utils.probe_cache import probe_cache, requested_max_age
+from utils.ratelimit import BatchLimits
+from utils.reachability import Reachability
+from utils.results import CSV_FIELDS, ResultTable
 
 logger = setup_logger()
 
-app = FastAPI(title="Connectivity Tester API")
+monitor = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Com MONITOR_FILE definido, a API também monitora os alvos do arquivo continuamente."""
+    global monitor
+    path = os.environ.get("MONITOR_FILE")
+    if path:
+        with open(path, "r") as f:
+            targets = parse_monitor_targets(f, float(os.environ.get("MONITOR_INTERVAL", "60")),
+                                            int(os.environ.get("MONITOR_HISTORY", "1440")), group_name(path))
+        monitor = Monitor(targets, os.environ.get("MONITOR_PROBE", "socket"),
+                          int(os.environ.get("MONITOR_TIMEOUT", "5")), int(os.environ.get("MONITOR_WORKERS", "50")),
+                          adaptive=os.environ.get("MONITOR_ADAPTIVE_TIMEOUT", "0") == "1")
+        monitor.start()
+    yield
+    if monitor:
+        monitor.stop()
+        monitor = None
+
+app = FastAPI(title="Connectivity Tester API", lifespan=lifespan)
+
+def _cached_probe(request: Request, response: Response, key: tuple, probe) -> dict:
+    """
+    Executa o teste via probe_cache: requisições idênticas simultâneas compartilham
+    o mesmo teste e, com PROBE_CACHE_TTL > 0, o resultado é reaproveitado dentro do TTL.
+    O cliente pode pedir um teste novo com Cache-Control: no-cache ou limitar a idade com max-age.
+    """
+    max_age = requested_max_age(request.headers.get("cache-control"))
+
+    def run():
+        result = probe()
+        observe_row(key[0], "api", {"status": "success" if result else "failure", **result.fields()})
+        return result.to_dict()
+
+    result, status, age = probe_cache.get_or_run(key, run, max_age)
+    response.headers["X-Cache"] = status
+    if probe_cache.ttl > 0:
+        response.headers["Age"] = str(int(age))
+        response.headers["Cache-Control"] = f"max-age={max(int(probe_cache.ttl - age), 0)}"
+    else:
+        response.headers["Cache-Control"] = "no-store"
+    return result
 
 @app.get("/socket")
-def socket_test(host: str, port: int, timeout: int = 5):
-    return {"success": test_socket_connection(host, port, timeout)}
+def socket_test(request: Request, response: Response, host: str, port: int, timeout: int = 5):
+    return _cached_probe(request, response, ("socket", host, port, timeout),
+                         lambda: test_socket_connection(host, port, timeout))
 
 @app.get("/netcat")
-def netcat_test(host: str, port: int, timeout: int = 5):
-    return {"success": test_netcat_connection(host, port, timeout)}
+def netcat_test(request: Request, response: Response, host: str, port: int, timeout: int = 5,
+                udp: bool = False, banner: bool = False, banner_bytes: int = 1024):
+    return _cached_probe(request, response, ("netcat", host, port, timeout, udp, banner, banner_bytes),
+                         lambda: test_netcat_connection(host, port, timeout, udp, banner, banner_bytes))
 
 @app.get("/curl")
 def curl_test(
+    request: Request,
+    response: Response,
     url: str,
     method: str = "GET",
     timeout: int = 5,
     proxy_host: str = None,
     proxy_port: int = None
 ):
-    return {"success": test_curl_connection(url, method, timeout, proxy_host, proxy_port)}
+    return _cached_probe(request, response, ("curl", url, method.upper(), timeout, proxy_host, proxy_port),
+                         lambda: test_curl_connection(url, method, timeout, proxy_host, proxy_port))
 
 @app.get("/ssl")
-def ssl_test(host: str, port: int, timeout: int = 5):
-    return {"success": test_ssl_connection(host, port, timeout)}
+def ssl_test(request: Request, response: Response, host: str, port: int, timeout: int = 5):
+    return _cached_probe(request, response, ("ssl", host, port, timeout),
+                         lambda: test_ssl_connection(host, port, timeout))
+
+@app.get("/ping")
+def ping_test(request: Request, response: Response, host: str, count: int = Query(4, ge=1, le=100),
+              interval: float = Query(0.2, gt=0), timeout: float = Query(1.0, gt=0), method: str = "auto"):
+    """📡 Echo ICMP sem privilégio (ou connect TCP se não permitido): RTT, perda e jitter."""
+    if method not in PING_METHODS:
+        raise HTTPException(status_code=400, detail=f"method deve ser um de: {', '.join(PING_METHODS)}")
+    return _cached_probe(request, response, ("ping", host, count, interval, timeout, method),
+                         lambda: ping_host(host, count, interval, timeout, method))
+
+@app.get("/cache/stats")
+def probe_cache_stats():
+    return probe_cache.stats()
+
+@app.get("/dns/cache")
+def dns_cache_stats():
+    return resolver.stats()
+
+@app.get("/metrics")
+def metrics():
+    """📈 Métricas no formato do Prometheus (testes por resultado, latência, ocupação dos pools)."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
 @app.post("/socket/batch")
-async def socket_batch_upload(file: UploadFile = File(...), timeout: int = 5, workers: int = 10):
+def socket_batch_upload(file: UploadFile = File(...), timeout: int = 5, workers: int = 10, output: str = "json",
+                        adaptive_timeout: bool = False, deadline: Optional[float] = None,
+                        rate: Optional[float] = None, max_per_host: Optional[int] = None,
+                        max_per_subnet: Optional[int] = None, prune_after: Optional[int] = None,
+                        prune_subnet: Optional[float] = None, precheck: bool = False):
     """
     📄 Testa múltiplos hosts e portas via socket em paralelo a partir de um arquivo .txt ou .csv.
+    `output`: json ({"results", "summary"}), ndjson (resumo na última linha) ou csv.
+    `deadline` (segundos) limita a duração do lote; `adaptive_timeout` ajusta o timeout
+    de cada alvo pelo RTT observado.
+    `rate` (testes/s), `max_per_host` e `max_per_subnet` evitam sobrecarregar destinos.
+    Com `prune_after` (timeouts seguidos), `prune_subnet` (fração da /24) ou `precheck`
+    (ping antes do primeiro teste), alvos de hosts inalcançáveis saem como skipped.
     """
     logger.info(f"📥 Recebido arquivo: {file.filename}")
+    _check_batch_file(file)
+    _check_output(output)
+    _check_deadline(deadline)
+    limits = _batch_limits(rate, max_per_host, max_per_subnet)
+    reachability = _reachability(prune_after, prune_subnet, precheck)
+    targets = _upload_targets(file)
 
-    if not (file.filename.endswith(".txt") or file.filename.endswith(".csv")):
-        raise HTTPException(status_code=400, detail="Arquivo deve ser .txt ou .csv")
+    logger.info(f"🚀 Iniciando testes com {workers} threads")
+    rows = iter_socket_batch(targets, timeout, workers, adaptive=adaptive_timeout,
+                             deadline_at=_deadline_at(deadline), limits=limits, reachability=reachability)
+    with _upload_errors():
+        results = ResultTable(observe_rows("socket", "batch", rows))
+
+    logger.info("✅ Testes concluídos")
+    return _table_response(results, output)
+
+@app.post("/socket/batch/stream")
+def socket_batch_stream(file: UploadFile = File(...), timeout: int = 5, workers: int = 10,
+                        engine: str = "thread", concurrency: int = 1000, adaptive_timeout: bool = False,
+                        deadline: Optional[float] = None, rate: Optional[float] = None,
+                        max_per_host: Optional[int] = None, max_per_subnet: Optional[int] = None,
+                        prune_after: Optional[int] = None, prune_subnet: Optional[float] = None,
+                        precheck: bool = False):
+    """
+    📄 Igual a /socket/batch, mas devolve NDJSON: uma linha por alvo assim que o teste
+    termina e, por último, uma linha {"summary": ...}. A memória fica constante
+    independentemente do tamanho do arquivo. `deadline` (segundos) limita a duração
+    do lote; `adaptive_timeout` ajusta o timeout de cada alvo pelo RTT observado.
+    `rate` (testes/s), `max_per_host` e `max_per_subnet` evitam sobrecarregar destinos.
+    Com `prune_after` (timeouts seguidos), `prune_subnet` (fração da /24) ou `precheck`
+    (ping antes do primeiro teste), alvos de hosts inalcançáveis saem como skipped.
+    """
+    logger.info(f"📥 Recebido arquivo (stream): {file.filename}")
+    _check_batch_file(file)
+    if engine not in ("thread", "async"):
+        raise HTTPException(status_code=400, detail="engine deve ser thread ou async")
+    _check_deadline(deadline)
+    limits = _batch_limits(rate, max_per_host, max_per_subnet)
+    reachability = _reachability(prune_after, prune_subnet, precheck)
+
+    def generate():
+        summary = BatchSummary()
+        targets = iter_targets(_upload_lines(file))
+        try:
+            rows = iter_socket_batch(targets, timeout, workers, engine, concurrency, adaptive_timeout,
+                                     _deadline_at(deadline), limits, reachability)
+            for row in observe_rows("socket", "stream", rows):
+                summary.add(row)
+                yield ndjson_line(row)
+        except UnicodeDecodeError as e:
+            # Os cabeçalhos já foram enviados; o erro vai como última linha do stream
+            logger.error(f"Erro ao ler o arquivo: {e}")
+            yield ndjson_line({"error": "Erro ao processar o arquivo", "summary": summary.as_dict()})
+            return
+        logger.info("✅ Testes concluídos")
+        yield ndjson_line({"summary": summary.as_dict()})
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/curl/batch")
+def curl_batch_upload(
+    file: UploadFile = File(...),
+    method: str = "GET",
+    timeout: int = 5,
+    parallel: int = 50,
+    per_host: int = 6,
+    http2: bool = True,
+    proxy_host: str = None,
+    proxy_port: int = None,
+    output: str = "json"
+):
+    """
+    🌐 Testa as URLs do arquivo (uma por linha) via cURL multi, reaproveitando conexões.
+    """
+    from tests.curl_batch import CURL_FIELDS, iter_curl_batch
 
+    logger.info(f"📥 Recebido arquivo: {file.filename}")
+    _check_batch_file(file)
+    _check_output(output)
     try:
-        content = await file.read()
-        decoded = content.decode("utf-8")
-        reader = csv.reader(io.StringIO(decoded), delimiter=',' if ',' in decoded else ':')
-    except Exception as e:
+        urls = list(iter_urls(_upload_lines(file)))
+    except UnicodeDecodeError as e:
         logger.error(f"Erro ao ler o arquivo: {e}")
         raise HTTPException(status_code=400, detail="Erro ao processar o arquivo")
+    if not urls:
+        raise HTTPException(status_code=400, detail="Nenhuma URL válida encontrada no arquivo")
 
-    targets = []
-    for row in reader:
-        if len(row) != 2:
-            logger.warning(f"Linha ignorada (inválida): {row}")
-            continue
-        host, port = row
-        try:
-            targets.append((host.strip(), int(port.strip())))
-        except ValueError:
-            logger.warning(f"Porta inválida: {port}")
+    rows = iter_curl_batch(urls, method, timeout, parallel, per_host, http2, proxy_host, proxy_port)
+    return _table_response(ResultTable(observe_rows("curl", "batch", rows)), output, CURL_FIELDS)
 
-    if not targets:
-        raise HTTPException(status_code=400, detail="Nenhum destino válido encontrado no arquivo")
+@app.post("/ssl/batch")
+def ssl_batch_upload(file: UploadFile = File(...), timeout: int = 5, workers: int = 10, output: str = "json",
+                     adaptive_timeout: bool = False, deadline: Optional[float] = None,
+                     rate: Optional[float] = None, max_per_host: Optional[int] = None,
+                     max_per_subnet: Optional[int] = None, prune_after: Optional[int] = None,
+                     prune_subnet: Optional[float] = None, precheck: bool = False):
+    """
+    🔒 Testa SSL/certificado dos alvos do arquivo em paralelo. O relatório vem
+    ordenado pelos dias até o vencimento do certificado. `deadline`,
+    `adaptive_timeout`, `prune_after`, `prune_subnet` e `precheck` funcionam como em
+    /socket/batch; `rate`, `max_per_host` e `max_per_subnet` limitam a taxa e os
+    handshakes simultâneos por destino.
+    """
+    logger.info(f"📥 Recebido arquivo: {file.filename}")
+    _check_batch_file(file)
+    _check_output(output)
+    _check_deadline(deadline)
+    limits = _batch_limits(rate, max_per_host, max_per_subnet)
+    reachability = _reachability(prune_after, prune_subnet, precheck)
+    targets = _upload_targets(file)
 
-    results = []
+    rows = iter_ssl_batch(targets, timeout, workers, adaptive_timeout, _deadline_at(deadline), limits,
+                          reachability)
+    with _upload_errors():
+        results = ssl_report(observe_rows("ssl", "batch", rows))
+    return _table_response(results, output)
 
-    logger.info(f"🚀 Iniciando {len(targets)} testes com {workers} threads")
+_JOB_PROBES = ("socket", "ssl", "netcat")
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_map = {
-            executor.submit(test_socket_connection, host, port, timeout): (host, port)
-            for host, port in targets
-        }
+@app.post("/jobs", status_code=202)
+def submit_job(
+    file: UploadFile = File(...),
+    probe: str = "socket",
+    timeout: int = 5,
+    workers: int = 10,
+    engine: str = "thread",
+    concurrency: int = 1000,
+    udp: bool = False,
+    banner: bool = False,
+    adaptive_timeout: bool = False,
+    deadline: Optional[float] = None,
+    rate: Optional[float] = None,
+    max_per_host: Optional[int] = None,
+    max_per_subnet: Optional[int] = None,
+    prune_after: Optional[int] = None,
+    prune_subnet: Optional[float] = None,
+    precheck: bool = False
+):
+    """
+    🧾 Agenda um lote (socket, ssl ou netcat) e retorna o id do job imediatamente.
+    Acompanhe por GET /jobs/{id}, /jobs/{id}/results e /jobs/{id}/events (SSE).
+    O `deadline` (segundos) conta a partir do início da execução do job; `rate`,
+    `max_per_host` e `max_per_subnet` limitam a taxa e os testes por destino;
+    `prune_after`, `prune_subnet` e `precheck` pulam hosts inalcançáveis.
+    """
+    _check_batch_file(file)
+    if probe not in _JOB_PROBES:
+        raise HTTPException(status_code=400, detail=f"probe deve ser um de: {', '.join(_JOB_PROBES)}")
+    if engine not in ("thread", "async"):
+        raise HTTPException(status_code=400, detail="engine deve ser thread ou async")
+    _check_deadline(deadline)
+    _batch_limits(rate, max_per_host, max_per_subnet)
+    _reachability(prune_after, prune_subnet, precheck)
 
-        for future in as_completed(future_map):
-            host, port = future_map[future]
-            try:
-                status = "success" if future.result() else "failure"
-            except Exception as e:
-                logger.error(f"Erro ao testar {host}:{port} - {e}")
-                status = "error"
-            results.append({"host": host, "port": port, "status": status})
+    path, lines = spool_upload(file.file)
 
-    logger.info("✅ Testes concluídos")
-    return JSONResponse(content={"results": results, "summary": _generate_summary(results)})
+    def rows():
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            targets = iter_targets(f)
+            deadline_at = _deadline_at(deadline)
+            # O balde de fichas começa cheio quando o job sai da fila, não no envio
+            limits = _batch_limits(rate, max_per_host, max_per_subnet)
+            reachability = _reachability(prune_after, prune_subnet, precheck)
+            if probe == "ssl":
+                results = iter_ssl_batch(targets, timeout, workers, adaptive_timeout, deadline_at, limits,
+                                         reachability)
+            elif probe == "netcat":
+                results = iter_netcat_batch(targets, timeout, workers, udp, banner, adaptive=adaptive_timeout,
+                                            deadline_at=deadline_at, limits=limits, reachability=reachability)
+            else:
+                results = iter_socket_batch(targets, timeout, workers, engine, concurrency, adaptive_timeout,
+                                            deadline_at, limits, reachability)
+            yield from observe_rows(probe, "job", results)
+
+    job = jobs.submit(Job(probe, rows, estimate=lines, cleanup=lambda: remove_file(path)))
+    return {"job_id": job.id, "status": job.status, "estimate": lines}
 
-def _generate_summary(results: List[dict]) -> dict:
-    total = len(results)
-    success = len([r for r in results if r["status"] == "success"])
-    failure = len([r for r in results if r["status"] == "failure"])
-    error = len([r for r in results if r["status"] == "error"])
+@app.get("/jobs")
+def list_jobs():
+    return [job.progress() for job in jobs.list()]
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).progress()
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000)):
+    job = _get_job(job_id)
+    results = job.page(offset, limit)
+    next_offset = offset + len(results)
     return {
-        "total": total,
-        "success": success,
-        "failure": failure,
-        "error": error
-    }
\ No newline at end of file
+        "job_id": job.id,
+        "status": job.status,
+        "offset": offset,
+        "results": results,
+        "next_offset": next_offset if (next_offset < len(job.results) or not job.done) else None,
+    }
+
+# Cada cliente SSE ocupa uma thread enquanto espera o job; com limite próprio,
+# muitos clientes não esgotam as threads das rotas síncronas
+SSE_WAITERS = anyio.CapacityLimiter(int(os.environ.get("JOBS_SSE_THREADS", "32")))
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str, offset: int = Query(0, ge=0)):
+    """
+    Server-Sent Events: um evento `result` por alvo concluído (id = posição do
+    resultado), `progress` periódico e `end` quando o job termina. Reconexões com
+    Last-Event-ID continuam de onde pararam.
+    """
+    job = _get_job(job_id)
+    last_id = request.headers.get("last-event-id")
+    if last_id and last_id.isdigit():
+        offset = int(last_id) + 1
+
+    async def stream():
+        index = offset
+        last_progress = 0.0
+        while True:
+            # Lê o que já existe sem segurar threads; a lista só cresce
+            while index < len(job.results):
+                yield f"id: {index}\nevent: result\ndata: {json.dumps(job.results[index], ensure_ascii=False)}\n\n"
+                index += 1
+            now = time.monotonic()
+            if job.done or now - last_progress >= 1:
+                yield f"event: progress\ndata: {json.dumps(job.progress())}\n\n"
+                last_progress = now
+            if job.done and index >= len(job.results):
+                yield f"event: end\ndata: {json.dumps({'status': job.status})}\n\n"
+                return
+            if await request.is_disconnected():
+                return
+            # Acorda no próximo resultado (ou no fim do job); o timeout mantém o progresso e o teste de desconexão
+            await anyio.to_thread.run_sync(job.wait_for, index, 1.0, limiter=SSE_WAITERS)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = _get_job(job_id)
+    job.cancel()
+    return job.progress()
+
+def _get_monitor() -> Monitor:
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Monitor desligado (defina MONITOR_FILE)")
+    return monitor
+
+@app.get("/monitor")
+def monitor_status(window: float = Query(None, gt=0, description="Janela em segundos (padrão: todo o histórico)")):
+    """📡 Disponibilidade e latência de todos os alvos monitorados."""
+    mon = _get_monitor()
+    return {"probe": mon.kind, "started": mon.started, "targets": mon.status(window)}
+
+@app.get("/monitor/{host}/{port}")
+def monitor_target(host: str, port: int, window: float = Query(None, gt=0),
+                   samples: int = Query(100, ge=0, le=100000)):
+    """Disponibilidade, percentis e as últimas `samples` amostras de um alvo."""
+    mon = _get_monitor()
+    target = mon.targets.get(f"{host}:{port}")
+    if target is None:
+        raise HTTPException(status_code=404, detail="Alvo não monitorado")
+    since = time.time() - window if window else 0.0
+    return {**mon.target_stats(target, window),
+            "history": target.history.samples(since, samples) if samples else []}
+
+def _check_cluster_token(request: Request):
+    if not CLUSTER_TOKEN:
+        raise HTTPException(status_code=503, detail="Modo cluster desligado (defina CLUSTER_TOKEN)")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {CLUSTER_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Token do cluster inválido")
+
+@app.get("/cluster/health")
+def cluster_health():
+    """Prontidão do worker (readinessProbe)."""
+    return {"status": "ok"}
+
+@app.get("/cluster/workers")
+def cluster_worker_list():
+    """Workers que um lote distribuído usaria agora (CLUSTER_WORKERS, com o DNS resolvido)."""
+    return {"workers": cluster_workers()}
+
+@app.post("/cluster/lease", dependencies=[Depends(_check_cluster_token)])
+def cluster_lease(lease: LeaseRequest):
+    """
+    🧩 Worker: testa os alvos de um lease enviado pelo coordenador e devolve NDJSON,
+    uma linha por alvo e, por último, {"summary": ...}. Só aceita as opções de
+    LeaseOptions, com `deadline` em segundos restantes, e exige CLUSTER_TOKEN.
+    """
+    from utils.sharding import run_probes
+
+    probe, targets = lease.probe, lease.targets
+    options = lease.options.model_dump(exclude={"deadline"})
+    options["deadline_at"] = _deadline_at(lease.options.deadline)
+
+    def generate():
+        summary = BatchSummary()
+        for row in observe_rows(probe, "cluster", run_probes(probe, options, targets)):
+            summary.add(row)
+            yield ndjson_line(row)
+        yield ndjson_line({"summary": summary.as_dict()})
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/cluster/batch/stream")
+def cluster_batch_stream(file: UploadFile = File(...), probe: str = "socket", timeout: int = 5, workers: int = 10,
+                         engine: str = "thread", concurrency: int = 1000, udp: bool = False, banner: bool = False,
+                         adaptive_timeout: bool = False, deadline: Optional[float] = None,
+                         rate: Optional[float] = None, max_per_host: Optional[int] = None,
+                         max_per_subnet: Optional[int] = None, prune_after: Optional[int] = None,
+                         prune_subnet: Optional[float] = None, precheck: bool = False,
+                         lease_size: int = Query(LEASE_SIZE, ge=1)):
+    """
+    🛰️ Coordenador: divide os alvos do arquivo em leases de `lease_size` e os distribui
+    entre os workers de CLUSTER_WORKERS (cada um com `workers` threads por lease).
+    Devolve NDJSON como /socket/batch/stream; a última linha traz o resumo do lote
+    e as contagens de cada worker. Leases de workers que caem são reenviados a outros.
+    """
+    logger.info(f"📥 Recebido arquivo (cluster): {file.filename}")
+    _check_batch_file(file)
+    if probe not in _JOB_PROBES:
+        raise HTTPException(status_code=400, detail=f"probe deve ser um de: {', '.join(_JOB_PROBES)}")
+    if engine not in ("thread", "async"):
+        raise HTTPException(status_code=400, detail="engine deve ser thread ou async")
+    _check_deadline(deadline)
+    limits = _batch_limits(rate, max_per_host, max_per_subnet)
+    reachability = _reachability(prune_after, prune_subnet, precheck)
+    if not CLUSTER_TOKEN:
+        raise HTTPException(status_code=503, detail="Modo cluster desligado (defina CLUSTER_TOKEN)")
+    urls = cluster_workers()
+    if not urls:
+        raise HTTPException(status_code=503, detail="Nenhum worker disponível (defina CLUSTER_WORKERS)")
+
+    options = {"timeout": timeout, "workers": workers, "engine": engine, "concurrency": concurrency,
+               "udp": udp, "banner": banner, "adaptive": adaptive_timeout, "deadline_at": _deadline_at(deadline),
+               "limits": limits.as_options() if limits else None,
+               "prune": reachability.as_options() if reachability else None}
+    coordinator = Coordinator(urls, probe, options, lease_size)
+
+    def generate():
+        logger.info(f"🛰️ Distribuindo alvos entre {len(urls)} worker(s)")
+        try:
+            yield from (ndjson_line(row) for row in coordinator.run(iter_targets(_upload_lines(file))))
+        except (UnicodeDecodeError, RuntimeError) as e:
+            logger.error(f"❌ Lote distribuído interrompido: {e}")
+            yield ndjson_line({"error": str(e), "summary": coordinator.summary.as_dict(),
+                               "workers": coordinator.stats()})
+            return
+        logger.info("✅ Testes concluídos")
+        yield ndjson_line({"summary": coordinator.summary.as_dict(), "workers": coordinator.stats()})
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def _check_batch_file(file: UploadFile):
+    if not (file.filename.endswith(".txt") or file.filename.endswith(".csv")):
+        raise HTTPException(status_code=400, detail="Arquivo deve ser .txt ou .csv")
+
+def _check_deadline(deadline: Optional[float]):
+    if deadline is not None and deadline <= 0:
+        raise HTTPException(status_code=400, detail="deadline deve ser maior que zero")
+
+def _deadline_at(deadline: Optional[float]) -> Optional[float]:
+    return time.time() + deadline if deadline is not None else None
+
+def _batch_limits(rate: Optional[float], per_host: Optional[int], per_subnet: Optional[int]):
+    try:
+        return BatchLimits(rate, per_host, per_subnet) or None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _reachability(prune_after: Optional[int], prune_subnet: Optional[float], precheck: bool):
+    """Poda de hosts inalcançáveis (utils.reachability); None quando desligada."""
+    if prune_after is None and prune_subnet is None and not precheck:
+        return None
+    try:
+        return Reachability(prune_after if prune_after is not None else 3, prune_subnet, precheck)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _upload_lines(file: UploadFile):
+    """Lê o upload linha a linha direto do arquivo temporário, sem decodificar tudo de uma vez."""
+    file.file.seek(0)
+    reader = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        yield from reader
+    finally:
+        # Devolve o arquivo ao UploadFile sem fechá-lo junto com o wrapper (se o
+        # gerador foi abandonado, o UploadFile pode já ter sido fechado)
+        if not file.file.closed:
+            reader.detach()
+
+@contextmanager
+def _upload_errors():
+    """Arquivo que não é UTF-8 vira 400, mesmo quando o erro só aparece no meio da leitura."""
+    try:
+        yield
+    except UnicodeDecodeError as e:
+        logger.error(f"Erro ao ler o arquivo: {e}")
+        raise HTTPException(status_code=400, detail="Erro ao processar o arquivo")
+
+def _upload_targets(file: UploadFile):
+    """
+    Alvos do upload sob demanda (a expansão de CIDR x portas não é materializada);
+    só o primeiro é lido aqui, para responder 400 a um arquivo sem alvos válidos.
+    """
+    targets = iter_targets(_upload_lines(file))
+    with _upload_errors():
+        first = next(targets, None)
+    if first is None:
+        raise HTTPException(status_code=400, detail="Nenhum destino válido encontrado no arquivo")
+    return itertools.chain([first], targets)
+
+_OUTPUT_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _check_output(output: str):
+    if output not in _OUTPUT_TYPES:
+        raise HTTPException(status_code=400, detail=f"output deve ser um de: {', '.join(_OUTPUT_TYPES)}")
+
+def _table_response(table: ResultTable, output: str, fields=CSV_FIELDS) -> StreamingResponse:
+    """Serializa a tabela em blocos; o resumo já foi calculado enquanto as linhas chegavam."""
+    summary = table.summary.as_dict()
+    if output == "ndjson":
+        body = itertools.chain(table.iter_ndjson(), [ndjson_line({"summary": summary})])
+    elif output == "csv":
+        body = table.iter_csv(fields)
+    else:
+        body = table.iter_json(summary=summary)
+    return StreamingResponse(body, media_type=_OUTPUT_TYPES[output])